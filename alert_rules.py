@@ -0,0 +1,508 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+告警规则
+
+阈值条件编译成每个 (品种, 周期) 一组状态机，避免超卖/超买区间持续时每轮都重复通知：
+  - 滞回：指标越过触发阈值（threshold）进入告警状态，回到退出阈值（exit）之外才解除，
+    在阈值附近来回波动不会反复进出
+  - 只在进入时触发（edge_only）：进入告警状态时通知一次，之后保持状态只更新界面；
+    edge_only 为 False 时告警状态期间按冷却时间重复提醒
+  - 冷却（cooldown）：同一规则两次通知之间的最短间隔（秒），解除后很快再次进入也不会马上重复通知
+
+状态存放在 (序列数, 规则数) 的二维数组里，一次调用用 numpy 计算一批序列的所有规则，
+每轮的开销与序列数成正比。
+
+配置项 alert_rules 为空时由四个阈值（price_line_low/high、rsi_low/high）生成默认规则；
+也可以给出规则列表，例如:
+    [{"name": "rsi_deep", "indicator": "rsi", "op": "<=", "threshold": 15,
+      "exit": 25, "cooldown": 1800, "label": "RSI深度超卖"}]
+未给出的 exit / cooldown / edge_only 使用 alert_hysteresis / alert_cooldown / alert_edge_only。
+
+组合规则（compound_rules）把同一品种多个周期、多个指标的条件用“且”连起来，只发一条告警，例如:
+    [{"name": "rsi3m_pl15m", "label": "3m超卖且15m低位", "conditions": [
+        {"timeframe": "3m", "indicator": "rsi", "op": "<=", "threshold": 23},
+        {"timeframe": "15m", "indicator": "price_line", "op": "<=", "threshold": 23}]}]
+组合规则只使用每个序列最近一次计算的指标（不额外拉取），由“周期 → 组合规则”的依赖索引
+找出受影响的规则，只有某个输入的指标变化时才重新计算。每个条件有自己的滞回，
+全部条件成立时进入告警状态，冷却和只在进入时通知与单条规则相同。
+"""
+
+import threading
+
+import numpy as np
+
+# 规则可以使用的指标（也是 evaluate 的 values 的列顺序）
+INDICATORS = ('price_line', 'rsi')
+INDICATOR_NAMES = {'price_line': '价格线', 'rsi': 'RSI(6)'}
+OPERATORS = ('<=', '>=')
+
+
+def _check_threshold(name, indicator, op, threshold, exit):
+    """检查指标、比较方式和阈值，返回 (threshold, exit)"""
+    if indicator not in INDICATORS:
+        raise ValueError(f"规则 {name}: 未知的指标 {indicator}")
+    if op not in OPERATORS:
+        raise ValueError(f"规则 {name}: 未知的比较方式 {op}")
+    threshold = float(threshold)
+    exit = float(exit)
+    if (op == '<=' and exit < threshold) or (op == '>=' and exit > threshold):
+        raise ValueError(f"规则 {name}: 退出阈值 {exit} 应在触发阈值 {threshold} 之外")
+    return threshold, exit
+
+
+def _default_exit(config, op, threshold):
+    band = config.alert_hysteresis if op == '<=' else -config.alert_hysteresis
+    return float(threshold) + band
+
+
+def _check_fields(kind, item, allowed, required):
+    if not isinstance(item, dict):
+        raise ValueError(f"{kind}应为字典: {item!r}")
+    unknown = set(item) - set(allowed)
+    if unknown:
+        raise ValueError(f"{kind}的未知字段: {', '.join(sorted(unknown))}")
+    missing = set(required) - set(item)
+    if missing:
+        raise ValueError(f"{kind}缺少字段: {', '.join(sorted(missing))}")
+
+
+class AlertRule:
+    """一条阈值规则
+
+    Args:
+        name: 规则名（唯一）
+        indicator: 'price_line' 或 'rsi'
+        op: '<=' 低于阈值时告警，'>=' 高于阈值时告警
+        threshold: 触发阈值
+        exit: 退出阈值，'<=' 时不低于 threshold，'>=' 时不高于 threshold
+        cooldown: 两次通知的最短间隔（秒）
+        edge_only: True时只在进入告警状态时通知
+        label: 告警文字，默认为 name
+        flag: 状态表里的简短状态，默认为 label
+    """
+
+    __slots__ = ('name', 'indicator', 'op', 'threshold', 'exit', 'cooldown', 'edge_only', 'label', 'flag')
+
+    def __init__(self, name, indicator, op, threshold, exit, cooldown=0.0, edge_only=True,
+                 label=None, flag=None):
+        threshold, exit = _check_threshold(name, indicator, op, threshold, exit)
+        if cooldown < 0:
+            raise ValueError(f"规则 {name}: 冷却时间不能为负数")
+        self.name = name
+        self.indicator = indicator
+        self.op = op
+        self.threshold = threshold
+        self.exit = exit
+        self.cooldown = float(cooldown)
+        self.edge_only = bool(edge_only)
+        self.label = label or name
+        self.flag = flag or self.label
+
+    def describe(self, value):
+        """(告警文字, 语音播报文字)"""
+        return (f"{self.label}: {value:.2f} {self.op} {self.threshold}",
+                f"{self.label} {value:.1f}")
+
+    def summary(self):
+        """启动日志里的一行说明"""
+        release = '>' if self.op == '<=' else '<'
+        mode = '进入时告警' if self.edge_only else '持续提醒'
+        return (f"{INDICATOR_NAMES[self.indicator]} {self.op} {self.threshold}"
+                f"（{release} {self.exit} 解除，{mode}，冷却{self.cooldown:.0f}秒）")
+
+
+def default_rules(config):
+    """由四个阈值生成默认规则"""
+    band = config.alert_hysteresis
+    common = {'cooldown': config.alert_cooldown, 'edge_only': config.alert_edge_only}
+    return [
+        AlertRule('price_line_low', 'price_line', '<=', config.price_line_low,
+                  config.price_line_low + band, label='价格线低位', flag='价格线低', **common),
+        AlertRule('price_line_high', 'price_line', '>=', config.price_line_high,
+                  config.price_line_high - band, label='价格线高位', flag='价格线高', **common),
+        AlertRule('rsi_low', 'rsi', '<=', config.rsi_low, config.rsi_low + band,
+                  label='RSI低位', flag='RSI低', **common),
+        AlertRule('rsi_high', 'rsi', '>=', config.rsi_high, config.rsi_high - band,
+                  label='RSI高位', flag='RSI高', **common),
+    ]
+
+
+def compile_rules(config):
+    """由配置生成规则列表
+
+    Raises:
+        ValueError: 规则不合法
+    """
+    if not config.alert_rules:
+        return default_rules(config)
+
+    rules = []
+    for item in config.alert_rules:
+        _check_fields("告警规则", item, AlertRule.__slots__, ('name', 'indicator', 'op', 'threshold'))
+        values = {'cooldown': config.alert_cooldown, 'edge_only': config.alert_edge_only}
+        values.update(item)
+        if 'exit' not in item:
+            values['exit'] = _default_exit(config, item['op'], item['threshold'])
+        rules.append(AlertRule(**values))
+
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError("告警规则名称重复")
+    return rules
+
+
+class AlertRuleEngine:
+    """按 (品种, 周期) 保存规则状态，批量计算
+
+    Args:
+        rules: [AlertRule, ...]
+
+    多个线程（轮询、推送、移除品种）可能同时调用，内部加锁。
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.columns = np.array([INDICATORS.index(rule.indicator) for rule in self.rules], dtype=np.intp)
+        self.below = np.array([rule.op == '<=' for rule in self.rules], dtype=bool)
+        self.enter = np.array([rule.threshold for rule in self.rules], dtype=np.float64)
+        self.exit = np.array([rule.exit for rule in self.rules], dtype=np.float64)
+        self.cooldown = np.array([rule.cooldown for rule in self.rules], dtype=np.float64)
+        self.edge_only = np.array([rule.edge_only for rule in self.rules], dtype=bool)
+
+        self.lock = threading.Lock()
+        self.rows = {}   # (symbol, timeframe) -> 状态数组的行号
+        self.free = []   # 已移除的序列空出来的行号
+        self.active = np.zeros((0, len(self.rules)), dtype=bool)
+        self.last_fired = np.full((0, len(self.rules)), -np.inf)
+
+    def _row_indices(self, keys):
+        """每个序列的行号，新序列分配一行（容量不足时翻倍）"""
+        indices = np.empty(len(keys), dtype=np.intp)
+        for position, key in enumerate(keys):
+            row = self.rows.get(key)
+            if row is None:
+                row = self.free.pop() if self.free else len(self.rows)
+                if row >= len(self.active):
+                    capacity = max(16, len(self.active) * 2)
+                    self.active = _grow(self.active, capacity, False)
+                    self.last_fired = _grow(self.last_fired, capacity, -np.inf)
+                self.rows[key] = row
+            indices[position] = row
+        return indices
+
+    def evaluate(self, keys, values, now, commit=True):
+        """计算一批序列的所有规则
+
+        Args:
+            keys: [(symbol, timeframe), ...]，一批里不应重复
+            values: (n, 2) 数组，列顺序同 INDICATORS；nan表示数据不足，规则状态保持不变
+            now: 当前时间（秒），用于冷却
+            commit: False时只计算不保存状态（例如用过时的缓存数据显示状态）
+
+        Returns:
+            (active, fired)：(n, 规则数) 的布尔数组，分别为是否处于告警状态、本次是否需要通知
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(len(keys), len(INDICATORS))
+        selected = values[:, self.columns]
+        with self.lock:
+            rows = self._row_indices(keys)
+            was_active = self.active[rows]
+            last_fired = self.last_fired[rows]
+
+            with np.errstate(invalid='ignore'):
+                entered = np.where(self.below, selected <= self.enter, selected >= self.enter)
+                held = np.where(self.below, selected <= self.exit, selected >= self.exit)
+            active = np.where(np.isnan(selected), was_active, entered | (was_active & held))
+            triggered = np.where(self.edge_only, active & ~was_active, active)
+            fired = triggered & (now - last_fired >= self.cooldown)
+
+            if commit:
+                self.active[rows] = active
+                self.last_fired[rows] = np.where(fired, now, last_fired)
+            else:
+                fired = np.zeros_like(fired)
+        return active, fired
+
+    def keys(self):
+        with self.lock:
+            return list(self.rows)
+
+    def discard(self, keys):
+        """删除序列的规则状态（例如品种被移除）"""
+        with self.lock:
+            for key in keys:
+                row = self.rows.pop(key, None)
+                if row is not None:
+                    self.active[row] = False
+                    self.last_fired[row] = -np.inf
+                    self.free.append(row)
+
+    def deactivate(self, keys):
+        """解除序列的告警状态，保留冷却计时
+
+        用于不再计算的序列（例如筛选模式下退出排名）：状态停在退出前的值，
+        重新进入时就不会因为“仍处于告警状态”而不通知，冷却仍然限制重复通知。
+        """
+        with self.lock:
+            rows = [self.rows[key] for key in keys if key in self.rows]
+            self.active[rows] = False
+
+
+class Condition:
+    """组合规则里的一个条件（某个周期的某个指标）"""
+
+    __slots__ = ('timeframe', 'indicator', 'op', 'threshold', 'exit')
+
+    def __init__(self, name, timeframe, indicator, op, threshold, exit):
+        self.timeframe = timeframe
+        self.indicator = indicator
+        self.op = op
+        self.threshold, self.exit = _check_threshold(name, indicator, op, threshold, exit)
+
+    def describe(self, value):
+        return f"{self.timeframe} {INDICATOR_NAMES[self.indicator]}: {value:.2f} {self.op} {self.threshold}"
+
+
+class CompoundRule:
+    """同一品种多个条件的组合规则，全部条件成立时告警
+
+    Args:
+        name: 规则名（唯一）
+        conditions: [Condition, ...]
+        cooldown, edge_only, label, flag: 同 AlertRule
+    """
+
+    __slots__ = ('name', 'conditions', 'cooldown', 'edge_only', 'label', 'flag')
+
+    def __init__(self, name, conditions, cooldown=0.0, edge_only=True, label=None, flag=None):
+        if not conditions:
+            raise ValueError(f"组合规则 {name}: 至少需要一个条件")
+        if cooldown < 0:
+            raise ValueError(f"组合规则 {name}: 冷却时间不能为负数")
+        self.name = name
+        self.conditions = list(conditions)
+        self.cooldown = float(cooldown)
+        self.edge_only = bool(edge_only)
+        self.label = label or name
+        self.flag = flag or self.label
+
+    def timeframes(self):
+        """用到的周期（按条件顺序，不重复）"""
+        return list(dict.fromkeys(condition.timeframe for condition in self.conditions))
+
+    def describe(self, values):
+        """(告警文字列表, 语音播报文字)，values 为各条件的当前值"""
+        return ([f"{self.label}: " + "，".join(condition.describe(value)
+                                              for condition, value in zip(self.conditions, values))],
+                self.label)
+
+    def summary(self):
+        """启动日志里的一行说明"""
+        conditions = " 且 ".join(f"{condition.timeframe} {INDICATOR_NAMES[condition.indicator]} "
+                                f"{condition.op} {condition.threshold}" for condition in self.conditions)
+        return f"{self.label}: {conditions}（冷却{self.cooldown:.0f}秒）"
+
+
+def compile_compound_rules(config):
+    """由配置生成组合规则列表
+
+    Raises:
+        ValueError: 规则不合法，或用到了不在监控周期里的周期
+    """
+    rules = []
+    for item in config.compound_rules or ():
+        _check_fields("组合规则", item, CompoundRule.__slots__, ('name', 'conditions'))
+        name = item['name']
+        conditions = []
+        for condition in item['conditions']:
+            _check_fields("组合规则的条件", condition, Condition.__slots__,
+                          ('timeframe', 'indicator', 'op', 'threshold'))
+            if condition['timeframe'] not in config.timeframes:
+                raise ValueError(f"组合规则 {name}: 周期 {condition['timeframe']} 不在监控周期中")
+            values = dict(condition)
+            if 'exit' not in values:
+                values['exit'] = _default_exit(config, values['op'], values['threshold'])
+            conditions.append(Condition(name, **values))
+        values = {'cooldown': config.alert_cooldown, 'edge_only': config.alert_edge_only}
+        values.update(item)
+        values['conditions'] = conditions
+        rules.append(CompoundRule(**values))
+
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError("组合规则名称重复")
+    return rules
+
+
+class CompoundRuleEngine:
+    """按品种保存组合规则的状态，只在输入变化时重新计算
+
+    update 收到一批序列的最新指标后：
+      1. 更新每个序列的最新值缓存，值没有变化的序列跳过
+      2. 由依赖索引（周期 -> 用到它的组合规则）找出受影响的 (品种, 规则)
+      3. 取出这些规则所有条件的缓存值，一次计算每个条件的滞回状态，
+         再用 np.logical_and.reduceat 按规则合并
+    每次调用的开销与变化的输入数成正比，和监控的品种总数无关。
+
+    Args:
+        rules: [CompoundRule, ...]
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        conditions = [condition for rule in self.rules for condition in rule.conditions]
+        self.counts = np.array([len(rule.conditions) for rule in self.rules], dtype=np.intp)
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1])).astype(np.intp)
+        self.below = np.array([condition.op == '<=' for condition in conditions], dtype=bool)
+        self.enter = np.array([condition.threshold for condition in conditions], dtype=np.float64)
+        self.exit = np.array([condition.exit for condition in conditions], dtype=np.float64)
+        self.cooldown = np.array([rule.cooldown for rule in self.rules], dtype=np.float64)
+        self.edge_only = np.array([rule.edge_only for rule in self.rules], dtype=bool)
+
+        # 依赖索引：周期 -> 用到它的组合规则（同一品种内）
+        self.dependents = {}
+        for index, rule in enumerate(self.rules):
+            for timeframe in rule.timeframes():
+                self.dependents.setdefault(timeframe, []).append(index)
+
+        self.lock = threading.Lock()
+        self.latest = {}  # (symbol, timeframe) -> (price, price_line, rsi)
+        self.rows = {}    # symbol -> 状态数组的行号
+        self.free = []
+        self.condition_active = np.zeros((0, len(conditions)), dtype=bool)
+        self.active = np.zeros((0, len(self.rules)), dtype=bool)
+        self.last_fired = np.full((0, len(self.rules)), -np.inf)
+        self.evaluations = 0  # 累计重新计算的 (品种, 规则) 数
+
+    def _row_indices(self, symbols):
+        indices = np.empty(len(symbols), dtype=np.intp)
+        for position, symbol in enumerate(symbols):
+            row = self.rows.get(symbol)
+            if row is None:
+                row = self.free.pop() if self.free else len(self.rows)
+                if row >= len(self.active):
+                    capacity = max(16, len(self.active) * 2)
+                    self.condition_active = _grow(self.condition_active, capacity, False)
+                    self.active = _grow(self.active, capacity, False)
+                    self.last_fired = _grow(self.last_fired, capacity, -np.inf)
+                self.rows[symbol] = row
+            indices[position] = row
+        return indices
+
+    def update(self, rows, now):
+        """记录一批序列的最新指标，重新计算受影响的组合规则
+
+        Args:
+            rows: [(symbol, timeframe, price, price_line, rsi), ...]
+            now: 当前时间（秒），用于冷却
+
+        Returns:
+            需要通知的 [(symbol, CompoundRule, 各条件的当前值, 价格), ...]，
+            价格取第一个条件所在序列的最新价格
+        """
+        if not self.rules:
+            return []
+        with self.lock:
+            dirty = {}
+            for symbol, timeframe, price, price_line, rsi in rows:
+                dependents = self.dependents.get(timeframe)
+                if not dependents:
+                    continue
+                key = (symbol, timeframe)
+                previous = self.latest.get(key)
+                self.latest[key] = (price, price_line, rsi)
+                if previous is not None and previous[1:] == (price_line, rsi):
+                    continue
+                for rule in dependents:
+                    dirty[(symbol, rule)] = None
+            if not dirty:
+                return []
+
+            instances = list(dirty)
+            symbols = [symbol for symbol, _ in instances]
+            symbol_rows = self._row_indices(symbols)
+            rule_indices = np.array([rule for _, rule in instances], dtype=np.intp)
+            counts = self.counts[rule_indices]
+
+            # 所有受影响规则的条件展开成一维，取缓存的最新值（序列还没有数据时为nan）
+            condition_indices = np.concatenate([np.arange(start, start + count) for start, count
+                                                in zip(self.starts[rule_indices], counts)])
+            values = np.full(len(condition_indices), np.nan)
+            position = 0
+            for symbol, rule in instances:
+                for condition in self.rules[rule].conditions:
+                    latest = self.latest.get((symbol, condition.timeframe))
+                    if latest is not None:
+                        values[position] = latest[1 + INDICATORS.index(condition.indicator)]
+                    position += 1
+
+            condition_rows = np.repeat(symbol_rows, counts)
+            was_met = self.condition_active[condition_rows, condition_indices]
+            below = self.below[condition_indices]
+            with np.errstate(invalid='ignore'):
+                entered = np.where(below, values <= self.enter[condition_indices],
+                                   values >= self.enter[condition_indices])
+                held = np.where(below, values <= self.exit[condition_indices],
+                                values >= self.exit[condition_indices])
+            met = np.where(np.isnan(values), was_met, entered | (was_met & held))
+            self.condition_active[condition_rows, condition_indices] = met
+
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            active = np.logical_and.reduceat(met, offsets)
+            was_active = self.active[symbol_rows, rule_indices]
+            last_fired = self.last_fired[symbol_rows, rule_indices]
+            triggered = np.where(self.edge_only[rule_indices], active & ~was_active, active)
+            fired = triggered & (now - last_fired >= self.cooldown[rule_indices])
+            self.active[symbol_rows, rule_indices] = active
+            self.last_fired[symbol_rows, rule_indices] = np.where(fired, now, last_fired)
+            self.evaluations += len(instances)
+
+            result = []
+            for index in np.flatnonzero(fired):
+                symbol, rule = instances[index]
+                rule = self.rules[rule]
+                price = self.latest[(symbol, rule.conditions[0].timeframe)][0]
+                inputs = values[offsets[index]:offsets[index] + counts[index]].tolist()
+                result.append((symbol, rule, inputs, price))
+            return result
+
+    def discard(self, symbols):
+        """删除品种的缓存值和规则状态（例如品种被移除）"""
+        symbols = set(symbols)
+        with self.lock:
+            for key in [key for key in self.latest if key[0] in symbols]:
+                del self.latest[key]
+            for symbol in symbols:
+                row = self.rows.pop(symbol, None)
+                if row is not None:
+                    self.condition_active[row] = False
+                    self.active[row] = False
+                    self.last_fired[row] = -np.inf
+                    self.free.append(row)
+
+    def keys(self):
+        """有缓存值的序列"""
+        with self.lock:
+            return list(self.latest)
+
+    def deactivate(self, keys):
+        """删除序列的缓存值，解除依赖它的条件和规则的状态，保留冷却计时（同 AlertRuleEngine.deactivate）"""
+        with self.lock:
+            for symbol, timeframe in keys:
+                self.latest.pop((symbol, timeframe), None)
+                row = self.rows.get(symbol)
+                if row is None:
+                    continue
+                for rule in self.dependents.get(timeframe, ()):
+                    for offset, condition in enumerate(self.rules[rule].conditions):
+                        if condition.timeframe == timeframe:
+                            self.condition_active[row, self.starts[rule] + offset] = False
+                    self.active[row, rule] = False
+
+
+def _grow(array, capacity, fill):
+    """把状态数组扩到 capacity 行，新行填 fill"""
+    grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测：用录制的K线驱动监控引擎
+
+按模拟时间逐根K线收盘推进，每一步和实盘一样经过
+CandleBufferStore 增量拉取 → 本地聚合 → 价格线/RSI → 告警规则，
+只是数据来自 replay.ReplayAPIClient。输出每一条会触发的告警和吞吐量（根K线/秒），
+既可以用来调阈值，也是可复现的性能测试。
+
+用法:
+    python backtest.py --data klines/ --symbols ETHUSDT --timeframes 3m 15m --rsi-low 20
+"""
+
+import argparse
+import csv
+import sys
+import time
+
+from kline_parser import format_open_time
+from monitor_engine import MonitorConfig, MonitorEngine
+from replay import ReplayAPIClient, add_resampled, load_directory
+
+
+class BacktestAlert:
+    """一条回测告警"""
+
+    __slots__ = ('time', 'symbol', 'timeframe', 'price', 'alerts')
+
+    def __init__(self, time_ms, symbol, timeframe, price, alerts):
+        self.time = time_ms
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.price = price
+        self.alerts = alerts
+
+
+class BacktestReport:
+    """回测结果"""
+
+    def __init__(self):
+        self.alerts = []
+        self.steps = 0
+        self.candles = 0       # 放出的K线数（按数据源计）
+        self.evaluations = 0   # 指标计算次数（按品种/周期计）
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def candles_per_second(self):
+        return self.candles / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BacktestRunner:
+    """回测驱动器
+
+    Args:
+        config: MonitorConfig（阈值、周期等与实盘一致）
+        series: {(symbol, timeframe): KlineColumns}，通常来自 replay.load_directory
+    """
+
+    def __init__(self, config, series):
+        self.config = config
+        self.client = ReplayAPIClient(series)
+        self.report = None
+        self.now = None
+
+    def _on_status(self, symbol, timeframe, price, price_line, rsi, alert):
+        self.report.evaluations += 1
+
+    def _on_alert(self, symbol, timeframe, alerts, price, speech_msg):
+        self.report.alerts.append(BacktestAlert(self.now, symbol, timeframe, price, list(alerts)))
+
+    def _on_log(self, text, color=None):
+        if color == 'yellow':
+            self.report.errors += 1
+
+    def _plan(self, engine):
+        """规划数据源
+
+        需要的1m基础数据不存在时改为直接回放各周期；
+        某个周期没有录制数据但有1m数据时，先离线聚合出这个周期。
+        """
+        pairs = engine.pairs()
+        sources = engine.buffer_store.plan(pairs)
+        series = self.client.series
+        if self.config.resample_enabled and any(key not in series for key in sources):
+            self.config.resample_enabled = False
+            sources = engine.buffer_store.plan(pairs)
+
+        missing = add_resampled(series, sources)
+        if missing:
+            raise ValueError("缺少回放数据: " + ", ".join(f"{s}/{tf}" for s, tf in missing))
+        return sources
+
+    def run(self, start=None, end=None):
+        """运行回测
+
+        Args:
+            start, end: 可选，模拟时间范围（毫秒）
+
+        Returns:
+            BacktestReport
+        """
+        self.report = report = BacktestReport()
+        engine = MonitorEngine(self.config, on_log=self._on_log, on_status=self._on_status,
+                               on_alert=self._on_alert, api_client=self.client,
+                               clock=lambda: self.now / 1000.0)
+        engine.setup()
+        try:
+            sources = self._plan(engine)
+
+            # 所有数据源的收盘时刻合并成模拟时间轴，每一步只拉取在这一刻收盘的数据源
+            schedule = {}
+            for key in sources:
+                for close_time in self.client.close_times(*key).tolist():
+                    if (start is None or close_time >= start) and (end is None or close_time <= end):
+                        schedule.setdefault(close_time, []).append(key)
+
+            started = time.perf_counter()
+            for now in sorted(schedule):
+                due = schedule[now]
+                self.now = self.client.now = now
+                engine.run_cycle(sources, due)
+                report.steps += 1
+                report.candles += len(due)
+            report.elapsed = time.perf_counter() - started
+        finally:
+            engine.stop()
+        report.alerts.sort(key=lambda alert: (alert.time, alert.symbol, alert.timeframe))
+        return report
+
+
+def write_alerts_csv(path, alerts):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'symbol', 'timeframe', 'price', 'alerts'])
+        for alert in alerts:
+            writer.writerow([format_open_time(alert.time), alert.symbol, alert.timeframe,
+                             f"{alert.price:.8g}", ' | '.join(alert.alerts)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='用录制的K线回测告警')
+    parser.add_argument('--data', required=True, help='K线文件目录')
+    parser.add_argument('--symbols', nargs='+', required=True)
+    parser.add_argument('--timeframes', nargs='+', required=True)
+    parser.add_argument('--price-line-low', type=float)
+    parser.add_argument('--price-line-high', type=float)
+    parser.add_argument('--rsi-low', type=float)
+    parser.add_argument('--rsi-high', type=float)
+    parser.add_argument('--hysteresis', type=float, help='告警解除前需要回到阈值之外的宽度')
+    parser.add_argument('--cooldown', type=float, help='同一规则两次告警的最短间隔（秒，模拟时间）')
+    parser.add_argument('--level', action='store_true', help='告警状态期间按冷却时间重复告警（默认只在进入时告警）')
+    parser.add_argument('--workers', type=int, default=1, help='抓取线程数（1时结果顺序完全确定）')
+    parser.add_argument('--csv', help='把告警写入CSV文件')
+    parser.add_argument('--quiet', action='store_true', help='不逐条打印告警')
+    args = parser.parse_args(argv)
+
+    config = MonitorConfig()
+    config.symbols = [symbol.upper() for symbol in args.symbols]
+    config.timeframes = args.timeframes
+    config.max_workers = args.workers
+    for name in ('price_line_low', 'price_line_high', 'rsi_low', 'rsi_high'):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(config, name, value)
+    if args.hysteresis is not None:
+        config.alert_hysteresis = args.hysteresis
+    if args.cooldown is not None:
+        config.alert_cooldown = args.cooldown
+    if args.level:
+        config.alert_edge_only = False
+
+    load_started = time.perf_counter()
+    timeframes = set(config.timeframes) | {'1m'}
+    series = load_directory(args.data, set(config.symbols), timeframes)
+    print(f"载入 {len(series)} 个序列，{sum(len(c) for c in series.values())} 根K线，"
+          f"耗时 {time.perf_counter() - load_started:.2f}s")
+
+    try:
+        report = BacktestRunner(config, series).run()
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    if not args.quiet:
+        for alert in report.alerts:
+            print(f"{format_open_time(alert.time)} [{alert.symbol}/{alert.timeframe}] "
+                  f"价格:{alert.price:.2f} | {' | '.join(alert.alerts)}")
+    if args.csv:
+        write_alerts_csv(args.csv, report.alerts)
+
+    print(f"模拟 {report.steps} 步，{report.candles} 根K线，计算 {report.evaluations} 次，"
+          f"告警 {len(report.alerts)} 条，错误 {report.errors} 条")
+    print(f"耗时 {report.elapsed:.2f}s，吞吐量 {report.candles_per_second:.0f} 根K线/秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+K线解析基准测试：每1000根K线的解析耗时
+
+对比三种路径：
+  legacy   旧版 fetch_kline_data：json解码 + 逐行float() + 每行strftime
+  decoded  parse_klines：json解码后整体转换为NumPy列
+  raw      parse_klines_json：直接从原始响应解析，跳过json解码
+
+用法:
+    python benchmarks/bench_kline_parse.py [--candles 1000] [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kline_parser import parse_klines, parse_klines_json  # noqa: E402
+
+
+def make_payload(count, seed=42):
+    """生成与 /api/v3/klines 格式一致的原始响应"""
+    rng = random.Random(seed)
+    start = 1700000000000
+    price = 2000.0
+    rows = []
+    for i in range(count):
+        open_price = price
+        close_price = open_price + rng.uniform(-5, 5)
+        high = max(open_price, close_price) + rng.random() * 3
+        low = min(open_price, close_price) - rng.random() * 3
+        price = close_price
+        open_time = start + i * 60000
+        rows.append([
+            open_time, f"{open_price:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close_price:.8f}",
+            f"{rng.uniform(10, 1000):.8f}", open_time + 59999, f"{rng.uniform(1e4, 1e6):.8f}",
+            rng.randint(100, 5000), f"{rng.uniform(1, 500):.8f}", f"{rng.uniform(1e3, 1e5):.8f}", "0"
+        ])
+    return json.dumps(rows, separators=(',', ':')).encode('utf-8')
+
+
+def legacy_parse(content):
+    """旧版解析逻辑（fetch_kline_data 原实现）"""
+    data = json.loads(content)
+    dates, highs, lows, closes = [], [], [], []
+    for kline in data:
+        dates.append(datetime.fromtimestamp(kline[0] / 1000).strftime('%Y-%m-%d %H:%M:%S'))
+        highs.append(float(kline[2]))
+        lows.append(float(kline[3]))
+        closes.append(float(kline[4]))
+    return highs, lows, closes
+
+
+def bench(func, repeat):
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='K线解析基准测试')
+    parser.add_argument('--candles', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    content = make_payload(args.candles)
+    scale = 1000.0 / args.candles
+
+    cases = [
+        ('legacy', lambda: legacy_parse(content)),
+        ('decoded', lambda: parse_klines(json.loads(content))),
+        ('raw', lambda: parse_klines_json(content)),
+    ]
+
+    print(f"K线数: {args.candles}，结果为每1000根K线的耗时")
+    baseline = None
+    for name, func in cases:
+        elapsed = bench(func, args.repeat) * scale * 1000
+        baseline = baseline or elapsed
+        print(f"  {name:<8} {elapsed:8.3f} ms   x{baseline / elapsed:.1f}")
+
+
+if __name__ == '__main__':
+    main()
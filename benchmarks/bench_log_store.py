@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+日志写入基准测试：推送10000行日志
+
+对比两种路径（只测模型侧，不依赖Kivy）：
+  legacy  旧版 append_log：每行把整段日志文本 split/截断/join 后赋回Label
+          （实际界面上每次赋值还会触发整段markup重新排版和生成纹理）
+  store   LogStore.append + 每帧一次 snapshot（即 LogView.flush 交给RecycleView的数据）
+
+用法:
+    python benchmarks/bench_log_store.py [--lines 10000] [--lines-per-frame 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from view_models import LogStore, format_log_line  # noqa: E402
+
+
+def legacy_append(lines):
+    text = ''
+    renders = 0
+    for line in lines:
+        new_text = format_log_line(line)
+        rows = text.split('\n')
+        if len(rows) > 100:
+            rows = rows[-100:]
+        rows.append(new_text)
+        text = '\n'.join(rows)
+        renders += 1  # 每行一次整段重新排版
+    return renders
+
+
+def store_append(lines, lines_per_frame):
+    store = LogStore(max_lines=500)
+    version = None
+    renders = 0
+    for i, line in enumerate(lines, 1):
+        store.append(line)
+        if i % lines_per_frame == 0:
+            rows, version = store.snapshot(version)
+            if rows is not None:
+                renders += 1
+    rows, version = store.snapshot(version)
+    return renders + (rows is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志写入基准测试')
+    parser.add_argument('--lines', type=int, default=10000)
+    parser.add_argument('--lines-per-frame', type=int, default=5,
+                        help='两帧之间写入的日志行数（一次告警约5行）')
+    args = parser.parse_args()
+
+    lines = [f"[ETHUSDT/1m] 价格:{2000 + i * 0.01:.2f} | 价格线:{i % 100:.1f} | RSI:{i % 97:.1f}"
+             for i in range(args.lines)]
+
+    print(f"日志行数: {args.lines}，每帧写入 {args.lines_per_frame} 行")
+    start = time.perf_counter()
+    renders = legacy_append(lines)
+    elapsed = time.perf_counter() - start
+    print(f"  legacy {elapsed * 1000:9.1f} ms   {elapsed / args.lines * 1e6:6.2f} us/行   界面刷新 {renders} 次")
+
+    start = time.perf_counter()
+    renders = store_append(lines, args.lines_per_frame)
+    elapsed = time.perf_counter() - start
+    print(f"  store  {elapsed * 1000:9.1f} ms   {elapsed / args.lines * 1e6:6.2f} us/行   界面刷新 {renders} 次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+指标埋点开销基准测试
+
+分别测量开启和关闭时一次 counter.inc、histogram.observe、with histogram.time() 的耗时，
+以及一次 /metrics 渲染的耗时。
+
+用法:
+    python benchmarks/bench_metrics.py [--iterations 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry  # noqa: E402
+
+
+def measure(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations
+
+
+def bench(enabled, iterations):
+    registry = MetricsRegistry(enabled=enabled)
+    counter = registry.counter('bench_total', '计数').labels('ETHUSDT', '3m')
+    histogram = registry.histogram('bench_seconds', '耗时', ('stage',)).labels('fetch')
+
+    def timed():
+        with histogram.time():
+            pass
+
+    return {
+        'inc': measure(counter.inc, iterations),
+        'observe': measure(lambda: histogram.observe(0.003), iterations),
+        'time': measure(timed, iterations),
+    }, registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='指标埋点开销基准测试')
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    baseline = measure(lambda: None, args.iterations)
+    for enabled in (True, False):
+        results, registry = bench(enabled, args.iterations)
+        label = '开启' if enabled else '关闭'
+        print(f"{label}: " + "  ".join(f"{name} {(value - baseline) * 1e6:.2f}µs"
+                                       for name, value in results.items()))
+    registry = bench(True, 1000)[1]
+    render = measure(registry.render, 200)
+    print(f"渲染 /metrics: {render * 1e3:.3f}ms（{len(registry.render().splitlines())} 行）")
+
+
+if __name__ == '__main__':
+    main()
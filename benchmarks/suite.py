@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+热点路径基准测试套件
+
+在确定性的合成K线上测量：
+  price_line   PriceLineCalculator.calculate_price_line
+  tdx_sma      PriceLineCalculator.tdx_sma
+  ema          PriceLineCalculator.ema
+  rsi          RSICalculator.calculate_rsi
+  fetch        PriceLineCalculator.fetch_kline_data（BinanceAPIClient + 假Session，只测解码和解析）
+  cycle        MonitorEngine.run_cycle 一整轮（进程内的合成数据源，每轮推进一分钟）
+每项按序列长度（默认 100/1000/100000）和品种数（默认 1/10/100）组合测量，
+总K线数超过 --max-candles 的组合跳过。
+
+结果写入JSON（--output），--compare 与保存的基线比较，
+任何一项比基线慢超过 --threshold 百分比时以退出码1结束，可以直接用在CI里。
+比较的是每次调用的最好成绩（best），它受机器负载的影响最小。
+
+用法:
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --compare baseline.json --threshold 15
+    python benchmarks/suite.py --compare baseline.json --current other.json
+    python benchmarks/suite.py --cases price_line rsi --lengths 1000
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from kline_parser import KlineColumns  # noqa: E402
+from monitor_engine import (MonitorConfig, BinanceAPIClient, PriceLineCalculator,  # noqa: E402
+                            RSICalculator, MonitorEngine)
+from replay import ReplayAPIClient  # noqa: E402
+
+RESULT_VERSION = 1
+START_TIME = 1700000040000  # 合成K线的第一根开盘时间（整分钟）
+MINUTE_MS = 60000
+
+
+def make_columns(length, seed=42):
+    """生成1m随机游走K线"""
+    rng = np.random.default_rng(seed)
+    closes = 2000 + np.cumsum(rng.normal(0, 2, length))
+    opens = np.concatenate(([closes[0]], closes[:-1]))
+    highs = np.maximum(opens, closes) + rng.random(length) * 3
+    lows = np.minimum(opens, closes) - rng.random(length) * 3
+    volumes = rng.uniform(10, 1000, length)
+    open_times = START_TIME + np.arange(length, dtype=np.int64) * MINUTE_MS
+    return KlineColumns(open_times, opens, highs, lows, closes, volumes)
+
+
+def make_payload(columns):
+    """与 /api/v3/klines 格式一致的原始响应"""
+    rows = []
+    for open_time, (o, h, l, c, v) in zip(columns.open_times.tolist(), columns.values().tolist()):
+        rows.append([open_time, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.8f}",
+                     open_time + MINUTE_MS - 1, "0", 0, "0", "0", "0"])
+    return json.dumps(rows, separators=(',', ':')).encode('utf-8')
+
+
+def bench_config(**overrides):
+    config = MonitorConfig()
+    config.request_weight_limit = 10 ** 9  # 基准测试不受本地限速影响
+    config.max_retries = 0
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
+
+
+def loaded_calculators(length, pairs):
+    calcs = []
+    for seed in range(pairs):
+        calc = PriceLineCalculator(None, bench_config())
+        success, error = calc.load_kline_data(make_columns(length, seed))
+        if not success:
+            raise ValueError(error)
+        calcs.append(calc)
+    return calcs
+
+
+class _FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class _FakeSession:
+    """固定返回同一份响应的Session"""
+
+    def __init__(self, content):
+        self.response = _FakeResponse(content)
+
+    def get(self, url, params=None, timeout=None):
+        return self.response
+
+    def close(self):
+        pass
+
+
+class SyntheticClient(ReplayAPIClient):
+    """进程内的合成数据源：预先生成足够多的1m K线，每轮 advance 放出下一分钟"""
+
+    def __init__(self, symbols, warmup, steps):
+        series = {(symbol, '1m'): make_columns(warmup + steps, seed)
+                  for seed, symbol in enumerate(symbols)}
+        super().__init__(series, now=START_TIME + warmup * MINUTE_MS)
+        self.end = START_TIME + (warmup + steps) * MINUTE_MS
+
+    def advance(self):
+        if self.now >= self.end:
+            raise RuntimeError("合成数据已用完，增大 steps")
+        self.now += MINUTE_MS
+
+
+# 每项的 setup(length, pairs) 返回被测函数（一次调用处理全部品种）
+
+def setup_price_line(length, pairs):
+    calcs = loaded_calculators(length, pairs)
+    return lambda: [calc.calculate_price_line() for calc in calcs]
+
+
+def setup_tdx_sma(length, pairs):
+    calcs = loaded_calculators(length, pairs)
+    return lambda: [calc.tdx_sma(calc.closes, 8) for calc in calcs]
+
+
+def setup_ema(length, pairs):
+    calcs = loaded_calculators(length, pairs)
+    return lambda: [calc.ema(calc.closes, 8) for calc in calcs]
+
+
+def setup_rsi(length, pairs):
+    calcs = loaded_calculators(length, pairs)
+    return lambda: [RSICalculator.calculate_rsi(calc.closes, 6) for calc in calcs]
+
+
+def setup_fetch(length, pairs):
+    client = BinanceAPIClient(bench_config())
+    client.session = _FakeSession(make_payload(make_columns(length)))
+    calcs = [PriceLineCalculator(client, client.config) for _ in range(pairs)]
+
+    def run():
+        for calc in calcs:
+            success, error = calc.fetch_kline_data('ETHUSDT', '1m')
+            if not success:
+                raise RuntimeError(error)
+    return run
+
+
+def setup_cycle(length, pairs, steps=20000):
+    """length 为每个周期的K线数（config.limit），1m/5m/15m 共用一个1m数据源"""
+    symbols = [f"S{index:03d}USDT" for index in range(pairs)]
+    config = bench_config(symbols=symbols, timeframes=['1m', '5m', '15m'], limit=length,
+                          resample_base_limit=max(length * 16, 1600))
+    client = SyntheticClient(symbols, config.resample_base_limit, steps)
+    engine = MonitorEngine(config, api_client=client)
+    engine.setup()
+    sources = engine.buffer_store.plan(engine.pairs())
+    due = list(sources)
+    errors = []
+    engine.on_log = lambda text, color=None: errors.append(text) if color == 'yellow' else None
+    engine.run_cycle(sources, due)  # 首轮整段回补，不计入
+
+    def run():
+        client.advance()
+        engine.run_cycle(sources, due)
+        if errors:
+            raise RuntimeError(errors[0])
+    return run
+
+
+CASES = {
+    'price_line': setup_price_line,
+    'tdx_sma': setup_tdx_sma,
+    'ema': setup_ema,
+    'rsi': setup_rsi,
+    'fetch': setup_fetch,
+    'cycle': setup_cycle,
+}
+
+# 整轮检查的长度是每个周期的K线数，不需要测到10万根
+CASE_MAX_LENGTH = {'cycle': 1000}
+
+
+def case_name(case, length, pairs):
+    return f"{case} n={length} pairs={pairs}"
+
+
+def measure(func, min_time=0.1, repeat=5, max_number=10000):
+    """类似 timeit.autorange：每组至少运行 min_time 秒，返回 (每次调用的最好/中位耗时, 每组次数)"""
+    func()  # 预热
+    number = 1
+    while number < max_number:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - started >= min_time:
+            break
+        number = min(max_number, number * 4)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return min(samples), float(np.median(samples)), number
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'commit': commit,
+    }
+
+
+def run_suite(cases, lengths, pair_counts, max_candles, min_time, repeat, on_result=None):
+    results = {}
+    for case in cases:
+        for length in lengths:
+            if length > CASE_MAX_LENGTH.get(case, length):
+                continue
+            for pairs in pair_counts:
+                if length * pairs > max_candles:
+                    continue
+                func = CASES[case](length, pairs)
+                best, median, number = measure(func, min_time, repeat)
+                result = {
+                    'case': case,
+                    'length': length,
+                    'pairs': pairs,
+                    'number': number,
+                    'best': best,
+                    'median': median,
+                }
+                results[case_name(case, length, pairs)] = result
+                if on_result:
+                    on_result(case_name(case, length, pairs), result)
+    return results
+
+
+def compare(baseline, current, threshold):
+    """比较两份结果
+
+    Returns:
+        ([(名称, 基线, 当前, 变化百分比或None, 是否变慢), ...], 是否有变慢的项)
+    """
+    rows = []
+    regressed = False
+    for name in sorted(set(baseline) | set(current)):
+        old = baseline.get(name)
+        new = current.get(name)
+        if old is None or new is None:
+            rows.append((name, old and old['best'], new and new['best'], None, False))
+            continue
+        change = (new['best'] / old['best'] - 1) * 100
+        slower = change > threshold
+        regressed = regressed or slower
+        rows.append((name, old['best'], new['best'], change, slower))
+    return rows, regressed
+
+
+def format_time(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def format_comparison(rows, threshold):
+    width = max([len(row[0]) for row in rows] + [4])
+    time_width = 10
+    # 中文标题每个字占两列，按显示宽度补齐到与数据列相同的宽度
+    pad = ' ' * (time_width - 4)
+    lines = [f"  {'项目' + ' ' * (width - 4)} {pad}基线 {pad}当前     变化"]
+    for name, old, new, change, slower in rows:
+        if change is None:
+            status = '（基线缺少）' if old is None else '（未运行）'
+            lines.append(f"  {name:<{width}} {format_time(old):>{time_width}} "
+                         f"{format_time(new):>{time_width}}  {status}")
+            continue
+        mark = f'  变慢超过{threshold:g}%' if slower else ''
+        lines.append(f"  {name:<{width}} {format_time(old):>{time_width}} "
+                     f"{format_time(new):>{time_width}}  {change:+6.1f}%{mark}")
+    return '\n'.join(lines)
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != RESULT_VERSION:
+        raise ValueError(f"{path}: 不支持的结果版本 {data.get('version')}")
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='热点路径基准测试套件')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--lengths', type=int, nargs='+', default=[100, 1000, 100000])
+    parser.add_argument('--pairs', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--max-candles', type=int, default=1000000, help='跳过 长度×品种数 超过该值的组合')
+    parser.add_argument('--min-time', type=float, default=0.1, help='每组测量的最短时间（秒）')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的组数')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    parser.add_argument('--compare', metavar='BASELINE', help='与基线结果比较')
+    parser.add_argument('--current', help='与 --compare 一起使用：比较这个文件而不是重新运行')
+    parser.add_argument('--threshold', type=float, default=10.0, help='变慢超过该百分比视为退化')
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.compare) if args.compare else None
+
+    if args.current:
+        if baseline is None:
+            parser.error('--current 需要和 --compare 一起使用')
+        current = load_results(args.current)
+    else:
+        print(f"Python {platform.python_version()}，NumPy {np.__version__}；结果为每次调用处理全部品种的最好成绩")
+        results = run_suite(
+            args.cases, args.lengths, args.pairs, args.max_candles, args.min_time, args.repeat,
+            on_result=lambda name, r: print(f"  {name:<32} {format_time(r['best']):>10}"
+                                            f"  (中位 {format_time(r['median'])}，×{r['number']})"))
+        current = {
+            'version': RESULT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'settings': {'min_time': args.min_time, 'repeat': args.repeat},
+            'results': results,
+        }
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(current, f, ensure_ascii=False, indent=2)
+            print(f"结果已写入 {args.output}")
+
+    if baseline is None:
+        return 0
+
+    old_env, new_env = baseline.get('environment', {}), current.get('environment', {})
+    for key in ('python', 'numpy', 'machine'):
+        if old_env.get(key) != new_env.get(key):
+            print(f"注意: 运行环境不同（{key}: {old_env.get(key)} -> {new_env.get(key)}）")
+    rows, regressed = compare(baseline['results'], current['results'], args.threshold)
+    print(f"与基线比较（{baseline.get('created')}，提交 {old_env.get('commit')}）:")
+    print(format_comparison(rows, args.threshold))
+    if regressed:
+        print(f"有项目变慢超过 {args.threshold:g}%")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
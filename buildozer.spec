@@ -14,7 +14,7 @@ source.include_exts = py,png,jpg,kv,atlas
 version = 1.0.0
 
 # 依赖 - 移除版本号以避免冲突
-requirements = python3,kivy,requests,numpy,plyer,android,urllib3
+requirements = python3,kivy,requests,numpy,plyer,android,urllib3,websocket-client,sqlite3
 
 # 权限
 android.permissions = INTERNET,VIBRATE,WAKE_LOCK
@@ -41,7 +41,7 @@ p4a.bootstrap = sdl2
 
 # 源码排除
 source.exclude_exts = spec
-source.exclude_dirs = tests, bin, .venv, buildozer-venv, __pycache__
+source.exclude_dirs = tests, bin, devtools, benchmarks, .venv, buildozer-venv, __pycache__
 
 # 包含字体文件
 source.include_patterns = fonts/*.otf,fonts/*.ttf
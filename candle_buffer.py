@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+K线缓冲区
+
+每个(品种, 周期)保存一份按开盘时间排序的K线序列，
+REST回补和WebSocket推送都写入同一个缓冲区：
+同一开盘时间的K线原地替换（未收盘K线不断更新），更新的K线追加到末尾。
+
+首次回补之后，CandleBufferStore 只请求最后已知开盘时间之后的K线（startTime + 小limit），
+稳态下每次只下载和解析几根K线。
+配置了磁盘缓存（candle_cache.CandleCache）时，新建的缓冲区先从缓存载入，只拉取缺失的尾部。
+"""
+
+import threading
+
+import numpy as np
+
+from kline_parser import KlineColumns, columns_from_matrix, concat_columns, parse_klines
+from resample import BASE_TIMEFRAME, ResampledSeries, can_resample
+
+
+class CandleBuffer:
+    """单个品种/周期的K线缓冲区
+
+    数据保存在预分配的NumPy数组中（容量为 max_size 的两倍），
+    有效区间为 [start, end)；写满时把最近的数据整体搬回开头，追加的均摊开销为O(1)。
+    """
+
+    def __init__(self, symbol, timeframe, max_size=100):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.version = 0  # 每次内容变化加1，用于判断指标是否需要重算
+        self.history_complete = False  # 交易所已没有更早的K线（新上线品种不足max_size根）
+        self._allocate(max_size)
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_open_time(self):
+        """最后一根K线的开盘时间（毫秒），缓冲区为空时为None"""
+        return int(self._times[self._end - 1]) if self._end > self._start else None
+
+    def resize(self, max_size):
+        """调整最大长度，保留最近的数据"""
+        with self.lock:
+            if max_size == self.max_size:
+                return
+            times = self._times[self._start:self._end][-max_size:].copy()
+            values = self._values[self._start:self._end][-max_size:].copy()
+            self.max_size = max_size
+            self._allocate(max_size)
+            self._append_block(times, values)
+
+    def apply_kline(self, open_time, open_price, high, low, close, volume):
+        """写入一根K线
+
+        Returns:
+            True表示缓冲区发生了变化
+        """
+        open_time = int(open_time)
+        row = (float(open_price), float(high), float(low), float(close), float(volume))
+
+        with self.lock:
+            last = self._end - 1
+            if self._end == self._start or open_time > self._times[last]:
+                # 新K线追加
+                self._append_block(np.array([open_time], dtype=np.int64), np.array([row]))
+            else:
+                # 旧K线：找到同一开盘时间则原地替换（绝大多数命中最后一根）
+                if open_time == self._times[last]:
+                    index = last
+                else:
+                    index = self._start + int(np.searchsorted(self._times[self._start:self._end], open_time))
+                    if self._times[index] != open_time:
+                        return False
+                if tuple(self._values[index]) == row:
+                    return False
+                self._values[index] = row
+
+            self.version += 1
+            return True
+
+    def apply_rest_klines(self, data):
+        """写入REST接口返回的K线（回补或增量拉取）
+
+        Args:
+            data: KlineColumns，或JSON解码后的K线数组
+
+        Returns:
+            发生变化的K线数量
+        """
+        if not isinstance(data, KlineColumns):
+            data = parse_klines(data)
+        if len(data) == 0:
+            return 0
+
+        times = data.open_times
+        values = data.values()
+        changed = 0
+
+        with self.lock:
+            count = self._end - self._start
+            if count:
+                # 已有的开盘时间：只覆盖数值发生变化的行
+                existing = times <= self._times[self._end - 1]
+                if existing.any():
+                    current = self._times[self._start:self._end]
+                    old_times = times[existing]
+                    positions = np.minimum(np.searchsorted(current, old_times), count - 1)
+                    found = current[positions] == old_times
+                    positions = positions[found] + self._start
+                    new_values = values[existing][found]
+                    differs = np.any(self._values[positions] != new_values, axis=1)
+                    self._values[positions[differs]] = new_values[differs]
+                    changed += int(differs.sum())
+                    times = times[~existing]
+                    values = values[~existing]
+
+            if len(times):
+                self._append_block(times, values)
+                changed += len(times)
+
+            if changed:
+                self.version += 1
+        return changed
+
+    def clear(self):
+        """清空缓冲区（缺口太大无法衔接时重新回补）"""
+        with self.lock:
+            self._start = self._end = 0
+            self.version += 1
+
+    def snapshot(self):
+        """返回 (highs, lows, closes) 数组副本，供指标计算使用"""
+        with self.lock:
+            values = self._values[self._start:self._end]
+            return values[:, 1].copy(), values[:, 2].copy(), values[:, 3].copy()
+
+    def columns(self):
+        """返回全部列数据的副本"""
+        with self.lock:
+            return columns_from_matrix(self._times[self._start:self._end].copy(),
+                                       self._values[self._start:self._end].copy())
+
+    def _allocate(self, max_size):
+        capacity = max(2 * max_size, 1)
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty((capacity, 5), dtype=np.float64)  # open, high, low, close, volume
+        self._start = self._end = 0
+
+    def _append_block(self, times, values):
+        if len(times) > self.max_size:
+            times = times[-self.max_size:]
+            values = values[-self.max_size:]
+        count = len(times)
+
+        if self._end + count > len(self._times):
+            # 空间不足：把仍需保留的最近数据搬回开头
+            keep = min(self._end - self._start, self.max_size - count)
+            self._times[:keep] = self._times[self._end - keep:self._end]
+            self._values[:keep] = self._values[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+
+        self._times[self._end:self._end + count] = times
+        self._values[self._end:self._end + count] = values
+        self._end += count
+        self._start = max(self._start, self._end - self.max_size)
+
+
+class CandleBufferStore:
+    """按(品种, 周期)持久保存K线缓冲区，并负责增量拉取
+
+    Args:
+        cache: 可选 CandleCache，缓冲区新建时从中载入、变化后写回
+        on_log: 可选日志回调 on_log(text, color=None)，磁盘缓存读写失败时调用；默认打印
+    """
+
+    def __init__(self, api_client, config, cache=None, on_log=None):
+        self.api_client = api_client
+        self.config = config
+        self.cache = cache
+        self.on_log = on_log
+        self.buffers = {}
+        self.derived = {}  # (symbol, timeframe) -> ResampledSeries
+        self.saved = {}  # (symbol, timeframe) -> 已写入缓存的 (版本号, 最后开盘时间)
+        self.lock = threading.Lock()
+        # 抓取线程、推送线程和停止时的最后一次保存都会读写磁盘缓存和 saved，由这把锁串行化
+        self.cache_lock = threading.Lock()
+
+    def get(self, symbol, timeframe, max_size=None):
+        """获取（必要时创建）缓冲区，新建或扩容时从磁盘缓存载入"""
+        key = (symbol, timeframe)
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = CandleBuffer(symbol, timeframe, max_size or self.config.limit)
+                self.buffers[key] = buffer
+                self._load_cached(buffer)
+            elif max_size and buffer.max_size < max_size:
+                buffer.resize(max_size)
+                self._load_cached(buffer)
+            return buffer
+
+    def _load_cached(self, buffer):
+        with self.cache_lock:
+            if self.cache is None:
+                return
+            try:
+                columns = self.cache.load(buffer.symbol, buffer.timeframe, buffer.max_size)
+            except Exception as e:
+                self._log(f"[{buffer.symbol}/{buffer.timeframe}] 读取K线缓存失败: {e}", color='yellow')
+                return
+            if columns is not None:
+                buffer.apply_rest_klines(columns)
+                self.saved[(buffer.symbol, buffer.timeframe)] = (buffer.version, buffer.last_open_time)
+
+    def save(self, symbol, timeframe):
+        """把缓冲区自上次保存以来变化的K线写入磁盘缓存
+
+        上次保存的最后一根可能当时还没收盘，所以从它开始重写。
+        """
+        with self.cache_lock:
+            self._save(symbol, timeframe)
+
+    def _save(self, symbol, timeframe):
+        if self.cache is None:
+            return
+        key = (symbol, timeframe)
+        buffer = self.buffers.get(key)
+        if buffer is None or len(buffer) == 0:
+            return
+        version, last_saved = self.saved.get(key, (None, None))
+        if version == buffer.version:
+            return
+
+        columns = buffer.columns()
+        version = buffer.version
+        if last_saved is not None:
+            start = int(np.searchsorted(columns.open_times, last_saved))
+            columns = columns.tail(len(columns) - start)
+        try:
+            self.cache.save(symbol, timeframe, columns, max(buffer.max_size, self.cache.max_rows))
+        except Exception as e:
+            self._log(f"[{symbol}/{timeframe}] 写入K线缓存失败: {e}", color='yellow')
+            return
+        self.saved[key] = (version, int(columns.open_times[-1]))
+
+    def save_all(self):
+        """保存所有缓冲区"""
+        with self.cache_lock:
+            for symbol, timeframe in list(self.buffers):
+                self._save(symbol, timeframe)
+
+    def close(self):
+        """最后保存一次所有缓冲区并关闭磁盘缓存
+
+        之后仍在运行的抓取/推送线程调用 save 时不再写入（不会用到已关闭的连接）。
+        """
+        with self.cache_lock:
+            cache = self.cache
+            if cache is None:
+                return
+            for symbol, timeframe in list(self.buffers):
+                self._save(symbol, timeframe)
+            self.cache = None
+            cache.close()
+
+    def _log(self, text, color=None):
+        if self.on_log:
+            self.on_log(text, color=color)
+        else:
+            print(text)
+
+    def plan(self, pairs):
+        """规划本轮需要请求的数据源
+
+        同一品种有两个及以上周期能由1m聚合时，这些周期共用一份1m基础缓冲区，
+        其余周期（例如1d）仍请求原生K线。
+
+        Returns:
+            {(symbol, source_timeframe): [timeframe, ...]}
+        """
+        base_size = self.config.resample_base_limit
+        derivable = {}
+        if self.config.resample_enabled:
+            for symbol, timeframe in pairs:
+                if can_resample(timeframe, self.config.limit, base_size):
+                    derivable.setdefault(symbol, []).append(timeframe)
+
+        sources = {}
+        for symbol, timeframe in pairs:
+            if len(derivable.get(symbol, [])) >= 2 and timeframe in derivable[symbol]:
+                self.get(symbol, BASE_TIMEFRAME, max_size=base_size)
+                with self.lock:
+                    if (symbol, timeframe) not in self.derived:
+                        self.derived[(symbol, timeframe)] = ResampledSeries(
+                            self.buffers[(symbol, BASE_TIMEFRAME)], timeframe, self.config.limit)
+                sources.setdefault((symbol, BASE_TIMEFRAME), []).append(timeframe)
+            else:
+                with self.lock:
+                    self.derived.pop((symbol, timeframe), None)
+                sources.setdefault((symbol, timeframe), []).append(timeframe)
+        return sources
+
+    def get_series(self, symbol, timeframe):
+        """获取某个周期用于指标计算的序列（聚合序列或原生缓冲区）"""
+        with self.lock:
+            series = self.derived.get((symbol, timeframe))
+        return series if series is not None else self.get(symbol, timeframe)
+
+    def refresh(self, symbol, timeframe, deadline=None):
+        """拉取缓冲区缺少的K线
+
+        缓冲区未填满时整段回补；之后从最后已知开盘时间开始增量拉取，
+        返回的第一根就是正在形成的K线（原地替换），其后是新收盘/新开的K线（追加）。
+
+        Args:
+            deadline: 可选 resilience.Deadline，翻页的每个请求共用这一轮的时间预算
+
+        Returns:
+            (success, buffer, error)，与 fetch_klines 的返回格式一致，便于交给抓取引擎
+        """
+        buffer = self.get(symbol, timeframe)
+        last_open_time = buffer.last_open_time
+
+        if last_open_time is None or (len(buffer) < buffer.max_size and not buffer.history_complete):
+            success, data, error = self._fetch_history(symbol, timeframe, buffer.max_size, deadline)
+            if not success:
+                return False, buffer, error
+            if last_open_time is not None and int(data.open_times[0]) > last_open_time:
+                # 缺口超过一次请求能覆盖的长度，旧数据无法衔接
+                buffer.clear()
+            buffer.apply_rest_klines(data)
+            buffer.history_complete = len(data) < buffer.max_size
+            self.save(symbol, timeframe)
+            return True, buffer, None
+
+        limit = self.config.incremental_limit
+        success, data, error = self.api_client.fetch_klines(
+            symbol, timeframe, start_time=last_open_time, limit=limit, as_columns=True, deadline=deadline)
+        if not success:
+            return False, buffer, error
+
+        if len(data) >= limit:
+            # 落后较多（例如应用被挂起或从磁盘缓存启动），向后翻页补齐缺失的尾部
+            success, data, error = self._fetch_tail(symbol, timeframe, last_open_time, buffer.max_size, deadline)
+            if not success:
+                return False, buffer, error
+            if data is None:
+                # 缺口比整个缓冲区还长，不如整段回补
+                success, data, error = self._fetch_history(symbol, timeframe, buffer.max_size, deadline)
+                if not success:
+                    return False, buffer, error
+                buffer.clear()
+
+        buffer.apply_rest_klines(data)
+        self.save(symbol, timeframe)
+        return True, buffer, None
+
+    def _fetch_tail(self, symbol, timeframe, start_time, size, deadline=None):
+        """从 start_time 开始向后翻页拉取，直到最新
+
+        Returns:
+            (success, data, error)；需要的K线超过 size 根时 data 为None
+        """
+        page_limit = self.config.max_klines_per_request
+        data = None
+        while True:
+            success, page, error = self.api_client.fetch_klines(
+                symbol, timeframe, start_time=start_time, limit=page_limit, as_columns=True,
+                deadline=deadline)
+            if not success:
+                return False, None, error
+            data = page if data is None else concat_columns(data, page)
+            if len(data) > size:
+                return True, None, None
+            if len(page) < page_limit:
+                return True, data, None
+            start_time = int(page.open_times[-1]) + 1
+
+    def _fetch_history(self, symbol, timeframe, size, deadline=None):
+        """拉取最近 size 根K线，超过单次请求上限时用 endTime 向前翻页"""
+        page_limit = self.config.max_klines_per_request
+        limit = min(size, page_limit)
+        success, data, error = self.api_client.fetch_klines(
+            symbol, timeframe, limit=limit, as_columns=True, deadline=deadline)
+        if not success:
+            return False, None, error
+
+        # 返回条数少于请求条数说明更早的历史已经没有了
+        while len(data) < size and len(data) % page_limit == 0:
+            limit = min(size - len(data), page_limit)
+            success, page, error = self.api_client.fetch_klines(
+                symbol, timeframe, end_time=int(data.open_times[0]) - 1, limit=limit, as_columns=True,
+                deadline=deadline)
+            if not success:
+                return False, None, error
+            data = concat_columns(page, data)
+            if len(page) < limit:
+                break
+        return True, data, None
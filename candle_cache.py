@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+K线磁盘缓存
+
+把K线缓冲区保存到本地SQLite（WAL模式），以 (品种, 周期, 开盘时间) 为主键。
+启动时直接从缓存载入，指标马上就能显示，之后只需要拉取缺失的尾部。
+
+  - 每个序列最多保留 max_rows 根，写入时顺带删除更早的K线
+  - 每次写入是一个事务，进程被杀或断电时数据库停留在上一次完整提交的状态
+  - 打开时做一次快速完整性检查，文件损坏时移到一旁重新建库（缓存可以随时丢弃）
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from kline_parser import KlineColumns
+
+try:
+    import sqlite3
+    SQLITE_AVAILABLE = True
+except ImportError:
+    SQLITE_AVAILABLE = False
+    print("警告: sqlite3不可用，K线磁盘缓存功能不可用")
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS candles (
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    open_time INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    PRIMARY KEY (symbol, timeframe, open_time)
+) WITHOUT ROWID
+'''
+
+
+def _rows_to_columns(rows):
+    matrix = np.array(rows, dtype=np.float64)
+    return KlineColumns(matrix[:, 0].astype(np.int64), matrix[:, 1], matrix[:, 2],
+                        matrix[:, 3], matrix[:, 4], matrix[:, 5])
+
+
+class CandleCache:
+    """SQLite K线缓存（多线程共享一个连接，由锁串行化）"""
+
+    def __init__(self, path, max_rows=2000):
+        if not SQLITE_AVAILABLE:
+            raise RuntimeError("sqlite3不可用")
+        self.path = path
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = self._open()
+
+    def _open(self):
+        try:
+            conn = self._connect()
+            if conn.execute('PRAGMA quick_check').fetchone()[0] == 'ok':
+                return conn
+            conn.close()
+        except sqlite3.DatabaseError:
+            pass
+
+        # 缓存损坏：移到一旁重新建库
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.replace(self.path + suffix, self.path + '.corrupt' + suffix)
+        return self._connect()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(SCHEMA)
+        return conn
+
+    def load(self, symbol, timeframe, limit=None):
+        """读取某个序列最近 limit 根K线，没有缓存时返回None"""
+        limit = limit or self.max_rows
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT open_time, open, high, low, close, volume FROM candles '
+                'WHERE symbol = ? AND timeframe = ? ORDER BY open_time DESC LIMIT ?',
+                (symbol, timeframe, limit)).fetchall()
+        if not rows:
+            return None
+        return _rows_to_columns(rows[::-1])
+
+    def iter_range(self, symbol, timeframe, start, end, chunk_size=50000):
+        """按开盘时间顺序分块读取 [start, end] 内的K线，每块不超过 chunk_size 根
+
+        Yields:
+            KlineColumns
+        """
+        while start <= end:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT open_time, open, high, low, close, volume FROM candles '
+                    'WHERE symbol = ? AND timeframe = ? AND open_time BETWEEN ? AND ? '
+                    'ORDER BY open_time LIMIT ?',
+                    (symbol, timeframe, start, end, chunk_size)).fetchall()
+            if not rows:
+                return
+            yield _rows_to_columns(rows)
+            if len(rows) < chunk_size:
+                return
+            start = rows[-1][0] + 1
+
+    def open_times(self, symbol, timeframe, start, end):
+        """[start, end] 内已缓存K线的开盘时间（升序 int64 数组）"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT open_time FROM candles WHERE symbol = ? AND timeframe = ? '
+                'AND open_time BETWEEN ? AND ? ORDER BY open_time',
+                (symbol, timeframe, start, end)).fetchall()
+        return np.array([row[0] for row in rows], dtype=np.int64)
+
+    def save(self, symbol, timeframe, columns, max_rows=None):
+        """写入（或覆盖同一开盘时间的）K线，并删除超出保留数量的旧K线"""
+        self._write(symbol, timeframe, columns, max_rows or self.max_rows)
+
+    def append(self, symbol, timeframe, columns):
+        """写入K线，不删除旧K线（用于下载长段历史）"""
+        self._write(symbol, timeframe, columns, None)
+
+    def _write(self, symbol, timeframe, columns, max_rows):
+        if len(columns) == 0:
+            return
+        rows = zip([symbol] * len(columns), [timeframe] * len(columns),
+                   columns.open_times.tolist(), columns.opens.tolist(), columns.highs.tolist(),
+                   columns.lows.tolist(), columns.closes.tolist(), columns.volumes.tolist())
+        with self.lock:
+            conn = self.conn
+            conn.execute('BEGIN')
+            try:
+                conn.executemany('INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                if max_rows:
+                    conn.execute(
+                        'DELETE FROM candles WHERE symbol = ? AND timeframe = ? AND open_time < ('
+                        'SELECT open_time FROM candles WHERE symbol = ? AND timeframe = ? '
+                        'ORDER BY open_time DESC LIMIT 1 OFFSET ?)',
+                        (symbol, timeframe, symbol, timeframe, max_rows - 1))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def series(self):
+        """缓存中所有的 (品种, 周期)"""
+        with self.lock:
+            return self.conn.execute('SELECT DISTINCT symbol, timeframe FROM candles').fetchall()
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
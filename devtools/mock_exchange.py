@@ -0,0 +1,526 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地模拟交易所（币安 REST + K线推送的替身）
+
+同一个端口同时提供 klines、exchangeInfo、全市场24h行情（现货 /api/v3 和U本位合约 /fapi/v1 路径）
+和组合流推送，行情可以是随机游走生成的，
+也可以是录制的K线文件（replay.load_directory 能读的格式）平移到当前时间后回放。
+K线按真实时间推进：未收盘的K线从开盘价逐渐走向最终值，收盘后推送 x=true。
+
+故障注入（压测重试、限速和调度逻辑）:
+  --latency / --jitter      每个REST请求的固定延迟和随机附加延迟（秒）
+  --error-rate              随机返回HTTP 500的比例
+  --rate-limit-rate         随机返回429的比例
+  --fail-symbols            这些品种的请求总是返回500
+  --slow-symbols            这些品种的请求额外延迟 --slow-latency 秒（模拟单个品种卡住）
+  --weight-limit            服务端按自然分钟统计的权重上限，超出返回429；
+                            被限速后仍继续请求返回418，封禁时长逐次翻倍
+响应都带 X-MBX-USED-WEIGHT-1M 头，429/418 带 Retry-After。
+GET /mock/stats 返回请求计数（JSON），便于压测脚本读取。
+
+用法:
+    python devtools/mock_exchange.py --port 8900 --latency 0.05 --error-rate 0.02
+    python monitor_cli.py --base-url http://127.0.0.1:8900 --stream-url ws://127.0.0.1:8900 --source stream
+    python devtools/mock_exchange.py --universe 300 --latency 0.05   # 全市场筛选
+    python monitor_cli.py --base-url http://127.0.0.1:8900 --screen --market usdm
+不指定 --symbols 时接受任意品种，首次请求时生成（exchangeInfo 只列出 --symbols 和 --universe 的品种）。
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import endpoint_weight  # noqa: E402
+from replay import add_resampled, load_directory  # noqa: E402
+from resample import TIMEFRAME_MS  # noqa: E402
+from ws_replay_server import OP_TEXT, WebSocketMixin, handshake_response, parse_stream_path  # noqa: E402
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# 现货和U本位合约的同名接口
+REST_PATHS = {
+    '/api/v3/klines': 'klines', '/fapi/v1/klines': 'klines',
+    '/api/v3/exchangeInfo': 'exchange_info', '/fapi/v1/exchangeInfo': 'exchange_info',
+    '/api/v3/ticker/24hr': 'ticker_24hr', '/fapi/v1/ticker/24hr': 'ticker_24hr',
+}
+
+
+class MockMarket:
+    """模拟行情
+
+    每个 (品种, 周期) 一条独立的K线序列（开盘时间 int64 和 OHLCV 矩阵），
+    只有开盘时间不晚于当前时间的K线可见，最后一根可见K线即未收盘K线。
+
+    Args:
+        symbols: 生成随机行情的品种；为空时任意品种都在首次请求时生成
+        history: 随机行情在当前时间之前的K线数
+        series: 可选，录制的 {(symbol, timeframe): KlineColumns}，会整体平移到当前时间
+        clock: 返回当前时间（秒）的函数
+    """
+
+    def __init__(self, symbols=(), history=1000, seed=0, series=None, clock=time.time):
+        self.symbols = set(symbols)
+        self.history = history
+        self.seed = seed
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.series = {}  # (symbol, timeframe) -> [open_times, values]
+        self.recorded = series is not None
+        if series:
+            self._load_recorded(series)
+
+    def now_ms(self):
+        return int(self.clock() * 1000)
+
+    def _load_recorded(self, series):
+        # 按整天平移，保持各周期的对齐；第 history 根1m（或首个序列的第 history 根）落在今天
+        anchor_key = next((key for key in series if key[1] == '1m'), next(iter(series)))
+        anchor_times = series[anchor_key].open_times
+        anchor = int(anchor_times[min(self.history, len(anchor_times) - 1)])
+        now = self.now_ms()
+        shift = (now - now % DAY_MS) - (anchor - anchor % DAY_MS)
+        for key, columns in series.items():
+            self.series[key] = [columns.open_times + shift, columns.values()]
+            self.symbols.add(key[0])
+
+    def has_symbol(self, symbol):
+        return not self.symbols or symbol in self.symbols
+
+    def _generate(self, key, start_time, count, last_close=None):
+        """生成 count 根随机游走K线"""
+        symbol, timeframe = key
+        interval_ms = TIMEFRAME_MS[timeframe]
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), interval_ms, start_time // interval_ms])
+        if last_close is None:
+            last_close = 10.0 * (1 + zlib.crc32(symbol.encode()) % 500)
+        scale = 0.002 * np.sqrt(interval_ms / TIMEFRAME_MS['1m'])
+        closes = last_close * np.exp(np.cumsum(rng.normal(0, scale, count)))
+        opens = np.concatenate(([last_close], closes[:-1]))
+        wick = np.abs(rng.normal(0, scale / 2, (2, count)))
+        highs = np.maximum(opens, closes) * (1 + wick[0])
+        lows = np.minimum(opens, closes) * (1 - wick[1])
+        volumes = rng.gamma(2.0, 50.0, count)
+        open_times = start_time + np.arange(count, dtype=np.int64) * interval_ms
+        return open_times, np.column_stack((opens, highs, lows, closes, volumes))
+
+    def _get(self, key, now):
+        """取出序列（随机行情在需要时生成或延长到当前时间）"""
+        with self.lock:
+            entry = self.series.get(key)
+            if self.recorded:
+                return entry
+            interval_ms = TIMEFRAME_MS[key[1]]
+            current = now - now % interval_ms
+            if entry is None:
+                start = current - self.history * interval_ms
+                entry = self.series[key] = list(self._generate(key, start, self.history + 1))
+            last = int(entry[0][-1])
+            if last < current:
+                count = (current - last) // interval_ms
+                times, values = self._generate(key, last + interval_ms, count, entry[1][-1, 3])
+                entry[0] = np.concatenate((entry[0], times))
+                entry[1] = np.concatenate((entry[1], values))
+            return entry
+
+    def listed_symbols(self):
+        """exchangeInfo 列出的品种"""
+        return sorted(self.symbols)
+
+    def ticker(self, symbol):
+        """由1m K线统计的24h行情 (开盘, 最高, 最低, 最新, 成交量, 成交额)，没有数据时为None"""
+        now = self.now_ms()
+        entry = self._get((symbol, '1m'), now)
+        if entry is None:
+            return None
+        open_times, values = entry
+        end = int(np.searchsorted(open_times, now, side='right'))
+        begin = int(np.searchsorted(open_times, now - DAY_MS, side='right'))
+        window = values[begin:end]
+        if not len(window):
+            return None
+        volume = window[:, 4]
+        return (float(window[0, 0]), float(window[:, 1].max()), float(window[:, 2].min()),
+                float(window[-1, 3]), float(volume.sum()), float((volume * window[:, 3]).sum()))
+
+    def klines(self, symbol, timeframe, start_time=None, end_time=None, limit=500):
+        """与 /api/v3/klines 相同的选取规则，返回 [(open_time, o, h, l, c, v, closed), ...]"""
+        if timeframe not in TIMEFRAME_MS or not self.has_symbol(symbol):
+            return None
+        now = self.now_ms()
+        entry = self._get((symbol, timeframe), now)
+        if entry is None:
+            return None
+        open_times, values = entry
+        visible = int(np.searchsorted(open_times, now, side='right'))
+        end = visible
+        if end_time is not None:
+            end = min(end, int(np.searchsorted(open_times, end_time, side='right')))
+        if start_time is not None:
+            begin = int(np.searchsorted(open_times, start_time, side='left'))
+            end = min(end, begin + limit)
+        else:
+            begin = max(0, end - limit)
+
+        rows = []
+        interval_ms = TIMEFRAME_MS[timeframe]
+        for index in range(begin, end):
+            open_time = int(open_times[index])
+            o, h, l, c, v = values[index].tolist()
+            closed = open_time + interval_ms <= now
+            if not closed:
+                o, h, l, c, v = _forming(o, h, l, c, v, (now - open_time) / interval_ms)
+            rows.append((open_time, o, h, l, c, v, closed))
+        return rows
+
+
+def _forming(o, h, l, c, v, fraction):
+    """未收盘K线：收盘价、最高最低价和成交量按已过去的时间比例从开盘价走向最终值"""
+    close = o + (c - o) * fraction
+    high = max(o, close) + (h - max(o, c)) * fraction
+    low = min(o, close) - (min(o, c) - l) * fraction
+    return o, high, low, close, v * fraction
+
+
+def kline_row(open_time, o, h, l, c, v, interval_ms):
+    """REST K线数组的一行（12个字段，价格为字符串）"""
+    return [open_time, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.8f}",
+            open_time + interval_ms - 1, f"{v * c:.8f}", 100, "0", "0", "0"]
+
+
+class MockExchangeHandler(WebSocketMixin, BaseHTTPRequestHandler):
+    """REST请求和WebSocket订阅"""
+
+    protocol_version = 'HTTP/1.1'  # 保持连接，与真实交易所一致
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get('Upgrade', '').lower() == 'websocket':
+            self._serve_stream()
+            return
+        parsed = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        if parsed.path == '/mock/stats':
+            self._reply(200, self.server.stats_snapshot())
+            return
+        self.server.handle_rest(self, parsed.path, params)
+
+    def _reply(self, status, body, headers=None):
+        content = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _serve_stream(self):
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not key:
+            self._reply(400, {'code': -1, 'msg': 'Missing Sec-WebSocket-Key'})
+            return
+        self.wfile.write(handshake_response(key))
+        self.close_connection = True
+        streams, combined = parse_stream_path(self.path)
+        self.start_websocket()
+        self.server.serve_stream(self, streams, combined)
+
+
+class MockExchange(ThreadingHTTPServer):
+    """模拟交易所服务器
+
+    Args:
+        address: (host, port)，port为0时自动分配
+        market: MockMarket
+        latency, jitter: REST请求的固定延迟和随机附加延迟（秒）
+        error_rate: 随机返回500的比例
+        rate_limit_rate: 随机返回429的比例
+        weight_limit: 每分钟权重上限，0表示不限
+        ban_seconds: 418封禁的初始时长（秒）
+        stream_interval: 推送间隔（秒）
+        drop_after: 每个推送连接发送N条消息后主动断开，0表示不断开
+        fail_symbols: 总是返回500的品种
+        slow_symbols: 额外延迟 slow_latency 秒的品种
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, market, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 weight_limit=1200, ban_seconds=10, stream_interval=1.0, drop_after=0, seed=0,
+                 fail_symbols=(), slow_symbols=(), slow_latency=30.0):
+        super().__init__(address, MockExchangeHandler)
+        self.market = market
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.weight_limit = weight_limit
+        self.ban_seconds = ban_seconds
+        self.stream_interval = stream_interval
+        self.drop_after = drop_after
+        self.fail_symbols = set(fail_symbols)
+        self.slow_symbols = set(slow_symbols)
+        self.slow_latency = slow_latency
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = None        # 当前统计权重的自然分钟
+        self.used_weight = 0
+        self.limited_until = 0.0  # 429之后到窗口结束前，继续请求会被封禁
+        self.banned_until = 0.0
+        self.ban_count = 0
+        self.stats = {'requests': 0, 'weight': 0, 'status': {}, 'stream_messages': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stream_url(self):
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def stats_snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def _count(self, status):
+        with self.lock:
+            self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+
+    def _charge(self, weight):
+        """计入权重，返回 (status, retry_after, used_weight)；status为None表示放行"""
+        now = self.market.clock()
+        with self.lock:
+            self.stats['requests'] += 1
+            window = int(now // 60)
+            if window != self.window:
+                self.window = window
+                self.used_weight = 0
+            if now < self.banned_until:
+                return 418, self.banned_until - now, self.used_weight
+            if now < self.limited_until:
+                # 收到429后没有等待：封禁，时长逐次翻倍
+                self.ban_count += 1
+                self.banned_until = now + self.ban_seconds * 2 ** (self.ban_count - 1)
+                return 418, self.banned_until - now, self.used_weight
+
+            self.used_weight += weight
+            self.stats['weight'] += weight
+            if self.weight_limit and self.used_weight > self.weight_limit:
+                self.limited_until = (window + 1) * 60
+                return 429, self.limited_until - now, self.used_weight
+            if self.rate_limit_rate and self.random.random() < self.rate_limit_rate:
+                self.limited_until = now + 1
+                return 429, 1, self.used_weight
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 500, None, self.used_weight
+            return None, None, self.used_weight
+
+    def handle_rest(self, handler, path, params):
+        symbol = params.get('symbol', '').upper()
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if symbol in self.slow_symbols:
+            delay += self.slow_latency
+        if delay > 0:
+            time.sleep(delay)
+
+        status, retry_after, used = self._charge(endpoint_weight(path))
+        if status is None and symbol in self.fail_symbols:
+            status = 500
+        headers = {'X-MBX-USED-WEIGHT-1M': str(used)}
+        if status is not None:
+            if retry_after is not None:
+                headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+            self._count(status)
+            handler._reply(status, {'code': -1003 if status != 500 else -1000,
+                                    'msg': 'mock: injected failure'}, headers)
+            return
+
+        endpoint = REST_PATHS.get(path)
+        if path in ('/api/v3/ping', '/api/v3/time'):
+            body = {} if path.endswith('ping') else {'serverTime': self.market.now_ms()}
+            self._count(200)
+            handler._reply(200, body, headers)
+        elif endpoint is not None:
+            if endpoint == 'klines':
+                status, body = self._klines(params)
+            elif endpoint == 'exchange_info':
+                status, body = 200, self._exchange_info(futures=path.startswith('/fapi/'))
+            else:
+                status, body = self._tickers(params)
+            self._count(status)
+            handler._reply(status, body, headers)
+        else:
+            self._count(404)
+            handler._reply(404, {'code': -1, 'msg': f'mock: unknown endpoint {path}'}, headers)
+
+    def _klines(self, params):
+        symbol = params.get('symbol', '').upper()
+        timeframe = params.get('interval')
+        if not symbol or not timeframe:
+            return 400, {'code': -1102, 'msg': 'Mandatory parameter was not sent.'}
+        if timeframe not in TIMEFRAME_MS:
+            return 400, {'code': -1120, 'msg': 'Invalid interval.'}
+        try:
+            limit = min(int(params.get('limit', 500)), 1000)
+            start_time = int(params['startTime']) if 'startTime' in params else None
+            end_time = int(params['endTime']) if 'endTime' in params else None
+        except ValueError:
+            return 400, {'code': -1100, 'msg': 'Illegal characters found in parameter.'}
+
+        rows = self.market.klines(symbol, timeframe, start_time, end_time, limit)
+        if rows is None:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        interval_ms = TIMEFRAME_MS[timeframe]
+        return 200, [kline_row(*row[:6], interval_ms) for row in rows]
+
+    def _exchange_info(self, futures):
+        symbols = []
+        for symbol in self.market.listed_symbols():
+            quote = 'USDT' if symbol.endswith('USDT') else ''
+            item = {'symbol': symbol, 'status': 'TRADING',
+                    'baseAsset': symbol[:len(symbol) - len(quote)], 'quoteAsset': quote}
+            if futures:
+                item['contractType'] = 'PERPETUAL'
+            symbols.append(item)
+        return {'timezone': 'UTC', 'serverTime': self.market.now_ms(), 'symbols': symbols}
+
+    def _tickers(self, params):
+        symbol = params.get('symbol', '').upper()
+        if symbol and not self.market.has_symbol(symbol):
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        tickers = []
+        for name in ([symbol] if symbol else self.market.listed_symbols()):
+            stats = self.market.ticker(name)
+            if stats is None:
+                continue
+            open_price, high, low, last, volume, quote_volume = stats
+            tickers.append({
+                'symbol': name,
+                'priceChange': f"{last - open_price:.8f}",
+                'priceChangePercent': f"{(last / open_price - 1) * 100:.3f}",
+                'lastPrice': f"{last:.8f}", 'openPrice': f"{open_price:.8f}",
+                'highPrice': f"{high:.8f}", 'lowPrice': f"{low:.8f}",
+                'volume': f"{volume:.8f}", 'quoteVolume': f"{quote_volume:.8f}",
+            })
+        if symbol:
+            return 200, tickers[0] if tickers else {}
+        return 200, tickers
+
+    def serve_stream(self, handler, streams, combined):
+        """按订阅推送最新K线，K线收盘时先补发一条 x=true 的最终值"""
+        subscriptions = []
+        for stream in streams:
+            symbol, _, timeframe = stream.partition('@kline_')
+            if timeframe in TIMEFRAME_MS and self.market.has_symbol(symbol.upper()):
+                subscriptions.append((stream, symbol.upper(), timeframe))
+
+        last_open = {}
+        sent = 0
+        while not handler.closed.is_set():
+            for stream, symbol, timeframe in subscriptions:
+                rows = self.market.klines(symbol, timeframe, limit=2)
+                if not rows:
+                    continue
+                previous = last_open.get(stream)
+                if previous is not None and rows[-1][0] != previous and len(rows) > 1:
+                    messages = [rows[-2], rows[-1]]
+                else:
+                    messages = [rows[-1]]
+                last_open[stream] = rows[-1][0]
+                for row in messages:
+                    event = self._kline_event(symbol, timeframe, row)
+                    payload = {'stream': stream, 'data': event} if combined else event
+                    handler._send(OP_TEXT, json.dumps(payload).encode('utf-8'))
+                    sent += 1
+                    with self.lock:
+                        self.stats['stream_messages'] += 1
+            if self.drop_after and sent >= self.drop_after:
+                # 模拟断线，用于测试重连和缺口修复
+                return
+            handler.closed.wait(self.stream_interval)
+
+    def _kline_event(self, symbol, timeframe, row):
+        open_time, o, h, l, c, v, closed = row
+        interval_ms = TIMEFRAME_MS[timeframe]
+        return {
+            'e': 'kline', 'E': self.market.now_ms(), 's': symbol,
+            'k': {
+                't': open_time, 'T': open_time + interval_ms - 1, 's': symbol, 'i': timeframe,
+                'o': f"{o:.8f}", 'h': f"{h:.8f}", 'l': f"{l:.8f}", 'c': f"{c:.8f}", 'v': f"{v:.8f}",
+                'x': closed,
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟交易所（REST + K线推送）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--symbols', nargs='+', default=[], help='随机行情的品种，默认接受任意品种')
+    parser.add_argument('--universe', type=int, default=0, help='另外生成N个随机品种（C000USDT...），用于全市场筛选')
+    parser.add_argument('--data', help='录制的K线文件目录，指定后按录制数据回放')
+    parser.add_argument('--timeframes', nargs='+', default=[], help='录制数据缺少的周期由1m聚合')
+    parser.add_argument('--history', type=int, default=1000, help='当前时间之前的K线数')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--weight-limit', type=int, default=1200)
+    parser.add_argument('--ban-seconds', type=float, default=10)
+    parser.add_argument('--stream-interval', type=float, default=1.0)
+    parser.add_argument('--drop-after', type=int, default=0, help='每个推送连接发送N条消息后断开')
+    parser.add_argument('--fail-symbols', nargs='+', default=[], help='总是返回500的品种')
+    parser.add_argument('--slow-symbols', nargs='+', default=[], help='额外延迟的品种')
+    parser.add_argument('--slow-latency', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    symbols = [symbol.upper() for symbol in args.symbols]
+    symbols += [f"C{index:03d}USDT" for index in range(args.universe)]
+    series = None
+    if args.data:
+        series = load_directory(args.data, set(symbols) or None)
+        if not series:
+            print(f"{args.data} 中没有K线文件", file=sys.stderr)
+            return 2
+        add_resampled(series, [(symbol, timeframe) for symbol in {key[0] for key in series}
+                               for timeframe in args.timeframes])
+    market = MockMarket(symbols, history=args.history, seed=args.seed, series=series)
+    server = MockExchange((args.host, args.port), market, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                          weight_limit=args.weight_limit, ban_seconds=args.ban_seconds,
+                          stream_interval=args.stream_interval, drop_after=args.drop_after, seed=args.seed,
+                          fail_symbols=[symbol.upper() for symbol in args.fail_symbols],
+                          slow_symbols=[symbol.upper() for symbol in args.slow_symbols],
+                          slow_latency=args.slow_latency)
+    print(f"模拟交易所已启动: {server.base_url} / {server.stream_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats_snapshot(), ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地WebSocket回放服务器（币安K线推送的替身）
+
+把录制好的K线推送消息（每行一条JSON，可由 KlineStreamClient 的 record_path 录制）
+按订阅的组合流回放给客户端，用于在不连接交易所的情况下测试推送模式。
+
+用法:
+    python devtools/ws_replay_server.py --file klines.jsonl --port 9443 --interval 0.2
+然后把 MonitorConfig.stream_url 设为 ws://127.0.0.1:9443
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def load_messages(path):
+    """读取录制文件，返回 [(stream_name, event_dict), ...]"""
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            payload = json.loads(line)
+            event = payload.get('data', payload)
+            if event.get('e') != 'kline':
+                continue
+            stream = payload.get('stream') or f"{event['s'].lower()}@kline_{event['k']['i']}"
+            messages.append((stream, event))
+    return messages
+
+
+def encode_frame(opcode, payload=b''):
+    """编码服务端帧（服务端发出的帧不加掩码）"""
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack('!H', length)
+    else:
+        header += bytes([127]) + struct.pack('!Q', length)
+    return header + payload
+
+
+def read_frame(sock_file):
+    """读取一个客户端帧，返回 (opcode, payload)，连接关闭时返回 (None, b'')"""
+    head = sock_file.read(2)
+    if len(head) < 2:
+        return None, b''
+    opcode = head[0] & 0x0F
+    masked = head[1] & 0x80
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', sock_file.read(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', sock_file.read(8))[0]
+    mask = sock_file.read(4) if masked else b''
+    payload = sock_file.read(length)
+    if masked:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def parse_stream_path(path):
+    """解析订阅地址，返回 (streams, combined)
+
+    单流格式 /ws/<stream>；组合流格式 /stream?streams=a/b/c（推送时包一层 {"stream", "data"}）
+    """
+    parsed = urlparse(path)
+    if parsed.path.startswith('/ws/'):
+        return set(parsed.path[len('/ws/'):].split('/')), False
+    names = parse_qs(parsed.query).get('streams', [''])[0]
+    return set(name for name in names.split('/') if name), True
+
+
+def handshake_response(key):
+    """握手成功的响应（101 Switching Protocols）"""
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    return (
+        'HTTP/1.1 101 Switching Protocols\r\n'
+        'Upgrade: websocket\r\n'
+        'Connection: Upgrade\r\n'
+        f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+    ).encode('latin-1')
+
+
+class WebSocketMixin:
+    """握手之后的连接收发：后台线程响应ping/close，发送加锁（供各个请求处理类复用）"""
+
+    def start_websocket(self):
+        self.send_lock = threading.Lock()
+        self.closed = threading.Event()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _read_loop(self):
+        try:
+            while not self.closed.is_set():
+                opcode, payload = read_frame(self.rfile)
+                if opcode is None or opcode == OP_CLOSE:
+                    if opcode == OP_CLOSE:
+                        self._send(OP_CLOSE, payload[:2])
+                    break
+                if opcode == OP_PING:
+                    self._send(OP_PONG, payload)
+        except (OSError, struct.error):
+            pass
+        finally:
+            self.closed.set()
+
+    def _send(self, opcode, payload):
+        try:
+            with self.send_lock:
+                self.wfile.write(encode_frame(opcode, payload))
+                self.wfile.flush()
+        except (OSError, ValueError):
+            # 连接已关闭
+            self.closed.set()
+
+
+class ReplayHandler(WebSocketMixin, socketserver.StreamRequestHandler):
+    """处理单个WebSocket连接：握手、回放、响应ping/close"""
+
+    def handle(self):
+        streams, combined = self._handshake()
+        if streams is None:
+            return
+
+        self.start_websocket()
+
+        server = self.server
+        sent = 0
+        while not self.closed.is_set():
+            for stream, event in server.messages:
+                if self.closed.is_set():
+                    return
+                if streams and stream not in streams:
+                    continue
+
+                payload = {'stream': stream, 'data': event} if combined else event
+                self._send(OP_TEXT, json.dumps(payload).encode('utf-8'))
+                sent += 1
+
+                # 模拟断线，用于测试重连和缺口修复
+                if server.drop_after and sent >= server.drop_after:
+                    self._send(OP_CLOSE, struct.pack('!H', 1001))
+                    self.closed.wait(1)
+                    return
+                time.sleep(server.interval)
+
+            if not server.loop:
+                break
+
+        # 回放结束后保持连接，直到客户端断开
+        self.closed.wait()
+
+    def _handshake(self):
+        request_line = self.rfile.readline().decode('latin-1').strip()
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        key = headers.get('sec-websocket-key')
+        if not request_line.startswith('GET') or not key:
+            self.wfile.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            return None, False
+
+        self.wfile.write(handshake_response(key))
+        return parse_stream_path(request_line.split()[1])
+
+
+class ReplayServer(socketserver.ThreadingTCPServer):
+    """K线推送回放服务器"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, messages, interval=0.2, loop=False, drop_after=0):
+        super().__init__(address, ReplayHandler)
+        self.messages = messages
+        self.interval = interval
+        self.loop = loop
+        self.drop_after = drop_after
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地K线推送回放服务器')
+    parser.add_argument('--file', required=True, help='录制的推送消息文件（每行一条JSON）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9443)
+    parser.add_argument('--interval', type=float, default=0.2, help='消息间隔（秒）')
+    parser.add_argument('--loop', action='store_true', help='回放结束后从头循环')
+    parser.add_argument('--drop-after', type=int, default=0, help='发送N条消息后主动断开，测试重连')
+    args = parser.parse_args()
+
+    server = ReplayServer((args.host, args.port), load_messages(args.file),
+                          interval=args.interval, loop=args.loop, drop_after=args.drop_after)
+    print(f"回放服务器已启动: {server.url} ({len(server.messages)} 条消息)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+K线并发抓取引擎
+
+把 品种 × 周期 组合的K线请求并发发出（有界线程池），
+请求之间共享 BinanceAPIClient 的权重预算，
+结果按完成先后逐个交给指标计算阶段，
+一轮检查的耗时取决于最慢的一个请求而不是所有请求之和；
+给定时间预算时，到期还没完成的请求不再等待，其它品种照常计算；
+这样的请求仍在后台运行，结束前同一 (品种, 周期) 不会再次发出（避免两个请求同时写一个缓冲区）。
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed, wait
+
+# 超出本轮时间预算时产出的错误：请求已经发出但没有完成 / 请求还在排队，推迟到下一轮
+CYCLE_TIMEOUT_ERROR = "超出本轮时间预算"
+DEFERRED_ERROR = "本轮时间预算已用完，推迟到下一轮"
+# 上一次的请求（通常是超出时间预算的）仍在后台运行
+BUSY_ERROR = "上一次的请求仍未完成，推迟到下一轮"
+
+
+class KlineFetchEngine:
+    """K线并发抓取引擎"""
+
+    def __init__(self, api_client, max_workers=4):
+        self.api_client = api_client
+        self.max_workers = max(1, int(max_workers))
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='kline-fetch'
+        )
+        # 可重入：提交时请求可能已经结束，add_done_callback 会在持锁的线程里直接调用 _release
+        self.lock = threading.RLock()
+        self.running = {}  # (symbol, timeframe) -> 尚未结束的 future
+
+    def fetch_all(self, pairs, should_stop=None, fetch_func=None, deadline=None):
+        """并发获取所有(品种, 周期)的K线数据
+
+        Args:
+            pairs: [(symbol, timeframe), ...]
+            should_stop: 可选回调，返回True时取消尚未开始的请求
+            fetch_func: 可选抓取函数 fetch_func(symbol, timeframe) -> (success, data, error)，
+                        默认 api_client.fetch_klines（例如传入 CandleBufferStore.refresh 做增量拉取）
+            deadline: 可选 resilience.Deadline，会传给 fetch_func；到期后未完成的请求
+                      产出 CYCLE_TIMEOUT_ERROR（已发出）或 DEFERRED_ERROR（未开始，已取消）
+
+        Yields:
+            (symbol, timeframe, success, data, error)，按请求完成顺序产出；
+            上一次请求还没结束的 (品种, 周期) 不发请求，先产出 BUSY_ERROR
+        """
+        fetch_func = fetch_func or self.api_client.fetch_klines
+        kwargs = {} if deadline is None else {'deadline': deadline}
+        futures = {}
+        busy = []
+        with self.lock:
+            for key in pairs:
+                if key in self.running:
+                    busy.append(key)
+                    continue
+                future = self.executor.submit(fetch_func, key[0], key[1], **kwargs)
+                futures[future] = key
+                self.running[key] = future
+                future.add_done_callback(lambda done, key=key: self._release(key, done))
+
+        for symbol, timeframe in busy:
+            yield symbol, timeframe, False, None, BUSY_ERROR
+        # 不限时的预算（remaining 为inf）不能作为等待超时
+        timeout = None if deadline is None or deadline.expires_at is None else deadline.remaining()
+
+        pending = set(futures)
+        try:
+            try:
+                for future in as_completed(futures, timeout=timeout):
+                    pending.discard(future)
+                    symbol, timeframe = futures[future]
+                    if should_stop and should_stop():
+                        return
+
+                    try:
+                        success, data, error = future.result()
+                    except Exception as e:
+                        success, data, error = False, None, f"请求异常: {e}"
+
+                    yield symbol, timeframe, success, data, error
+            except TimeoutError:
+                # 预算用完：不再等待，排队中的请求取消，已发出的请求在后台自行结束
+                for future in pending:
+                    symbol, timeframe = futures[future]
+                    error = DEFERRED_ERROR if future.cancel() else CYCLE_TIMEOUT_ERROR
+                    yield symbol, timeframe, False, None, error
+        finally:
+            # 提前结束时取消还在排队的请求
+            for future in futures:
+                future.cancel()
+
+    def _release(self, key, future):
+        with self.lock:
+            if self.running.get(key) is future:
+                del self.running[key]
+
+    def shutdown(self):
+        """关闭线程池（取消排队中的请求，不等待进行中的请求）"""
+        try:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+    def wait_idle(self, timeout=None):
+        """等待进行中的请求结束，返回是否全部结束"""
+        with self.lock:
+            futures = list(self.running.values())
+        _, not_done = wait(futures, timeout=timeout)
+        return not not_done
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+历史K线批量下载
+
+把一段日期范围按每页 1000 根拆成 startTime/endTime 请求，用线程池并发下载，
+所有请求共享 API 客户端的权重令牌桶，被限速时整体等待封禁结束再继续。
+每一页下载完成后立即写入 K线磁盘缓存（candle_cache.CandleCache，不做裁剪），
+内存里只有正在进行的几页。
+
+  - 断点续传：开始前先查缓存里已有的开盘时间，只下载缺失的部分，中断后重新运行即可
+  - 缺口补齐：缺失的开盘时间按连续区间分页，中间的零散缺口也会被补上
+  - 交易所本身没有数据的区间（上线之前、维护停机）会返回空页，不算失败，
+    但会留在缺口列表里；上线时间先用一次 startTime=0 的请求查出来，不再逐页试探
+
+用法:
+    python history_download.py --db history.db --symbols ETHUSDT BTCUSDT --timeframes 1m \\
+        --start 2024-01-01 --end 2024-03-01 --export klines/
+导出的CSV与币安公开历史数据格式相同，可以直接交给 backtest.py / optimizer.py 的 --data。
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import numpy as np
+
+from candle_cache import CandleCache
+from kline_parser import EMPTY_KLINES_ERROR
+from monitor_engine import BinanceAPIClient, MonitorConfig
+from resample import TIMEFRAME_MS
+
+
+def find_gaps(open_times, start, end, interval_ms):
+    """找出 [start, end] 网格上缺失的开盘时间区间
+
+    Args:
+        open_times: 已有的开盘时间（升序）
+        start, end: 对齐到周期的首末开盘时间
+
+    Returns:
+        [(gap_start, gap_end), ...]，两端都是缺失K线的开盘时间
+    """
+    if end < start:
+        return []
+    expected = np.arange(start, end + 1, interval_ms, dtype=np.int64)
+    missing = expected[~np.isin(expected, open_times)]
+    if len(missing) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(missing) != interval_ms)
+    starts = np.concatenate((missing[:1], missing[breaks + 1]))
+    ends = np.concatenate((missing[breaks], missing[-1:]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def split_pages(gaps, interval_ms, page_size):
+    """把缺口区间拆成每页不超过 page_size 根的 (start, end)"""
+    pages = []
+    span = interval_ms * (page_size - 1)
+    for gap_start, gap_end in gaps:
+        for page_start in range(gap_start, gap_end + 1, span + interval_ms):
+            pages.append((page_start, min(page_start + span, gap_end)))
+    return pages
+
+
+def parse_time(text):
+    """把 2024-01-01 / 2024-01-01T08:00 （UTC）或毫秒时间戳转为毫秒"""
+    if text.isdigit():
+        return int(text)
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+class DownloadPage:
+    """一页下载任务"""
+
+    __slots__ = ('symbol', 'timeframe', 'start', 'end', 'attempts')
+
+    def __init__(self, symbol, timeframe, start, end):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.start = start
+        self.end = end
+        self.attempts = 0
+
+
+class DownloadReport:
+    """下载结果"""
+
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.empty_pages = 0
+        self.failed = []  # [(symbol, timeframe, start, end, error), ...]
+        self.gaps = {}    # {(symbol, timeframe): [(start, end), ...]}，下载后仍缺失的区间
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class HistoryDownloader:
+    """历史K线并发下载器
+
+    Args:
+        api_client: BinanceAPIClient（或接口相同的客户端，例如 replay.ReplayAPIClient）
+        cache: CandleCache，下载的K线直接写入其中
+        max_workers: 并发请求数
+        page_size: 每页K线数（币安上限1000）
+        max_attempts: 每页的最多尝试次数（限速等待不计入）
+        on_progress: 可选回调 on_progress(done_pages, total_pages, rows)
+    """
+
+    def __init__(self, api_client, cache, max_workers=4, page_size=1000, max_attempts=3,
+                 on_progress=None):
+        self.api_client = api_client
+        self.cache = cache
+        self.max_workers = max(1, int(max_workers))
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.on_progress = on_progress
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        """中断下载（已写入的页保留，下次运行从缺口继续）"""
+        self.stop_event.set()
+
+    def _last_closed(self, interval_ms):
+        """最后一根已收盘K线的开盘时间，未收盘的K线不入库"""
+        now = int(time.time() * 1000)
+        return now - now % interval_ms - interval_ms
+
+    def _first_open_time(self, symbol, timeframe):
+        """品种上线后第一根K线的开盘时间，查询失败时返回None"""
+        success, data, error = self.api_client.fetch_klines(
+            symbol, timeframe, start_time=0, limit=1, as_columns=True)
+        if not success:
+            return None
+        return int(data.open_times[0])
+
+    def plan(self, symbol, timeframe, start, end):
+        """规划某个序列需要下载的页
+
+        Returns:
+            (对齐后的 start, end, [DownloadPage, ...])
+        """
+        interval_ms = TIMEFRAME_MS.get(timeframe)
+        if interval_ms is None:
+            raise ValueError(f"不支持批量下载的周期: {timeframe}")
+        start = -(-start // interval_ms) * interval_ms
+        end = min(end - end % interval_ms, self._last_closed(interval_ms))
+
+        gaps = find_gaps(self.cache.open_times(symbol, timeframe, start, end), start, end, interval_ms)
+        if gaps and gaps[0][0] == start:
+            # 从头缺失时先确认上线时间，避免对上线之前的区间逐页请求
+            first = self._first_open_time(symbol, timeframe)
+            if first is not None and first > start:
+                start = first
+                gaps = [(max(gap_start, first), gap_end) for gap_start, gap_end in gaps if gap_end >= first]
+        pages = [DownloadPage(symbol, timeframe, page_start, page_end)
+                 for page_start, page_end in split_pages(gaps, interval_ms, self.page_size)]
+        return start, end, pages
+
+    def _fetch(self, page):
+        page.attempts += 1
+        return self.api_client.fetch_klines(
+            page.symbol, page.timeframe, start_time=page.start, end_time=page.end,
+            limit=self.page_size, as_columns=True)
+
+    def download(self, keys, start, end):
+        """下载多个序列的 [start, end]（毫秒）
+
+        Args:
+            keys: [(symbol, timeframe), ...]
+
+        Returns:
+            DownloadReport
+        """
+        report = DownloadReport()
+        started = time.perf_counter()
+        ranges = {}
+        pending = []
+        for symbol, timeframe in keys:
+            first, last, pages = self.plan(symbol, timeframe, start, end)
+            ranges[(symbol, timeframe)] = (first, last)
+            pending.extend(pages)
+        total = len(pending)
+        pending.reverse()  # 从列表尾部取，按时间顺序下载
+
+        # 在途的页数有上限，写入缓存后就释放，内存占用与下载范围无关
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='history-fetch') as executor:
+            running = {}
+            while (pending or running) and not self.stop_event.is_set():
+                while pending and len(running) < self.max_workers * 2:
+                    page = pending.pop()
+                    running[executor.submit(self._fetch, page)] = page
+
+                done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = running.pop(future)
+                    try:
+                        success, data, error = future.result()
+                    except Exception as e:
+                        success, data, error = False, None, f"请求异常: {e}"
+                    self._handle(page, success, data, error, pending, report)
+                    if self.on_progress and (success or error == EMPTY_KLINES_ERROR):
+                        self.on_progress(report.pages, total, report.rows)
+
+            for future in running:
+                future.cancel()
+
+        for key, (first, last) in ranges.items():
+            interval_ms = TIMEFRAME_MS[key[1]]
+            gaps = find_gaps(self.cache.open_times(key[0], key[1], first, last), first, last, interval_ms)
+            if gaps:
+                report.gaps[key] = gaps
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _handle(self, page, success, data, error, pending, report):
+        """处理一页的结果：写入缓存，或安排重试"""
+        if success:
+            # 只保留请求区间内的K线
+            times = data.open_times
+            lo, hi = np.searchsorted(times, [page.start, page.end + 1])
+            data = data.slice(int(lo), int(hi))
+            self.cache.append(page.symbol, page.timeframe, data)
+            report.pages += 1
+            report.rows += len(data)
+            return
+        if error == EMPTY_KLINES_ERROR:
+            report.pages += 1
+            report.empty_pages += 1
+            return
+
+        banned_for = self.api_client.rate_limit_status().get('banned_for', 0)
+        if banned_for > 0:
+            # 被限速不算失败：等封禁结束后重发，其它线程的请求同样会被令牌桶挡住
+            page.attempts -= 1
+            pending.append(page)
+            self.stop_event.wait(banned_for)
+        elif page.attempts < self.max_attempts:
+            pending.append(page)
+        else:
+            report.failed.append((page.symbol, page.timeframe, page.start, page.end, error))
+
+
+def export_csv(cache, symbol, timeframe, start, end, directory):
+    """把缓存中的一段K线导出为币安历史数据格式的CSV（无表头），返回文件路径和行数"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{symbol}-{timeframe}.csv")
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for columns in cache.iter_range(symbol, timeframe, start, end):
+            for open_time, row in zip(columns.open_times.tolist(), columns.values().tolist()):
+                f.write(f"{open_time},{row[0]!r},{row[1]!r},{row[2]!r},{row[3]!r},{row[4]!r}\n")
+            count += len(columns)
+    return path, count
+
+
+def format_gap(start, end):
+    fmt = '%Y-%m-%d %H:%M'
+    return (f"{datetime.fromtimestamp(start / 1000, timezone.utc).strftime(fmt)} ~ "
+            f"{datetime.fromtimestamp(end / 1000, timezone.utc).strftime(fmt)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量下载历史K线到本地缓存')
+    parser.add_argument('--db', required=True, help='SQLite缓存文件（建议与实时监控的缓存分开）')
+    parser.add_argument('--symbols', nargs='+', required=True)
+    parser.add_argument('--timeframes', nargs='+', required=True)
+    parser.add_argument('--start', required=True, help='开始时间（UTC），例如 2024-01-01')
+    parser.add_argument('--end', help='结束时间（UTC），默认到现在')
+    parser.add_argument('--workers', type=int, default=4, help='并发请求数')
+    parser.add_argument('--base-url', help='REST地址，默认币安现货')
+    parser.add_argument('--export', help='下载后把每个序列导出为CSV到这个目录')
+    args = parser.parse_args(argv)
+
+    try:
+        start = parse_time(args.start)
+        end = parse_time(args.end) if args.end else int(time.time() * 1000)
+    except ValueError as e:
+        print(f"时间格式错误: {e}", file=sys.stderr)
+        return 2
+    keys = [(symbol.upper(), timeframe) for symbol in args.symbols for timeframe in args.timeframes]
+
+    config = MonitorConfig()
+    config.max_workers = args.workers
+    if args.base_url:
+        config.base_url = args.base_url
+    client = BinanceAPIClient(config)
+    cache = CandleCache(args.db)
+
+    def on_progress(done, total, rows):
+        print(f"\r已完成 {done}/{total} 页，{rows} 根K线", end='', flush=True)
+
+    downloader = HistoryDownloader(client, cache, max_workers=args.workers, on_progress=on_progress)
+    try:
+        report = downloader.download(keys, start, end)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        downloader.stop()
+        cache.close()
+        print("\n已中断，重新运行即可继续")
+        return 1
+    finally:
+        client.close()
+    print()
+    print(f"下载 {report.pages} 页（空页 {report.empty_pages}），{report.rows} 根K线，"
+          f"耗时 {report.elapsed:.1f}s，{report.rows_per_second:.0f} 根/秒")
+    for symbol, timeframe, page_start, page_end, error in report.failed:
+        print(f"  失败 {symbol}/{timeframe} {format_gap(page_start, page_end)}: {error}")
+    for (symbol, timeframe), gaps in report.gaps.items():
+        print(f"  {symbol}/{timeframe} 仍缺失 {len(gaps)} 段，例如 {format_gap(*gaps[0])}")
+
+    if args.export:
+        for symbol, timeframe in keys:
+            path, count = export_csv(cache, symbol, timeframe, start, end, args.export)
+            print(f"导出 {path}（{count} 根）")
+    cache.close()
+    return 0 if not report.failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
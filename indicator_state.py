@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+增量指标状态
+
+推送模式下每秒都会收到正在形成的K线的更新，每次都从头重算整段历史太浪费。
+这里把价格线（RSV → SMA(8) → ×100 → HHV(3) → EMA(1)）和Wilder RSI(6)
+改写成流式状态机，每根新K线或每次修订的计算量都是O(1)：
+
+  - 已收盘的K线写入“确认状态”
+  - 正在形成的K线只在确认状态的基础上试算出“临时值”，不修改确认状态；
+    同一根K线再次更新时重新试算，收盘（或出现更新的K线）时才确认
+
+用同一段K线从头喂入时，结果与 indicators 中的批量计算完全一致。
+"""
+
+from collections import deque
+
+from indicators import HHV_A_PERIOD, HHV_PERIOD, RSI_PERIOD, SMA_PERIOD
+
+
+class MonotonicWindow:
+    """滑动窗口极值（单调队列）"""
+
+    def __init__(self, window, is_max=True):
+        self.window = window
+        self.is_max = is_max
+        self.items = deque()  # (index, value)，值单调（最大值队列递减）
+
+    def _dominates(self, a, b):
+        return a >= b if self.is_max else a <= b
+
+    def push(self, index, value):
+        """确认第 index 个值"""
+        items = self.items
+        while items and self._dominates(value, items[-1][1]):
+            items.pop()
+        items.append((index, value))
+        while items[0][0] <= index - self.window:
+            items.popleft()
+
+    def peek(self, index, value):
+        """试算：假设第 index 个值为 value 时窗口的极值（不修改状态）"""
+        best = value
+        # 确认状态截止到 index-1，队首最多只有一个元素滑出窗口
+        for position, (item_index, item_value) in enumerate(self.items):
+            if item_index > index - self.window:
+                if not self._dominates(best, item_value):
+                    best = item_value
+                break
+            if position >= 1:
+                break
+        return best
+
+
+class PriceLineState:
+    """价格线的流式计算状态"""
+
+    def __init__(self, hhv_period=HHV_PERIOD, sma_period=SMA_PERIOD, hhv_a_period=HHV_A_PERIOD,
+                 sma_weight=1, ema_period=1):
+        self.hhv_period = hhv_period
+        self.sma_period = sma_period
+        self.hhv_a_period = hhv_a_period
+        self.sma_weight = sma_weight
+        self.ema_alpha = 2.0 / (ema_period + 1)
+
+        self.count = 0  # 已确认的K线数
+        self.highs = MonotonicWindow(hhv_period, is_max=True)
+        self.lows = MonotonicWindow(hhv_period, is_max=False)
+        self.sma = None
+        self.recent_a = deque(maxlen=max(hhv_a_period - 1, 0))
+        self.ema = None
+
+    def step(self, high, low, close, commit):
+        """处理下一根K线
+
+        Args:
+            commit: True时确认这根K线，False时只试算
+
+        Returns:
+            价格线数值，K线不足 hhv_period 根时为None
+        """
+        index = self.count
+        if index + 1 < self.hhv_period:
+            if commit:
+                self._commit_windows(index, high, low)
+            return None
+
+        var1 = self.highs.peek(index, high)
+        var2 = self.lows.peek(index, low)
+        rsv = 0 if var1 - var2 == 0 else (close - var2) / (var1 - var2)
+
+        weight = self.sma_weight
+        previous_sma = rsv if self.sma is None else self.sma
+        sma = (weight * rsv + (self.sma_period - weight) * previous_sma) / self.sma_period
+        a_value = sma * 100
+        hhv_a = max(self.recent_a, default=a_value)
+        hhv_a = max(hhv_a, a_value)
+        previous_ema = hhv_a if self.ema is None else self.ema
+        ema = self.ema_alpha * hhv_a + (1 - self.ema_alpha) * previous_ema
+
+        if commit:
+            self._commit_windows(index, high, low)
+            self.sma = sma
+            if self.recent_a.maxlen:
+                self.recent_a.append(a_value)
+            self.ema = ema
+        return ema
+
+    def _commit_windows(self, index, high, low):
+        self.highs.push(index, high)
+        self.lows.push(index, low)
+        self.count += 1
+
+
+class WilderRSIState:
+    """Wilder RSI的流式计算状态"""
+
+    def __init__(self, period=RSI_PERIOD):
+        self.period = period
+        self.last_close = None
+        self.delta_count = 0
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.avg_gain = None
+        self.avg_loss = None
+
+    def step(self, close, commit):
+        """处理下一根K线的收盘价，返回RSI（数据不足时为None）"""
+        if self.last_close is None:
+            if commit:
+                self.last_close = close
+            return None
+
+        delta = close - self.last_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        count = self.delta_count + 1
+        period = self.period
+
+        if count < period:
+            avg_gain = avg_loss = None
+            gain_sum = self.gain_sum + gain
+            loss_sum = self.loss_sum + loss
+        elif count == period:
+            gain_sum = self.gain_sum + gain
+            loss_sum = self.loss_sum + loss
+            avg_gain = gain_sum / period
+            avg_loss = loss_sum / period
+        else:
+            gain_sum, loss_sum = self.gain_sum, self.loss_sum
+            avg_gain = (self.avg_gain * (period - 1) + gain) / period
+            avg_loss = (self.avg_loss * (period - 1) + loss) / period
+
+        if commit:
+            self.last_close = close
+            self.delta_count = count
+            self.gain_sum, self.loss_sum = gain_sum, loss_sum
+            self.avg_gain, self.avg_loss = avg_gain, avg_loss
+
+        if avg_gain is None:
+            return None
+        if avg_loss == 0:
+            return 100.0
+        return 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+
+
+class PairIndicatorState:
+    """单个品种/周期的价格线 + RSI 增量状态
+
+    按开盘时间区分K线：同一根K线的多次更新只试算；
+    出现更新的开盘时间时，先确认上一根（即使没收到它的收盘推送）。
+    """
+
+    def __init__(self, hhv_period=HHV_PERIOD, sma_period=SMA_PERIOD, hhv_a_period=HHV_A_PERIOD,
+                 rsi_period=RSI_PERIOD):
+        self.params = (hhv_period, sma_period, hhv_a_period, rsi_period)
+        self.reset()
+
+    def reset(self):
+        """清空状态"""
+        hhv_period, sma_period, hhv_a_period, rsi_period = self.params
+        self.price_line_state = PriceLineState(hhv_period, sma_period, hhv_a_period)
+        self.rsi_state = WilderRSIState(rsi_period)
+        self.committed_open_time = None
+        self.pending = None  # 正在形成的K线 (open_time, high, low, close)
+        self.price_line = None
+        self.rsi = None
+        self.close = None
+
+    def seed(self, open_times, highs, lows, closes, last_closed=False):
+        """用一段历史K线重建状态（回补后调用），最后一根默认视为正在形成"""
+        self.reset()
+        count = len(closes)
+        for i in range(count):
+            self.update(int(open_times[i]), float(highs[i]), float(lows[i]), float(closes[i]),
+                        closed=(i < count - 1) or last_closed)
+        return self.price_line, self.rsi
+
+    def update(self, open_time, high, low, close, closed=False):
+        """处理一次K线更新
+
+        Returns:
+            (price_line, rsi)，数据不足时对应值为None
+        """
+        if self.committed_open_time is not None and open_time <= self.committed_open_time:
+            # 已确认K线的迟到修订，忽略
+            return self.price_line, self.rsi
+
+        if self.pending is not None and open_time > self.pending[0]:
+            # 上一根K线的收盘推送丢失，按最后一次更新确认
+            self._step(*self.pending, commit=True)
+
+        if closed:
+            self._step(open_time, high, low, close, commit=True)
+            self.pending = None
+        else:
+            self._step(open_time, high, low, close, commit=False)
+            self.pending = (open_time, high, low, close)
+        return self.price_line, self.rsi
+
+    def _step(self, open_time, high, low, close, commit):
+        self.price_line = self.price_line_state.step(high, low, close, commit)
+        self.rsi = self.rsi_state.step(close, commit)
+        self.close = close
+        if commit:
+            self.committed_open_time = open_time
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+指标计算内核
+
+价格线和RSI所需的基础运算，全部基于NumPy数组：
+  - 滑动窗口最大/最小值（HHV/LLV）使用van Herk/Gil-Werman分块算法，
+    每个元素只做常数次比较，复杂度O(n)，与窗口长度无关，也不再为每个位置切片分配列表
+  - RSV、通达信SMA、EMA、Wilder RSI
+
+所有函数都沿最后一个轴计算，既可以传一维序列，也可以传 (品种数, 长度) 的二维数组。
+递推类指标（SMA/EMA/RSI）在时间轴上逐步推进，二维输入时每一步对所有品种同时计算。
+"""
+
+import numpy as np
+
+# 价格线和RSI的默认参数（实时监控、增量计算和全市场筛选共用）
+HHV_PERIOD = 33
+SMA_PERIOD = 8
+HHV_A_PERIOD = 3
+RSI_PERIOD = 6
+
+
+def _as_float_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _rolling_extreme(values, window, ufunc, fill, partial):
+    values = _as_float_array(values)
+    length = values.shape[-1]
+    window = int(window)
+
+    if window <= 1:
+        return values.copy()
+
+    if length >= window:
+        # 按窗口长度分块，块内前缀极值和后缀极值各算一次；
+        # 任一窗口恰好跨越相邻两块，结果为 max(左块后缀, 右块前缀)
+        pad = (-length) % window
+        if pad:
+            filler = np.full(values.shape[:-1] + (pad,), fill)
+            padded = np.concatenate((values, filler), axis=-1)
+        else:
+            padded = values
+        blocks = padded.reshape(values.shape[:-1] + (-1, window))
+        prefix = ufunc.accumulate(blocks, axis=-1).reshape(padded.shape)
+        suffix = np.flip(ufunc.accumulate(np.flip(blocks, axis=-1), axis=-1), axis=-1).reshape(padded.shape)
+        count = length - window + 1
+        full = ufunc(suffix[..., :count], prefix[..., window - 1:window - 1 + count])
+    else:
+        full = values[..., :0].copy()
+
+    if not partial:
+        return full
+
+    # 前 window-1 个位置使用已有数据计算（与通达信HHV一致）
+    head = ufunc.accumulate(values[..., :min(window - 1, length)], axis=-1)
+    return np.concatenate((head, full), axis=-1)
+
+
+def rolling_max(values, window, partial=False):
+    """滑动窗口最大值（HHV）
+
+    Args:
+        values: 一维或二维数组
+        window: 窗口长度
+        partial: False时只返回完整窗口（长度 n-window+1）；True时前面不足窗口的位置用已有数据计算（长度n）
+    """
+    return _rolling_extreme(values, window, np.maximum, -np.inf, partial)
+
+
+def rolling_min(values, window, partial=False):
+    """滑动窗口最小值（LLV），参数同 rolling_max"""
+    return _rolling_extreme(values, window, np.minimum, np.inf, partial)
+
+
+def rsv(highs, lows, closes, period):
+    """RSV = (C - LLV(L, N)) / (HHV(H, N) - LLV(L, N))，区间为0时取0
+
+    返回长度为 n-period+1，第一个值对应第 period 根K线。
+    """
+    highest = rolling_max(highs, period)
+    lowest = rolling_min(lows, period)
+    closes = _as_float_array(closes)[..., period - 1:]
+    span = highest - lowest
+    result = np.zeros_like(span)
+    np.divide(closes - lowest, span, out=result, where=span != 0)
+    return result
+
+
+def _recursive_average(values, new_weight, old_weight, denominator):
+    """y[i] = (new_weight * x[i] + old_weight * y[i-1]) / denominator，y[-1] = x[0]"""
+    values = _as_float_array(values)
+    length = values.shape[-1]
+    result = np.empty_like(values)
+    if length == 0:
+        return result
+
+    if values.ndim == 1:
+        # 一维时用Python浮点循环，比逐元素NumPy标量运算快得多
+        current = values[0]
+        out = result.tolist()
+        for i, x in enumerate(values.tolist()):
+            current = (new_weight * x + old_weight * current) / denominator
+            out[i] = current
+        return np.array(out)
+
+    current = values[..., 0].copy()
+    for i in range(length):
+        current = (new_weight * values[..., i] + old_weight * current) / denominator
+        result[..., i] = current
+    return result
+
+
+def tdx_sma(values, period, weight=1):
+    """通达信SMA(X, N, M)：Y = (M*X + (N-M)*Y') / N，初值为第一个X"""
+    return _recursive_average(values, weight, period - weight, period)
+
+
+def ema(values, period):
+    """标准EMA，alpha = 2 / (N + 1)，初值为第一个值"""
+    alpha = 2.0 / (period + 1)
+    if alpha == 1.0:
+        # EMA(X, 1) 即X本身
+        return _as_float_array(values).copy()
+    return _recursive_average(values, alpha, 1 - alpha, 1.0)
+
+
+def price_line(highs, lows, closes, hhv_period=HHV_PERIOD, sma_period=SMA_PERIOD, hhv_a_period=HHV_A_PERIOD):
+    """价格线序列：EMA(HHV(SMA(RSV(N), M, 1) * 100, K), 1)
+
+    返回长度为 n-hhv_period+1（不足时为空数组）。
+    """
+    closes = _as_float_array(closes)
+    if closes.shape[-1] < hhv_period:
+        return closes[..., :0].copy()
+
+    a_values = tdx_sma(rsv(highs, lows, closes, hhv_period), sma_period, 1) * 100
+    hhv_a = rolling_max(a_values, hhv_a_period, partial=True)
+    return ema(hhv_a, 1)
+
+
+def wilder_rsi(closes, period=RSI_PERIOD):
+    """Wilder平滑RSI序列
+
+    前 period 个涨跌幅取简单平均作为初值，之后 avg = (avg*(N-1) + x) / N。
+    返回长度为 n-period（不足时为空数组），第一个值对应第 period+1 根K线。
+    """
+    closes = _as_float_array(closes)
+    length = closes.shape[-1]
+    if length < period + 1:
+        return closes[..., :0].copy()
+
+    deltas = np.diff(closes, axis=-1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    avg_gain = gains[..., :period].mean(axis=-1)
+    avg_loss = losses[..., :period].mean(axis=-1)
+    count = length - period
+    gain_series = np.empty(closes.shape[:-1] + (count,))
+    loss_series = np.empty(closes.shape[:-1] + (count,))
+    gain_series[..., 0] = avg_gain
+    loss_series[..., 0] = avg_loss
+
+    if count > 1:
+        gain_series[..., 1:] = _wilder_tail(gains[..., period:], avg_gain, period)
+        loss_series[..., 1:] = _wilder_tail(losses[..., period:], avg_loss, period)
+
+    return _rsi_from_averages(gain_series, loss_series)
+
+
+def _wilder_tail(values, initial, period):
+    if values.ndim == 1:
+        current = float(initial)
+        out = []
+        for x in values.tolist():
+            current = (current * (period - 1) + x) / period
+            out.append(current)
+        return np.array(out)
+
+    result = np.empty_like(values)
+    current = np.array(initial, dtype=np.float64)
+    for i in range(values.shape[-1]):
+        current = (current * (period - 1) + values[..., i]) / period
+        result[..., i] = current
+    return result
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    # 平均跌幅为0时RSI为100
+    result = np.full(np.shape(avg_gain), 100.0)
+    np.divide(avg_gain, avg_loss, out=result, where=avg_loss != 0)
+    mask = avg_loss != 0
+    result[mask] = 100.0 - 100.0 / (1.0 + result[mask])
+    return result
+
+
+class BatchResult:
+    """批量指标计算结果
+
+    Attributes:
+        price_line: (品种数, n-hhv_period+1) 价格线序列
+        rsi: (品种数, n-rsi_period) RSI序列
+        latest_price_line: (品种数,) 最新价格线，数据不足时为nan
+        latest_rsi: (品种数,) 最新RSI，数据不足时为nan
+        latest_close: (品种数,) 最新收盘价
+    """
+
+    __slots__ = ('price_line', 'rsi', 'latest_price_line', 'latest_rsi', 'latest_close')
+
+    def __init__(self, price_line_series, rsi_series, closes):
+        self.price_line = price_line_series
+        self.rsi = rsi_series
+        self.latest_price_line = _latest(price_line_series, len(closes))
+        self.latest_rsi = _latest(rsi_series, len(closes))
+        self.latest_close = closes[:, -1] if closes.shape[1] else np.full(len(closes), np.nan)
+
+
+def _latest(series, rows):
+    if series.shape[-1] == 0:
+        return np.full(rows, np.nan)
+    return series[:, -1].copy()
+
+
+def stack_tails(series_list, length=None):
+    """把多条序列右对齐取最后 length 个值，堆叠为 (品种数, length) 数组
+
+    length 默认取最短序列的长度；任一序列不足 length 时抛出 ValueError。
+    """
+    if length is None:
+        length = min(len(series) for series in series_list) if series_list else 0
+    result = np.empty((len(series_list), length), dtype=np.float64)
+    for row, series in enumerate(series_list):
+        if len(series) < length:
+            raise ValueError(f"第{row}条序列长度{len(series)}不足{length}")
+        result[row] = series[len(series) - length:]
+    return result
+
+
+def evaluate_batch(highs, lows, closes, hhv_period=HHV_PERIOD, sma_period=SMA_PERIOD,
+                   hhv_a_period=HHV_A_PERIOD, rsi_period=RSI_PERIOD):
+    """对多个品种/周期一次性计算价格线和RSI
+
+    Args:
+        highs, lows, closes: (品种数, 长度) 的对齐数组（可用 stack_tails 构造）
+
+    Returns:
+        BatchResult
+    """
+    highs = np.atleast_2d(_as_float_array(highs))
+    lows = np.atleast_2d(_as_float_array(lows))
+    closes = np.atleast_2d(_as_float_array(closes))
+    return BatchResult(
+        price_line(highs, lows, closes, hhv_period, sma_period, hhv_a_period),
+        wilder_rsi(closes, rsi_period),
+        closes,
+    )
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+K线推送数据源（WebSocket）
+
+订阅币安组合流 <symbol>@kline_<interval>，用推送更新维护每个品种/周期的K线缓冲区，
+每次缓冲区变化和每次收盘推送都回调一次指标计算。
+REST只用于启动时的初始回补和断线重连后的缺口修复。
+"""
+
+import json
+import threading
+
+# WebSocket客户端（可选依赖）
+try:
+    import websocket
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    WEBSOCKET_AVAILABLE = False
+    print("警告: websocket-client未安装，推送模式不可用")
+
+
+class KlineStreamClient:
+    """币安K线推送客户端"""
+
+    def __init__(self, buffer_store, config, pairs, on_update, on_log=None,
+                 fetch_engine=None, record_path=None):
+        """
+        Args:
+            buffer_store: CandleBufferStore，保存K线缓冲区并负责REST回补/增量补缺口
+            config: MonitorConfig
+            pairs: [(symbol, timeframe), ...]
+            on_update: 回调 on_update(symbol, timeframe, buffer, is_closed, candle)，
+                       candle 为推送的 (open_time, high, low, close)，REST回补时为None
+            on_log: 可选日志回调 on_log(text, color=None)
+            fetch_engine: 可选KlineFetchEngine，回补时并发请求
+            record_path: 可选文件路径，把收到的原始推送逐行记录下来（供回放服务器使用）
+        """
+        self.buffer_store = buffer_store
+        self.config = config
+        self.pairs = list(pairs)
+        self.on_update = on_update
+        self.on_log = on_log
+        self.fetch_engine = fetch_engine
+        self.record_path = record_path
+
+        self.buffers = {
+            (symbol, timeframe): buffer_store.get(symbol, timeframe)
+            for symbol, timeframe in self.pairs
+        }
+        self.stop_event = threading.Event()
+        self.ws = None
+        self.thread = None
+        self.reconnect_count = 0
+
+    @property
+    def url(self):
+        """组合流订阅地址"""
+        streams = '/'.join(f"{symbol.lower()}@kline_{timeframe}" for symbol, timeframe in self.pairs)
+        return f"{self.config.stream_url}/stream?streams={streams}"
+
+    def start(self):
+        """启动后台推送线程"""
+        if not WEBSOCKET_AVAILABLE:
+            raise RuntimeError("websocket-client未安装，无法使用推送模式")
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止推送并关闭连接"""
+        self.stop_event.set()
+        ws = self.ws
+        if ws:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def join(self, timeout=None):
+        """等待推送线程退出（stop 之后调用）"""
+        thread = self.thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def backfill(self):
+        """通过REST回补所有品种/周期的K线（启动和重连后调用）
+
+        重连时缓冲区已有数据，只会从最后已知开盘时间开始增量补齐缺口。
+        """
+        versions = {key: buffer.version for key, buffer in self.buffers.items()}
+        if self.fetch_engine:
+            results = self.fetch_engine.fetch_all(self.pairs, should_stop=self.stop_event.is_set,
+                                                  fetch_func=self.buffer_store.refresh)
+        else:
+            results = ((symbol, timeframe) + self.buffer_store.refresh(symbol, timeframe)
+                       for symbol, timeframe in self.pairs)
+
+        for symbol, timeframe, success, buffer, error in results:
+            if self.stop_event.is_set():
+                break
+            if not success:
+                self._log(f"[{symbol}/{timeframe}] 回补失败: {error}", color='yellow')
+                continue
+            if buffer.version != versions[(symbol, timeframe)]:
+                self.on_update(symbol, timeframe, buffer, False, None)
+
+    def _run(self):
+        self.backfill()
+
+        delay = 1
+        while not self.stop_event.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            self.ws.run_forever(ping_interval=60, ping_timeout=20)
+
+            if self.stop_event.is_set():
+                break
+            self._log(f"推送连接断开，{delay}秒后重连", color='yellow')
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, 60)
+            self.reconnect_count += 1
+        self.ws = None
+
+    def _on_open(self, ws):
+        if self.reconnect_count:
+            # 断线期间可能漏掉了K线，先用REST补齐缺口再继续处理推送
+            self._log("推送已重连，正在修复缺口...")
+            self.backfill()
+        else:
+            self._log(f"推送已连接: {len(self.pairs)} 个订阅")
+
+    def _on_error(self, ws, error):
+        if not self.stop_event.is_set():
+            self._log(f"推送错误: {error}", color='yellow')
+
+    def _on_message(self, ws, message):
+        if self.record_path:
+            self._record(message)
+
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+
+        # 组合流格式为 {"stream": ..., "data": {...}}
+        event = payload.get('data', payload)
+        if event.get('e') != 'kline':
+            return
+
+        kline = event['k']
+        key = (event['s'].upper(), kline['i'])
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            return
+
+        changed = buffer.apply_kline(kline['t'], kline['o'], kline['h'],
+                                     kline['l'], kline['c'], kline['v'])
+        is_closed = bool(kline['x'])
+        # 收盘推送的数值可能与上一次未收盘推送相同，仍然要交给使用方确认K线、写缓存
+        if changed or is_closed:
+            candle = (int(kline['t']), float(kline['h']), float(kline['l']), float(kline['c']))
+            self.on_update(key[0], key[1], buffer, is_closed, candle)
+
+    def _record(self, message):
+        try:
+            with open(self.record_path, 'a', encoding='utf-8') as f:
+                f.write(message.strip() + '\n')
+        except OSError:
+            pass
+
+    def _log(self, text, color=None):
+        if self.on_log:
+            self.on_log(text, color=color)
@@ -8,13 +8,12 @@
 支持后台运行和通知提醒
 """
 
-import time
-from datetime import datetime
 import threading
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import numpy as np
+
+from kline_stream import WEBSOCKET_AVAILABLE
+from monitor_engine import (MonitorConfig, BinanceAPIClient, PriceLineCalculator,  # noqa: F401
+                            RSICalculator, MonitorEngine)
+from view_models import LogStore, StatusBoard, format_age, format_diagnostics
 
 # Kivy imports
 from kivy.app import App
@@ -24,7 +23,8 @@ from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.checkbox import CheckBox
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.popup import Popup
+from kivy.uix.recycleview import RecycleView
 from kivy.clock import Clock, mainthread
 from kivy.properties import StringProperty, BooleanProperty
 from kivy.core.audio import SoundLoader
@@ -52,245 +52,6 @@ except ImportError:
     print("警告: pyttsx3未安装，桌面语音功能不可用")
 
 
-class MonitorConfig:
-    """监控配置"""
-    def __init__(self):
-        # 多合约和多周期支持
-        self.symbols = ['ETHUSDT']  # 默认监控ETHUSDT
-        self.timeframes = ['3m']     # 默认3分钟周期
-        self.limit = 100
-
-        # 价格线阈值
-        self.price_line_low = 23.0
-        self.price_line_high = 75.0
-
-        # RSI阈值
-        self.rsi_low = 23.0
-        self.rsi_high = 75.0
-
-        # 监控间隔（秒）
-        self.check_interval = 15
-
-        # API请求配置
-        self.max_retries = 3
-        self.retry_delay = 2
-        self.request_timeout = 10
-        self.min_request_interval = 1.0
-
-
-class BinanceAPIClient:
-    """币安API客户端"""
-
-    def __init__(self, config):
-        self.config = config
-        self.base_url = "https://api.binance.com"
-        self.session = self._create_session()
-        self.request_count = 0
-        self.failed_count = 0
-        self.last_request_time = 0
-
-    def _create_session(self):
-        """创建带重试策略的Session"""
-        session = requests.Session()
-        retry_strategy = Retry(
-            total=self.config.max_retries,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET"]
-        )
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=1,
-            pool_maxsize=1,
-            pool_block=False
-        )
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
-        return session
-
-    def _wait_for_rate_limit(self):
-        """等待以满足速率限制"""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        if elapsed < self.config.min_request_interval:
-            time.sleep(self.config.min_request_interval - elapsed)
-        self.last_request_time = time.time()
-
-    def fetch_klines(self, symbol, timeframe):
-        """获取K线数据"""
-        url = f"{self.base_url}/api/v3/klines"
-        params = {
-            'symbol': symbol,
-            'interval': timeframe,
-            'limit': self.config.limit
-        }
-
-        retry_count = 0
-        last_error = None
-
-        while retry_count <= self.config.max_retries:
-            try:
-                self._wait_for_rate_limit()
-                response = self.session.get(url, params=params, timeout=self.config.request_timeout)
-                self.request_count += 1
-
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        return True, data, None
-                    else:
-                        return False, None, "返回数据为空"
-                elif response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 60))
-                    time.sleep(retry_after)
-                    retry_count += 1
-                    continue
-                else:
-                    retry_count += 1
-                    time.sleep(self.config.retry_delay)
-
-            except Exception as e:
-                retry_count += 1
-                last_error = str(e)
-                time.sleep(self.config.retry_delay)
-
-        self.failed_count += 1
-        return False, None, f"请求失败: {last_error}"
-
-    def close(self):
-        """关闭Session"""
-        try:
-            if hasattr(self, 'session') and self.session:
-                self.session.close()
-        except:
-            pass
-
-
-class PriceLineCalculator:
-    """价格线计算器"""
-
-    def __init__(self, api_client, config):
-        self.api_client = api_client
-        self.config = config
-        self.dates = []
-        self.highs = []
-        self.lows = []
-        self.closes = []
-        self.hhv_period = 33
-        self.sma_period = 8
-        self.hhv_a_period = 3
-
-    def fetch_kline_data(self, symbol, timeframe):
-        """从币安获取K线数据"""
-        success, data, error = self.api_client.fetch_klines(symbol, timeframe)
-        if not success:
-            return False, error
-
-        self.dates = []
-        self.highs = []
-        self.lows = []
-        self.closes = []
-
-        for kline in data:
-            timestamp = kline[0]
-            high_price = float(kline[2])
-            low_price = float(kline[3])
-            close_price = float(kline[4])
-
-            self.dates.append(datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S'))
-            self.highs.append(high_price)
-            self.lows.append(low_price)
-            self.closes.append(close_price)
-
-        if len(self.closes) < self.hhv_period + self.sma_period + self.hhv_a_period:
-            return False, "数据不足"
-
-        return True, None
-
-    def tdx_sma(self, data, period, weight=1):
-        """通达信SMA函数"""
-        if len(data) == 0:
-            return []
-        sma_values = []
-        sma = data[0]
-        for i in range(len(data)):
-            sma = (weight * data[i] + (period - weight) * sma) / period
-            sma_values.append(sma)
-        return sma_values
-
-    def ema(self, data, period):
-        """标准EMA函数"""
-        if len(data) == 0:
-            return []
-        alpha = 2.0 / (period + 1)
-        ema_values = []
-        ema = data[0]
-        for i in range(len(data)):
-            ema = alpha * data[i] + (1 - alpha) * ema
-            ema_values.append(ema)
-        return ema_values
-
-    def calculate_price_line(self):
-        """计算价格线指标"""
-        if len(self.closes) < self.hhv_period:
-            return None
-
-        rsv_values = []
-        for i in range(self.hhv_period - 1, len(self.closes)):
-            var1 = max(self.highs[i - self.hhv_period + 1:i + 1])
-            var2 = min(self.lows[i - self.hhv_period + 1:i + 1])
-
-            if var1 - var2 == 0:
-                rsv = 0
-            else:
-                rsv = (self.closes[i] - var2) / (var1 - var2)
-            rsv_values.append(rsv)
-
-        sma_values = self.tdx_sma(rsv_values, self.sma_period, 1)
-        a_values = [x * 100 for x in sma_values]
-
-        # 计算 HHV(A, 3)
-        hhv_a_values = []
-        for i in range(len(a_values)):
-            if i < self.hhv_a_period - 1:
-                hhv_a = max(a_values[0:i + 1])
-            else:
-                hhv_a = max(a_values[i - self.hhv_a_period + 1:i + 1])
-            hhv_a_values.append(hhv_a)
-
-        # 应用 EMA(HHV(A, 3), 1)
-        price_line_values = self.ema(hhv_a_values, 1)
-        return price_line_values[-1] if price_line_values else None
-
-
-class RSICalculator:
-    """RSI计算器"""
-
-    @staticmethod
-    def calculate_rsi(prices, period=6):
-        """使用Wilder's平滑法计算RSI"""
-        if len(prices) < period + 1:
-            return None
-
-        deltas = np.diff(prices)
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-
-        avg_gain = np.mean(gains[:period])
-        avg_loss = np.mean(losses[:period])
-
-        for i in range(period, len(gains)):
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-
-        if avg_loss == 0:
-            return 100.0
-
-        rs = avg_gain / avg_loss
-        rsi = 100.0 - (100.0 / (1.0 + rs))
-        return rsi
-
-
 class TTSManager:
     """跨平台语音播报管理器"""
 
@@ -377,6 +138,136 @@ class TTSManager:
         self.is_speaking = False
 
 
+Builder.load_string('''
+<LogRow>:
+    size_hint_y: None
+    text_size: self.width, None
+    height: self.texture_size[1]
+    halign: 'left'
+    valign: 'top'
+    markup: True
+
+<LogView>:
+    viewclass: 'LogRow'
+    RecycleBoxLayout:
+        orientation: 'vertical'
+        default_size_hint: 1, None
+        default_size: None, dp(20)
+        size_hint_y: None
+        height: self.minimum_height
+''')
+
+
+class LogRow(Label):
+    """日志行"""
+
+
+class LogView(RecycleView):
+    """日志列表：只为可见行创建控件，每帧最多从 LogStore 刷新一次"""
+
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.store_version = None
+        self.flush_trigger = Clock.create_trigger(self.flush)
+
+    def flush(self, *args):
+        """把日志模型的变化一次性交给RecycleView"""
+        rows, self.store_version = self.store.snapshot(self.store_version)
+        if rows is None:
+            return
+        # 停留在底部时跟随最新日志，用户往上翻看时不打扰
+        follow = self.scroll_y <= 0.01 or self.height >= self.children[0].height
+        self.data = rows
+        if follow:
+            self.scroll_y = 0
+
+
+class StatusGrid(GridLayout):
+    """品种/周期状态表：每个组合一行，只原地更新数值变化的单元格，每帧最多刷新一次"""
+
+    HEADERS = ('品种', '周期', '价格', '价格线', 'RSI', '更新', '状态')
+
+    def __init__(self, board, **kwargs):
+        super().__init__(cols=len(self.HEADERS), size_hint_y=None,
+                         row_force_default=True, row_default_height=24, **kwargs)
+        self.bind(minimum_height=self.setter('height'))
+        self.board = board
+        self.cells = {}  # (symbol, timeframe) -> [Label, ...]
+        for header in self.HEADERS:
+            self.add_widget(Label(text=header, bold=True, font_size='13sp'))
+        self.flush_trigger = Clock.create_trigger(self.flush)
+        Clock.schedule_interval(self.refresh_ages, 1)
+
+    def reset(self):
+        """清空所有行（保留表头）"""
+        for labels in self.cells.values():
+            for label in labels:
+                self.remove_widget(label)
+        self.cells = {}
+
+    def _row(self, key):
+        labels = self.cells.get(key)
+        if labels is None:
+            symbol, timeframe = key
+            labels = [Label(font_size='13sp', markup=True) for _ in self.HEADERS]
+            labels[0].text = symbol
+            labels[1].text = timeframe
+            for label in labels:
+                self.add_widget(label)
+            self.cells[key] = labels
+        return labels
+
+    def flush(self, *args):
+        """把状态表的变化写入对应单元格，移除已删除的行"""
+        for key in self.board.take_removed():
+            for label in self.cells.pop(key, ()):
+                self.remove_widget(label)
+        for key, (price, price_line, rsi, alert) in self.board.take_changes():
+            labels = self._row(key)
+            labels[2].text = f"{price:.2f}"
+            labels[3].text = f"{price_line:.1f}"
+            labels[4].text = f"{rsi:.1f}"
+            labels[6].text = f"[color=ff0000]{alert}[/color]" if alert else '[color=00ff00]正常[/color]'
+
+    def refresh_ages(self, *args):
+        """每秒刷新一次“更新”列，文本不变时不重新赋值"""
+        for key, age in self.board.ages():
+            labels = self.cells.get(key)
+            if labels is None:
+                continue
+            text = format_age(age)
+            if labels[5].text != text:
+                labels[5].text = text
+
+
+class DiagnosticsPopup(Popup):
+    """诊断面板：各阶段耗时、请求计数、限速和数据时效，打开期间每秒刷新"""
+
+    def __init__(self, engine, **kwargs):
+        super().__init__(title='运行诊断', size_hint=(0.95, 0.8), **kwargs)
+        self.engine = engine
+        self.label = Label(halign='left', valign='top', font_size='12sp')
+        self.label.bind(size=lambda label, size: setattr(label, 'text_size', size))
+        self.content = self.label
+        self.refresh_event = None
+
+    def on_open(self):
+        self.refresh()
+        self.refresh_event = Clock.schedule_interval(self.refresh, 1)
+
+    def on_dismiss(self):
+        if self.refresh_event:
+            self.refresh_event.cancel()
+            self.refresh_event = None
+
+    def refresh(self, *args):
+        if self.engine is None:
+            self.label.text = "监控未启动"
+            return
+        self.label.text = '\n'.join(format_diagnostics(self.engine.metrics))
+
+
 class MonitorWidget(BoxLayout):
     """监控界面主Widget"""
 
@@ -390,9 +281,9 @@ class MonitorWidget(BoxLayout):
         self.spacing = 6
 
         self.config = MonitorConfig()
-        self.api_client = None
-        self.monitor_thread = None
-        self.stop_monitoring = False
+        self.engine = None  # 监控引擎，界面只负责显示它交出的日志、状态和告警
+        self.log_store = LogStore(max_lines=500)
+        self.status_board = StatusBoard()
 
         # 初始化TTS语音引擎
         self.tts_manager = TTSManager()
@@ -493,6 +384,13 @@ class MonitorWidget(BoxLayout):
         btc_box.add_widget(Label(text='BTCUSDT', size_hint_x=None, width=110))
         symbol_checkboxes.add_widget(btc_box)
 
+        # 全市场筛选（U本位永续合约），选中后忽略上面的品种
+        screen_box = BoxLayout(size_hint_x=None, width=200, spacing=5)
+        self.screen_checkbox = CheckBox(active=self.config.screen_enabled, size_hint_x=None, width=30)
+        screen_box.add_widget(self.screen_checkbox)
+        screen_box.add_widget(Label(text='全市场筛选(永续)', size_hint_x=None, width=160))
+        symbol_checkboxes.add_widget(screen_box)
+
         symbol_section.add_widget(symbol_checkboxes)
         self.add_widget(symbol_section)
 
@@ -541,6 +439,15 @@ class MonitorWidget(BoxLayout):
         timeframe_section.add_widget(timeframe_checkboxes)
         self.add_widget(timeframe_section)
 
+        # 数据源选择
+        source_box = BoxLayout(size_hint_y=None, height=25, spacing=5)
+        self.stream_checkbox = CheckBox(active=self.config.data_source == 'stream',
+                                        size_hint_x=None, width=30,
+                                        disabled=not WEBSOCKET_AVAILABLE)
+        source_box.add_widget(self.stream_checkbox)
+        source_box.add_widget(Label(text='WebSocket推送模式', size_hint_x=None, width=160))
+        self.add_widget(source_box)
+
         # 控制按钮
         button_layout = BoxLayout(size_hint_y=None, height=50, spacing=10)
 
@@ -559,6 +466,10 @@ class MonitorWidget(BoxLayout):
         self.stop_button.bind(on_press=self.stop_monitoring_action)
         button_layout.add_widget(self.stop_button)
 
+        self.diagnostics_button = Button(text='诊断', size_hint_x=None, width=80)
+        self.diagnostics_button.bind(on_press=self.show_diagnostics)
+        button_layout.add_widget(self.diagnostics_button)
+
         self.add_widget(button_layout)
 
         # 状态显示区域
@@ -571,24 +482,14 @@ class MonitorWidget(BoxLayout):
         )
         self.add_widget(status_label)
 
-        # 滚动日志
-        scroll = ScrollView(size_hint=(1, 1))
-        self.log_label = Label(
-            text=self.status_text,
-            size_hint_y=None,
-            text_size=(self.width - 20, None),
-            halign='left',
-            valign='top',
-            markup=True  # 启用markup支持颜色
-        )
-        self.log_label.bind(texture_size=self.log_label.setter('size'))
-        self.log_label.bind(text=self.on_log_text_change)
-        scroll.add_widget(self.log_label)
-        self.add_widget(scroll)
+        # 每个品种/周期一行的实时状态
+        self.status_grid = StatusGrid(self.status_board)
+        self.add_widget(self.status_grid)
 
-    def on_log_text_change(self, instance, value):
-        """日志文本改变时调整大小"""
-        instance.text_size = (self.width - 20, None)
+        # 滚动日志（只记录告警和错误）
+        self.log_view = LogView(self.log_store, size_hint=(1, 1))
+        self.add_widget(self.log_view)
+        self.append_log(self.status_text)
 
     def update_config_from_ui(self):
         """从UI更新配置"""
@@ -619,14 +520,18 @@ class MonitorWidget(BoxLayout):
             if self.tf_1d_checkbox.active:
                 self.config.timeframes.append('1d')
 
-            # 验证至少选择了一个品种和一个周期
-            if not self.config.symbols:
-                self.append_log("错误: 请至少选择一个监控品种", color='red')
-                return False
-            if not self.config.timeframes:
-                self.append_log("错误: 请至少选择一个K线周期", color='red')
-                return False
+            self.config.data_source = 'stream' if self.stream_checkbox.active else 'rest'
+            self.config.screen_enabled = self.screen_checkbox.active
+            if self.config.screen_enabled:
+                # 全市场筛选只用REST
+                self.config.market = 'usdm'
+                self.config.data_source = 'rest'
+            else:
+                self.config.market = 'spot'
 
+            # 与引擎启动时相同的检查（至少一个品种和周期、检查间隔大于0等），
+            # 在禁用输入控件之前完成，出错时界面保持可编辑
+            self.config.validate()
             return True
         except ValueError as e:
             self.append_log(f"配置错误: {e}", color='red')
@@ -637,7 +542,6 @@ class MonitorWidget(BoxLayout):
         if not self.update_config_from_ui():
             return
 
-        self.stop_monitoring = False
         self.is_monitoring = True
         self.start_button.disabled = True
         self.stop_button.disabled = False
@@ -650,32 +554,24 @@ class MonitorWidget(BoxLayout):
         self.interval_input.disabled = True
         self.eth_checkbox.disabled = True
         self.btc_checkbox.disabled = True
+        self.screen_checkbox.disabled = True
         self.tf_1m_checkbox.disabled = True
         self.tf_3m_checkbox.disabled = True
         self.tf_5m_checkbox.disabled = True
         self.tf_15m_checkbox.disabled = True
         self.tf_1d_checkbox.disabled = True
+        self.stream_checkbox.disabled = True
 
-        self.append_log("正在启动监控...")
-        self.append_log(f"监控品种: {', '.join(self.config.symbols)}")
-        self.append_log(f"K线周期: {', '.join(self.config.timeframes)}")
-        self.append_log(f"监控条件:")
-        self.append_log(f"  价格线 <= {self.config.price_line_low}")
-        self.append_log(f"  价格线 >= {self.config.price_line_high}")
-        self.append_log(f"  RSI(6) <= {self.config.rsi_low}")
-        self.append_log(f"  RSI(6) >= {self.config.rsi_high}")
-        self.append_log(f"  检查间隔: {self.config.check_interval}秒")
-
-        # 创建API客户端
-        self.api_client = BinanceAPIClient(self.config)
-
-        # 启动监控线程
-        self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
-        self.monitor_thread.start()
+        self.status_board.clear()
+        self.status_grid.reset()
+        self.engine = MonitorEngine(self.config, on_log=self.append_log,
+                                    on_status=self.on_engine_status,
+                                    on_alert=self.on_engine_alert,
+                                    on_screen=self.on_engine_screen)
+        self.engine.start()
 
     def stop_monitoring_action(self, instance):
         """停止监控"""
-        self.stop_monitoring = True
         self.is_monitoring = False
         self.start_button.disabled = False
         self.stop_button.disabled = True
@@ -688,50 +584,38 @@ class MonitorWidget(BoxLayout):
         self.interval_input.disabled = False
         self.eth_checkbox.disabled = False
         self.btc_checkbox.disabled = False
+        self.screen_checkbox.disabled = False
         self.tf_1m_checkbox.disabled = False
         self.tf_3m_checkbox.disabled = False
         self.tf_5m_checkbox.disabled = False
         self.tf_15m_checkbox.disabled = False
         self.tf_1d_checkbox.disabled = False
+        self.stream_checkbox.disabled = not WEBSOCKET_AVAILABLE
 
-        self.append_log("监控已停止")
+        # 停止引擎（立即打断调度等待）
+        if self.engine:
+            self.engine.stop()
 
         # 停止语音播报
         if self.tts_manager:
             self.tts_manager.stop()
 
-        if self.api_client:
-            self.api_client.close()
+    def show_diagnostics(self, instance):
+        """打开诊断面板"""
+        DiagnosticsPopup(self.engine).open()
 
-    @mainthread
     def append_log(self, text, color=None):
         """添加日志（线程安全）
 
+        只写入环形日志缓冲区，界面在下一帧统一刷新一次，
+        连续多行日志不会各自触发一次重新排版。
+
         Args:
             text: 日志文本
             color: 可选颜色，如'red'、'green'等，None为默认颜色
         """
-        current_time = datetime.now().strftime('%H:%M:%S')
-
-        # 根据颜色添加markup标记
-        if color == 'red':
-            colored_text = f"[color=ff0000]{text}[/color]"
-        elif color == 'green':
-            colored_text = f"[color=00ff00]{text}[/color]"
-        elif color == 'yellow':
-            colored_text = f"[color=ffff00]{text}[/color]"
-        else:
-            colored_text = text
-
-        new_text = f"[{current_time}] {colored_text}"
-
-        # 保留最近100行
-        lines = self.log_label.text.split('\n')
-        if len(lines) > 100:
-            lines = lines[-100:]
-
-        lines.append(new_text)
-        self.log_label.text = '\n'.join(lines)
+        self.log_store.append(text, color)
+        self.log_view.flush_trigger()
 
     @mainthread
     def show_alert_notification(self, title, message):
@@ -760,95 +644,19 @@ class MonitorWidget(BoxLayout):
             self.tts_manager.speak(speech_text)
             print(f"TTS播报: {speech_text}")
 
-    def monitor_loop(self):
-        """监控循环（在后台线程运行）"""
-        check_count = 0
+    def on_engine_status(self, symbol, timeframe, price, price_line, rsi, alert):
+        """引擎的状态回调：数值变化时在下一帧刷新状态表"""
+        if self.status_board.update(symbol, timeframe, price, price_line, rsi, alert):
+            self.status_grid.flush_trigger()
 
-        while not self.stop_monitoring:
-            check_count += 1
+    def on_engine_screen(self, report):
+        """全市场筛选的回调：状态表只保留本轮排名中的品种"""
+        if self.status_board.retain((row.symbol, row.timeframe) for row in report.top):
+            self.status_grid.flush_trigger()
 
-            # 遍历所有选择的品种和周期组合
-            for symbol in self.config.symbols:
-                for timeframe in self.config.timeframes:
-                    if self.stop_monitoring:
-                        break
-
-                    try:
-                        # 创建计算器
-                        calc = PriceLineCalculator(self.api_client, self.config)
-
-                        # 获取数据
-                        success, error = calc.fetch_kline_data(symbol, timeframe)
-                        if not success:
-                            self.append_log(f"[{symbol}/{timeframe}] 错误: {error}", color='yellow')
-                            continue
-
-                        # 计算价格线
-                        price_line = calc.calculate_price_line()
-                        if price_line is None:
-                            self.append_log(f"[{symbol}/{timeframe}] 警告: 计算价格线失败", color='yellow')
-                            continue
-
-                        # 计算RSI
-                        current_rsi = RSICalculator.calculate_rsi(calc.closes, period=6)
-                        if current_rsi is None:
-                            self.append_log(f"[{symbol}/{timeframe}] 警告: 计算RSI失败", color='yellow')
-                            continue
-
-                        current_price = calc.closes[-1]
-
-                        # 检查告警条件
-                        alerts = []
-                        speech_parts = []  # 用于语音播报的部分
-
-                        if price_line <= self.config.price_line_low:
-                            alert_msg = f"价格线低位: {price_line:.2f} <= {self.config.price_line_low}"
-                            alerts.append(alert_msg)
-                            speech_parts.append(f"价格线低位 {price_line:.1f}")
-
-                        if price_line >= self.config.price_line_high:
-                            alert_msg = f"价格线高位: {price_line:.2f} >= {self.config.price_line_high}"
-                            alerts.append(alert_msg)
-                            speech_parts.append(f"价格线高位 {price_line:.1f}")
-
-                        if current_rsi <= self.config.rsi_low:
-                            alert_msg = f"RSI低位: {current_rsi:.2f} <= {self.config.rsi_low}"
-                            alerts.append(alert_msg)
-                            speech_parts.append(f"RSI低位 {current_rsi:.1f}")
-
-                        if current_rsi >= self.config.rsi_high:
-                            alert_msg = f"RSI高位: {current_rsi:.2f} >= {self.config.rsi_high}"
-                            alerts.append(alert_msg)
-                            speech_parts.append(f"RSI高位 {current_rsi:.1f}")
-
-                        if alerts:
-                            self.append_log("=" * 50, color='red')
-                            self.append_log(f"!!! [{symbol}/{timeframe}] 预警触发 !!!", color='red')
-                            for alert in alerts:
-                                self.append_log(f">> {alert}", color='red')
-                            self.append_log(f">> 当前价格: {current_price:.2f}", color='red')
-                            self.append_log("=" * 50, color='red')
-
-                            # 发送通知和语音播报
-                            speech_msg = f"{symbol} {timeframe}周期，" + "、".join(speech_parts)
-                            self.show_alert_notification(f"{symbol} 监控预警", speech_msg)
-                        else:
-                            # 正常状态，显示简略信息
-                            status = (f"[{symbol}/{timeframe}] "
-                                     f"价格:{current_price:.2f} | "
-                                     f"价格线:{price_line:.1f} | "
-                                     f"RSI:{current_rsi:.1f}")
-                            self.append_log(status)
-
-                    except Exception as e:
-                        self.append_log(f"[{symbol}/{timeframe}] 异常: {str(e)}", color='yellow')
-
-                if self.stop_monitoring:
-                    break
-
-            # 等待下次检查
-            if not self.stop_monitoring:
-                time.sleep(self.config.check_interval)
+    def on_engine_alert(self, symbol, timeframe, alerts, price, speech_msg):
+        """引擎的告警回调：发送通知和语音播报"""
+        self.show_alert_notification(f"{symbol} 监控预警", speech_msg)
 
 
 class MonitorApp(App):
@@ -866,7 +674,10 @@ class MonitorApp(App):
                 Permission.WAKE_LOCK
             ])
 
-        return MonitorWidget()
+        widget = MonitorWidget()
+        # K线磁盘缓存放在应用私有目录，下次启动直接载入
+        widget.config.cache_path = os.path.join(self.user_data_dir, 'candles.db')
+        return widget
 
     def setup_chinese_font(self):
         """配置中文字体支持"""
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标
+
+计数器、仪表和固定分桶的直方图，按标签区分（例如 stage="fetch"、status="429"），
+可以输出为 Prometheus 文本格式（MetricsServer 在本地端口提供 /metrics），
+也可以取快照给界面的诊断面板。
+
+开销：一次记录是一次字典查找、一次二分查找和一次加锁，约1微秒，
+每轮检查只有几十次记录，可以在生产环境常开。
+关闭时 registry 返回空操作对象，埋点处不需要判断。
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认的耗时分桶（秒）：覆盖指标计算的几十微秒到网络请求的秒级
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Value:
+    """计数器/仪表的一个标签组合"""
+
+    __slots__ = ('value', 'lock')
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self.lock = lock
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _Histogram:
+    """直方图的一个标签组合（counts[i] 是落在第 i 个桶里的次数，不累加）"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, lock, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = lock
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """计时上下文：with histogram.time(): ..."""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """按分桶线性插值估计分位数（与 Prometheus 的 histogram_quantile 相同），没有数据时为None"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _NullChild:
+    """指标关闭时的空操作对象"""
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return _NULL_TIMER
+
+    def labels(self, *values):
+        return self
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_CHILD = _NullChild()
+_NULL_TIMER = _NullTimer()
+
+
+class MetricFamily:
+    """一个指标（同名、同类型，按标签值区分）
+
+    没有标签时可以直接调用 inc/set/observe/time。
+    """
+
+    def __init__(self, kind, name, documentation, label_names=(), buckets=None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS)
+        self.lock = threading.Lock()
+        self.children = {}
+        if not self.label_names:
+            # 没有标签的指标从0开始输出
+            self.labels()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    if self.kind == 'histogram':
+                        child = _Histogram(threading.Lock(), self.buckets)
+                    else:
+                        child = _Value(self.lock)
+                    self.children[values] = child
+        return child
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        """[(标签值, 子对象), ...]"""
+        with self.lock:
+            return list(self.children.items())
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """指标注册表
+
+    Args:
+        enabled: False时所有指标都是空操作
+        prefix: 指标名前缀
+    """
+
+    def __init__(self, enabled=True, prefix='monitor_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.families = {}
+        self.collectors = []  # 输出前调用，用于在渲染时才计算的仪表（例如数据时效）
+
+    def _family(self, kind, name, documentation, label_names, buckets=None):
+        if not self.enabled:
+            return _NULL_CHILD
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = MetricFamily(kind, self.prefix + name, documentation, label_names, buckets)
+                self.families[name] = family
+            return family
+
+    def counter(self, name, documentation, label_names=()):
+        return self._family('counter', name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._family('gauge', name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=None):
+        return self._family('histogram', name, documentation, label_names, buckets)
+
+    def add_collector(self, collector):
+        """注册输出前调用的函数 collector()，通常用来更新仪表"""
+        if self.enabled:
+            self.collectors.append(collector)
+
+    def get(self, name):
+        """按名称（不含前缀）取指标，不存在时为None"""
+        with self.lock:
+            return self.families.get(name)
+
+    def collect(self):
+        for collector in list(self.collectors):
+            try:
+                collector()
+            except Exception:
+                pass
+        with self.lock:
+            return list(self.families.values())
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in sorted(family.samples()):
+                if family.kind != 'histogram':
+                    labels = _format_labels(family.label_names, values)
+                    lines.append(f"{family.name}{labels} {_format_value(child.value)}")
+                    continue
+                with child.lock:
+                    counts, total, count = list(child.counts), child.sum, child.count
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(family.label_names, values, f'le="{_format_value(bound)}"')
+                    lines.append(f"{family.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(family.label_names, values)
+                lines.append(f"{family.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{family.name}_count{labels} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        content = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """在本地端口提供 /metrics（后台线程）"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+命令行监控（无界面）
+
+不依赖Kivy，可以在没有图形环境的服务器上长期运行，启动只需加载引擎本身。
+
+用法:
+    python monitor_cli.py --symbols ETHUSDT BTCUSDT --timeframes 3m 15m
+    python monitor_cli.py --config monitor.json --status
+    python monitor_cli.py --screen --market usdm --timeframes 15m --top-k 10
+    python monitor_cli.py --config monitor.json --shards 4
+
+配置文件为JSON，键名与 MonitorConfig 的属性一致，例如:
+    {"symbols": ["ETHUSDT"], "timeframes": ["3m", "1d"], "rsi_low": 20, "data_source": "stream"}
+命令行参数会覆盖配置文件中的同名项。
+收到 SIGHUP 时重新读取配置中的品种列表（分片模式下重新分配），其它配置项需要重启才生效。
+"""
+
+import argparse
+import json
+import signal
+import sys
+import threading
+from datetime import datetime
+
+from monitor_engine import MonitorConfig, MonitorEngine
+from shard import ShardedMonitor
+from view_models import StatusBoard, format_screen_report
+
+# 终端颜色
+ANSI_COLORS = {
+    'red': '\033[31m',
+    'green': '\033[32m',
+    'yellow': '\033[33m',
+}
+ANSI_RESET = '\033[0m'
+
+
+class ConsoleOutput:
+    """把引擎的日志、状态和告警输出到终端"""
+
+    def __init__(self, show_status=False, stream=None):
+        self.stream = stream or sys.stdout
+        self.show_status = show_status
+        self.use_color = self.stream.isatty()
+        self.status_board = StatusBoard()
+        self.lock = threading.Lock()
+
+    def write(self, text, color=None):
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] {text}"
+        if self.use_color and color in ANSI_COLORS:
+            line = f"{ANSI_COLORS[color]}{line}{ANSI_RESET}"
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def on_log(self, text, color=None):
+        self.write(text, color)
+
+    def on_status(self, symbol, timeframe, price, price_line, rsi, alert):
+        # 只在显示的数值变化时输出一行
+        if self.show_status and self.status_board.update(symbol, timeframe, price, price_line, rsi, alert):
+            self.write(f"[{symbol}/{timeframe}] 价格:{price:.2f} | 价格线:{price_line:.1f} | RSI:{rsi:.1f}")
+
+    def on_screen(self, report):
+        # 每轮筛选输出一次排名
+        self.write('\n'.join(format_screen_report(report)))
+
+    def on_alert(self, symbol, timeframe, alerts, price, speech_msg):
+        if self.use_color:
+            with self.lock:
+                self.stream.write('\a')
+                self.stream.flush()
+
+
+def build_config(args):
+    """由配置文件和命令行参数生成配置"""
+    config = MonitorConfig()
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+
+    overrides = {
+        'symbols': args.symbols,
+        'timeframes': args.timeframes,
+        'price_line_low': args.price_line_low,
+        'price_line_high': args.price_line_high,
+        'rsi_low': args.rsi_low,
+        'rsi_high': args.rsi_high,
+        'alert_hysteresis': args.hysteresis,
+        'alert_cooldown': args.cooldown,
+        'check_interval': args.interval,
+        'data_source': args.source,
+        'base_url': args.base_url,
+        'stream_url': args.stream_url,
+        'cache_path': args.cache,
+        'metrics_port': args.metrics_port,
+        'market': args.market,
+        'screen_enabled': True if args.screen else None,
+        'screen_top_k': args.top_k,
+    }
+    config.update({name: value for name, value in overrides.items() if value is not None})
+    config.symbols = [symbol.upper() for symbol in config.symbols]
+    config.validate()
+    return config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='价格线和RSI监控（命令行版）')
+    parser.add_argument('--config', help='JSON配置文件')
+    parser.add_argument('--symbols', nargs='+', help='监控品种，例如 ETHUSDT BTCUSDT')
+    parser.add_argument('--timeframes', nargs='+', help='K线周期，例如 1m 3m 1d')
+    parser.add_argument('--price-line-low', type=float)
+    parser.add_argument('--price-line-high', type=float)
+    parser.add_argument('--rsi-low', type=float)
+    parser.add_argument('--rsi-high', type=float)
+    parser.add_argument('--hysteresis', type=float, help='告警解除前需要回到阈值之外的宽度')
+    parser.add_argument('--cooldown', type=float, help='同一规则两次告警的最短间隔（秒）')
+    parser.add_argument('--interval', type=int, help='检查间隔（秒）')
+    parser.add_argument('--source', choices=('rest', 'stream'), help='数据源')
+    parser.add_argument('--base-url', help='REST地址，例如本地模拟交易所 http://127.0.0.1:8900')
+    parser.add_argument('--stream-url', help='推送地址，例如 ws://127.0.0.1:8900')
+    parser.add_argument('--cache', help='K线磁盘缓存文件（SQLite），下次启动直接载入')
+    parser.add_argument('--metrics-port', type=int, help='在本地端口提供Prometheus格式的 /metrics')
+    parser.add_argument('--market', choices=('spot', 'usdm'), help='市场：现货或U本位合约')
+    parser.add_argument('--screen', action='store_true', help='全市场筛选（忽略 --symbols）')
+    parser.add_argument('--top-k', type=int, help='全市场筛选保留的品种数')
+    parser.add_argument('--shards', type=int, help='把品种分给N个工作进程（多核）')
+    parser.add_argument('--status', action='store_true', help='数值变化时输出状态行')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = build_config(args)
+    except (OSError, ValueError) as e:
+        print(f"配置错误: {e}", file=sys.stderr)
+        return 2
+
+    output = ConsoleOutput(show_status=args.status)
+    if args.shards and args.shards > 1:
+        engine = ShardedMonitor(config, args.shards, on_log=output.on_log, on_status=output.on_status,
+                                on_alert=output.on_alert)
+    else:
+        engine = MonitorEngine(config, on_log=output.on_log, on_status=output.on_status,
+                               on_alert=output.on_alert, on_screen=output.on_screen)
+
+    stopped = threading.Event()
+    reload = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopped.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload.set())
+
+    try:
+        engine.start()
+    except ValueError as e:
+        print(f"配置错误: {e}", file=sys.stderr)
+        return 2
+    while not stopped.wait(0.5):
+        if reload.is_set():
+            reload.clear()
+            try:
+                engine.update_symbols(build_config(args).symbols)
+            except (OSError, ValueError) as e:
+                output.on_log(f"重新读取配置失败: {e}", color='yellow')
+    engine.stop()
+    engine.join(timeout=5)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
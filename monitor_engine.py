@@ -0,0 +1,982 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+监控引擎（不依赖Kivy）
+
+包含配置、币安API客户端、价格线/RSI计算器和监控主流程（REST轮询或WebSocket推送），
+日志、状态和告警都通过回调交给使用方：
+Kivy界面（main.py）和命令行（monitor_cli.py）都只是引擎的一个消费者，
+服务器上没有图形环境也可以直接运行。
+"""
+
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+import indicators
+from alert_rules import AlertRuleEngine, CompoundRuleEngine, compile_compound_rules, compile_rules
+from candle_buffer import CandleBufferStore
+from candle_cache import CandleCache, SQLITE_AVAILABLE
+from fetch_engine import BUSY_ERROR, CYCLE_TIMEOUT_ERROR, DEFERRED_ERROR, KlineFetchEngine
+from indicator_state import PairIndicatorState
+from kline_parser import EMPTY_KLINES_ERROR, KlineColumns, parse_klines, parse_klines_json
+from kline_stream import KlineStreamClient
+from metrics import MetricsRegistry, MetricsServer
+from rate_limiter import RATE_LIMITED_ERROR, WeightRateLimiter, endpoint_weight, is_rate_limited
+from resilience import CircuitBreaker, Deadline, RetryPolicy
+from scheduler import PollScheduler
+from screener import Screener
+
+# 各市场的默认REST地址和接口路径
+MARKETS = {
+    'spot': {
+        'base_url': 'https://api.binance.com',
+        'klines': '/api/v3/klines',
+        'exchange_info': '/api/v3/exchangeInfo',
+        'ticker_24hr': '/api/v3/ticker/24hr',
+    },
+    'usdm': {  # U本位合约
+        'base_url': 'https://fapi.binance.com',
+        'klines': '/fapi/v1/klines',
+        'exchange_info': '/fapi/v1/exchangeInfo',
+        'ticker_24hr': '/fapi/v1/ticker/24hr',
+    },
+}
+
+# stop 等待后台线程和进行中的请求结束的最长时间（秒），在界面线程调用时不能太长
+STOP_TIMEOUT = 5.0
+
+
+class MonitorConfig:
+    """监控配置"""
+    def __init__(self):
+        # 多合约和多周期支持
+        self.symbols = ['ETHUSDT']  # 默认监控ETHUSDT
+        self.timeframes = ['3m']     # 默认3分钟周期
+        self.limit = 100
+        self.incremental_limit = 10   # 增量拉取时每次请求的K线条数
+        self.max_klines_per_request = 1000  # 单次请求最多返回的K线条数
+
+        # 由1m K线本地聚合高周期（同一品种多个周期共用一次请求）
+        self.resample_enabled = True
+        self.resample_base_limit = 1600  # 1m基础缓冲区长度，可覆盖到15m×100根
+
+        # 价格线阈值
+        self.price_line_low = 23.0
+        self.price_line_high = 75.0
+
+        # RSI阈值
+        self.rsi_low = 23.0
+        self.rsi_high = 75.0
+
+        # 告警规则（见 alert_rules）：越过阈值进入告警状态，回到阈值之外 alert_hysteresis 才解除，
+        # 默认只在进入时通知一次，同一规则两次通知至少间隔 alert_cooldown 秒
+        self.alert_hysteresis = 5.0
+        self.alert_cooldown = 900
+        self.alert_edge_only = True
+        self.alert_rules = None  # 自定义规则列表（字典），None 表示由上面四个阈值生成
+        self.compound_rules = None  # 同一品种跨周期的组合规则列表（字典），例如 3m RSI 低位且 15m 价格线低位
+
+        # 监控间隔（秒）：K线中段的最短拉取间隔
+        self.check_interval = 15
+
+        # 按K线收盘调度（秒）
+        self.close_window = 30         # 收盘前这段时间内密集拉取
+        self.dense_interval = 5        # 密集拉取间隔
+        self.close_delay = 1           # 收盘后多久拉取完整K线
+        self.max_sparse_interval = 300 # K线中段的最长拉取间隔（例如1d）
+
+        # API请求配置
+        self.market = 'spot'           # 'spot' 现货，'usdm' U本位合约
+        self.base_url = None           # None 表示使用该市场的币安地址；可指向本地模拟交易所（devtools/mock_exchange.py）
+        self.max_retries = 3
+        self.retry_delay = 2           # 第一次重试前的等待（秒），之后每次翻倍
+        self.retry_max_delay = 8       # 单次重试等待的上限（秒）
+        self.request_timeout = 10
+
+        # 每轮拉取的时间预算（秒）：超时的品种推迟到下一轮，不拖慢其它品种
+        self.cycle_deadline = 10
+
+        # 按(品种, 周期)熔断：连续失败N次后暂停请求，冷却结束后放一个探测请求
+        self.breaker_failure_threshold = 3
+        self.breaker_cooldown = 30         # 首次熔断的冷却时间（秒），探测失败后翻倍
+        self.breaker_max_cooldown = 600
+
+        # 并发抓取配置
+        self.max_workers = 4               # 同时进行的K线请求数
+        self.request_weight_limit = 1200   # 每分钟可用的请求权重（币安上限的保守值）
+        self.default_retry_after = 60      # 429/418未带Retry-After时的封禁时长（秒）
+
+        # 数据源: 'rest' 定时轮询，'stream' WebSocket推送（REST仅用于回补）
+        self.data_source = 'rest'
+        self.stream_url = 'wss://stream.binance.com:9443'
+
+        # K线磁盘缓存（SQLite），None 表示不使用；启动时从缓存载入，只拉取缺失的尾部
+        self.cache_path = None
+        self.cache_max_rows = 2000  # 每个序列最多保留的K线数
+
+        # 全市场筛选：由交易所信息发现品种，用全市场24h行情预筛，只对候选拉取K线计算指标，
+        # 保留最极端的 screen_top_k 个（symbols 不再使用）
+        self.screen_enabled = False
+        self.screen_quote_asset = 'USDT'
+        self.screen_min_quote_volume = 1e6  # 24h成交额下限（计价资产）
+        self.screen_range_low = 30.0        # 现价在24h高低区间的位置(%)不高于该值，或
+        self.screen_range_high = 70.0       # 不低于该值的品种进入候选
+        self.screen_max_candidates = 60     # 每轮最多计算的候选品种数（按区间位置的极端程度取前N个）
+        self.screen_top_k = 20
+        self.universe_refresh = 3600        # 重新获取交易所信息的间隔（秒）
+
+        # 运行指标（各阶段耗时、请求计数、数据时效），metrics_port 不为None时在本地端口提供 /metrics
+        self.metrics_enabled = True
+        self.metrics_port = None
+
+    def update(self, values):
+        """用字典（例如配置文件内容）覆盖配置项
+
+        Raises:
+            ValueError: 包含未知的配置项
+        """
+        for name, value in values.items():
+            if not hasattr(self, name):
+                raise ValueError(f"未知的配置项: {name}")
+            setattr(self, name, value)
+        return self
+
+    def validate(self):
+        """检查配置是否可用
+
+        Raises:
+            ValueError: 配置不合法
+        """
+        if self.market not in MARKETS:
+            raise ValueError(f"未知的市场: {self.market}")
+        if not self.symbols and not self.screen_enabled:
+            raise ValueError("请至少选择一个监控品种")
+        if not self.timeframes:
+            raise ValueError("请至少选择一个K线周期")
+        if self.data_source not in ('rest', 'stream'):
+            raise ValueError(f"未知的数据源: {self.data_source}")
+        if self.check_interval <= 0:
+            raise ValueError("检查间隔必须大于0")
+        if self.cycle_deadline <= 0:
+            raise ValueError("每轮时间预算必须大于0")
+        if self.screen_enabled and self.data_source != 'rest':
+            raise ValueError("全市场筛选只支持REST轮询")
+        if self.screen_enabled and self.screen_top_k <= 0:
+            raise ValueError("筛选保留的品种数必须大于0")
+        if self.alert_hysteresis < 0:
+            raise ValueError("告警滞回宽度不能为负数")
+        compile_rules(self)
+        compile_compound_rules(self)
+
+
+class BinanceAPIClient:
+    """币安API客户端
+
+    Args:
+        metrics: 可选 MetricsRegistry，记录请求耗时、状态码、重试和限速
+    """
+
+    def __init__(self, config, metrics=None):
+        self.config = config
+        self.endpoints = MARKETS[config.market]
+        self.base_url = (config.base_url or self.endpoints['base_url']).rstrip('/')
+        self.session = self._create_session()
+        self.request_count = 0
+        self.failed_count = 0
+        self._stats_lock = threading.Lock()
+
+        # 多个抓取线程共享的权重令牌桶，由响应头校准
+        self.rate_limiter = WeightRateLimiter(self.config.request_weight_limit)
+        self.retry_policy = RetryPolicy(self.config.max_retries, self.config.retry_delay,
+                                        self.config.retry_max_delay)
+
+        metrics = metrics or MetricsRegistry(enabled=False)
+        self.request_seconds = metrics.histogram('http_request_seconds', 'REST请求耗时（秒）', ('endpoint',))
+        self.responses = metrics.counter('http_responses_total', 'REST响应数（按状态码，error为网络错误）',
+                                         ('endpoint', 'status'))
+        self.retries = metrics.counter('http_retries_total', 'REST重试次数')
+        self.rate_limited = metrics.counter('rate_limited_total', '收到429/418的次数', ('status',))
+        self.parse_seconds = metrics.histogram('stage_seconds', '各阶段耗时（秒）', ('stage',)).labels('parse')
+        weight_used = metrics.gauge('request_weight_used', '交易所报告的本分钟已用权重')
+        weight_remaining = metrics.gauge('request_weight_remaining', '本地估算的剩余权重')
+
+        def collect_weight():
+            status = self.rate_limiter.status()
+            weight_used.set(status['server_used_weight'] or 0)
+            weight_remaining.set(status['remaining'])
+        metrics.add_collector(collect_weight)
+
+    def _create_session(self):
+        """创建Session
+
+        重试只由 fetch_klines 按 RetryPolicy 进行（受本轮时间预算约束），
+        连接池不再挂载urllib3的重试，避免两层重试叠加。
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            max_retries=0,
+            pool_connections=1,
+            pool_maxsize=max(1, self.config.max_workers),
+            pool_block=True
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _wait_for_rate_limit(self, weight=1, deadline=None):
+        """申请请求权重（线程安全）
+
+        Returns:
+            False表示处于429/418封禁期或预算在超时内无法回补，本次请求应推迟
+        """
+        timeout = self.config.request_timeout
+        if deadline is not None:
+            timeout = deadline.timeout(timeout)
+        return self.rate_limiter.acquire(weight, timeout=timeout)
+
+    def rate_limit_status(self):
+        """剩余请求预算，供调度器调整节奏"""
+        return self.rate_limiter.status()
+
+    def fetch_klines(self, symbol, timeframe, start_time=None, limit=None, end_time=None,
+                     as_columns=False, deadline=None):
+        """获取K线数据
+
+        Args:
+            start_time: 可选，起始开盘时间（毫秒），用于增量拉取
+            limit: 可选，返回条数，默认 config.limit
+            end_time: 可选，截止开盘时间（毫秒），用于向前翻页
+            as_columns: 为True时直接从原始响应解析为 KlineColumns，跳过JSON解码
+            deadline: 可选 resilience.Deadline，请求超时和重试等待都不超过剩余预算
+        """
+        params = {
+            'symbol': symbol,
+            'interval': timeframe,
+            'limit': limit or self.config.limit
+        }
+        if start_time is not None:
+            params['startTime'] = int(start_time)
+        if end_time is not None:
+            params['endTime'] = int(end_time)
+
+        success, response, error = self._get(self.endpoints['klines'], params, deadline)
+        if not success:
+            return False, None, error
+        with self.parse_seconds.time():
+            data = parse_klines_json(response.content) if as_columns else response.json()
+        if data is not None and len(data) > 0:
+            return True, data, None
+        return False, None, EMPTY_KLINES_ERROR
+
+    def fetch_exchange_info(self, deadline=None):
+        """获取交易规则和全部交易对（JSON解码后的字典）"""
+        success, response, error = self._get(self.endpoints['exchange_info'], None, deadline)
+        if not success:
+            return False, None, error
+        return True, response.json(), None
+
+    def fetch_tickers(self, deadline=None):
+        """获取全部交易对的24h行情（一次请求，权重较高）"""
+        success, response, error = self._get(self.endpoints['ticker_24hr'], None, deadline)
+        if not success:
+            return False, None, error
+        return True, response.json(), None
+
+    def _get(self, path, params=None, deadline=None):
+        """发送GET请求：申请权重、记录限速、按 RetryPolicy 重试5xx和网络错误
+
+        Returns:
+            (success, response, error)，成功时 response 为状态码200的响应
+        """
+        url = f"{self.base_url}{path}"
+        deadline = deadline or Deadline()
+
+        attempt = 0
+        while True:
+            if deadline.expired():
+                error = CYCLE_TIMEOUT_ERROR
+                break
+            if not self._wait_for_rate_limit(endpoint_weight(path), deadline):
+                # 只推迟这一项请求，其它品种/周期照常处理
+                banned_for = self.rate_limiter.status()['banned_for']
+                return False, None, f"{RATE_LIMITED_ERROR}，已推迟（{banned_for:.0f}秒后恢复）"
+
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params,
+                                            timeout=deadline.timeout(self.config.request_timeout))
+            except Exception as e:
+                self.responses.labels(path, 'error').inc()
+                error = str(e)
+            else:
+                self.request_seconds.labels(path).observe(time.perf_counter() - started)
+                self.responses.labels(path, str(response.status_code)).inc()
+                with self._stats_lock:
+                    self.request_count += 1
+                self.rate_limiter.update_from_headers(response.headers)
+
+                if response.status_code == 200:
+                    return True, response, None
+                if response.status_code in (418, 429):
+                    # 超限(429)或被封禁(418)：记录封禁期，不在工作线程里睡眠等待
+                    retry_after = int(response.headers.get('Retry-After', self.config.default_retry_after))
+                    self.rate_limiter.record_rate_limited(retry_after)
+                    self.rate_limited.labels(str(response.status_code)).inc()
+                    with self._stats_lock:
+                        self.failed_count += 1
+                    return False, None, f"{RATE_LIMITED_ERROR}(HTTP {response.status_code})，{retry_after}秒后重试"
+
+                error = f"HTTP {response.status_code}"
+                if not self.retry_policy.retryable_status(response.status_code):
+                    break
+
+            attempt += 1
+            delay = self.retry_policy.next_delay(attempt, deadline)
+            if delay is None:
+                break
+            self.retries.inc()
+            time.sleep(delay)
+
+        with self._stats_lock:
+            self.failed_count += 1
+        return False, None, f"请求失败: {error}"
+
+    def close(self):
+        """关闭Session"""
+        try:
+            if hasattr(self, 'session') and self.session:
+                self.session.close()
+        except:
+            pass
+
+
+class PriceLineCalculator:
+    """价格线计算器"""
+
+    def __init__(self, api_client, config):
+        self.api_client = api_client
+        self.config = config
+        self.open_times = []
+        self.highs = []
+        self.lows = []
+        self.closes = []
+        self.hhv_period = indicators.HHV_PERIOD
+        self.sma_period = indicators.SMA_PERIOD
+        self.hhv_a_period = indicators.HHV_A_PERIOD
+
+    def fetch_kline_data(self, symbol, timeframe):
+        """从币安获取K线数据"""
+        success, data, error = self.api_client.fetch_klines(symbol, timeframe)
+        if not success:
+            return False, error
+
+        return self.load_kline_data(data)
+
+    def load_from_buffer(self, buffer):
+        """从K线缓冲区载入数据（缓冲区由增量拉取、推送或本地聚合维护）"""
+        self.highs, self.lows, self.closes = buffer.snapshot()
+        if len(self.closes) < self.hhv_period + self.sma_period + self.hhv_a_period:
+            return False, "数据不足"
+        return True, None
+
+    def load_kline_data(self, data):
+        """解析已获取的K线数据（供并发抓取引擎直接交付结果）
+
+        Args:
+            data: KlineColumns，或JSON解码后的K线数组
+        """
+        columns = data if isinstance(data, KlineColumns) else parse_klines(data)
+        self.open_times = columns.open_times
+        self.highs = columns.highs
+        self.lows = columns.lows
+        self.closes = columns.closes
+
+        if len(self.closes) < self.hhv_period + self.sma_period + self.hhv_a_period:
+            return False, "数据不足"
+
+        return True, None
+
+    def tdx_sma(self, data, period, weight=1):
+        """通达信SMA函数"""
+        return indicators.tdx_sma(data, period, weight).tolist()
+
+    def ema(self, data, period):
+        """标准EMA函数"""
+        return indicators.ema(data, period).tolist()
+
+    def calculate_price_line_series(self):
+        """计算完整的价格线序列（numpy数组），数据不足时返回None"""
+        if len(self.closes) < self.hhv_period:
+            return None
+        return indicators.price_line(self.highs, self.lows, self.closes,
+                                     self.hhv_period, self.sma_period, self.hhv_a_period)
+
+    def calculate_price_line(self):
+        """计算价格线指标"""
+        price_line_values = self.calculate_price_line_series()
+        if price_line_values is None or len(price_line_values) == 0:
+            return None
+        return float(price_line_values[-1])
+
+    def calculate_batch(self, highs, lows, closes, rsi_period=indicators.RSI_PERIOD):
+        """用本计算器的参数对多个品种的对齐K线一次性计算价格线和RSI
+
+        Args:
+            highs, lows, closes: (品种数, 长度) 数组
+
+        Returns:
+            indicators.BatchResult
+        """
+        return indicators.evaluate_batch(highs, lows, closes, self.hhv_period,
+                                         self.sma_period, self.hhv_a_period, rsi_period)
+
+
+class RSICalculator:
+    """RSI计算器"""
+
+    @staticmethod
+    def calculate_rsi(prices, period=indicators.RSI_PERIOD):
+        """使用Wilder's平滑法计算RSI"""
+        if len(prices) < period + 1:
+            return None
+        return float(indicators.wilder_rsi(prices, period)[-1])
+
+    @staticmethod
+    def calculate_rsi_batch(prices, period=indicators.RSI_PERIOD):
+        """对 (品种数, 长度) 的收盘价数组逐行计算RSI序列"""
+        return indicators.wilder_rsi(np.atleast_2d(prices), period)
+
+
+class MonitorEngine:
+    """监控引擎
+
+    Args:
+        config: MonitorConfig
+        on_log: 日志回调 on_log(text, color=None)，color 为 None/'red'/'green'/'yellow'
+        on_status: 状态回调 on_status(symbol, timeframe, price, price_line, rsi, alert)，
+                   每次计算后调用，alert 为简短告警状态（无告警时为空字符串）
+        on_alert: 告警回调 on_alert(symbol, timeframe, alerts, price, speech_msg)，用于通知和语音播报
+        api_client: 可选，替代 BinanceAPIClient 的数据源（例如 replay.ReplayAPIClient），
+                    需要提供 fetch_klines / rate_limit_status / close
+        on_screen: 全市场筛选的回调 on_screen(report)，每轮筛选后调用，report 为 screener.ScreenReport
+        clock: 告警冷却使用的时钟（秒），回测时为模拟时间
+
+    回调都在后台线程里调用，使用方需要自行切换到界面线程。
+    """
+
+    def __init__(self, config, on_log=None, on_status=None, on_alert=None, api_client=None, on_screen=None,
+                 clock=time.time):
+        self.config = config
+        self.on_log = on_log or (lambda text, color=None: None)
+        self.on_status = on_status
+        self.on_alert = on_alert
+        self.on_screen = on_screen
+        self.data_source = api_client
+        self.clock = clock
+
+        self.api_client = None
+        self.fetch_engine = None
+        self.buffer_store = None
+        self.candle_cache = None
+        self.scheduler = None
+        self.screener = None
+        self.screen_wakeup = threading.Event()
+        self.sources = {}  # REST轮询的数据源 {(symbol, source_timeframe): [timeframe, ...]}
+        self.breaker = None
+        self.stream_client = None
+        self.monitor_thread = None
+        self.calculators = {}  # 每个(品种, 周期)复用一个计算器
+        self.indicator_states = {}  # 推送模式下每个(品种, 周期)的增量指标状态
+        self.rule_engine = None  # 每个(品种, 周期)的告警规则状态
+        self.compound_engine = None  # 每个品种的组合规则状态和各序列的最新指标
+        self.stop_monitoring = True
+
+        self.metrics = MetricsRegistry(enabled=config.metrics_enabled)
+        self.metrics_server = None
+        self.last_update = {}  # (symbol, timeframe) -> 最近一次成功更新的时间戳
+        self._init_metrics()
+
+    def _init_metrics(self):
+        metrics = self.metrics
+        stage_seconds = metrics.histogram('stage_seconds', '各阶段耗时（秒）', ('stage',))
+        self.fetch_seconds = stage_seconds.labels('fetch')
+        self.indicator_seconds = stage_seconds.labels('indicators')
+        self.alert_seconds = stage_seconds.labels('alerts')
+        self.dispatch_seconds = stage_seconds.labels('dispatch')
+        self.cycle_seconds = metrics.histogram(
+            'cycle_seconds', '每轮拉取和计算的耗时（秒）',
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+        self.alerts_fired = metrics.counter('alerts_fired_total', '发出的告警通知次数', ('rule',))
+        self.compound_evaluations = metrics.counter('compound_evaluations_total', '组合规则的重新计算次数')
+        self.alerts_suppressed = metrics.counter('alerts_suppressed_total',
+                                                 '处于告警状态、因只在进入时通知或冷却而未发出的次数')
+        self.pair_errors = metrics.counter('pair_errors_total', '拉取失败次数', ('symbol', 'timeframe'))
+        staleness = metrics.gauge('pair_staleness_seconds', '距最近一次成功更新的秒数', ('symbol', 'timeframe'))
+        breaker_open = metrics.gauge('breaker_open_pairs', '熔断中的数据源数')
+
+        def collect():
+            now = time.time()
+            for (symbol, timeframe), updated in list(self.last_update.items()):
+                staleness.labels(symbol, timeframe).set(round(now - updated, 3))
+            breaker_open.set(len(self.breaker.open_keys()) if self.breaker else 0)
+        metrics.add_collector(collect)
+
+    @property
+    def is_running(self):
+        return not self.stop_monitoring
+
+    def pairs(self):
+        """所有 (品种, 周期) 组合"""
+        return [(symbol, timeframe)
+                for symbol in self.config.symbols
+                for timeframe in self.config.timeframes]
+
+    def start(self):
+        """启动监控（立即返回，监控在后台线程运行）"""
+        config = self.config
+        config.validate()
+        self.stop_monitoring = False
+
+        self.on_log("正在启动监控...")
+        if config.screen_enabled:
+            self.on_log(f"全市场筛选: {config.market} {config.screen_quote_asset}，保留前{config.screen_top_k}个")
+        else:
+            self.on_log(f"监控品种: {', '.join(config.symbols)}")
+        self.on_log(f"K线周期: {', '.join(config.timeframes)}")
+        self.on_log(f"数据源: {'WebSocket推送' if config.data_source == 'stream' else 'REST轮询'}")
+        self.on_log(f"监控条件:")
+        for rule in compile_rules(config):
+            self.on_log(f"  {rule.summary()}")
+        for rule in compile_compound_rules(config):
+            self.on_log(f"  {rule.summary()}")
+        self.on_log(f"  检查间隔: {config.check_interval}秒")
+
+        self.setup()
+        self._start_metrics_server()
+
+        if config.screen_enabled:
+            self.screener = Screener(self.api_client, self.buffer_store, self.fetch_engine, config,
+                                     fetch_func=self.timed_refresh, allow=self.breaker.allow,
+                                     on_result=self.record_result)
+            self.screen_wakeup.clear()
+            self.monitor_thread = threading.Thread(target=self.screen_loop, daemon=True)
+            self.monitor_thread.start()
+            return
+
+        if config.data_source == 'stream':
+            # 推送模式：每次K线更新触发一次指标计算
+            self.show_cached(dict((pair, [pair[1]]) for pair in self.pairs()))
+            self._start_stream()
+            return
+
+        # 启动监控线程，按K线收盘时间调度每个序列的拉取
+        self.scheduler = PollScheduler(config)
+        self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
+        self.monitor_thread.start()
+
+    def _start_stream(self):
+        self.stream_client = KlineStreamClient(
+            self.buffer_store, self.config, self.pairs(),
+            on_update=self.on_stream_update,
+            on_log=self.on_log,
+            fetch_engine=self.fetch_engine
+        )
+        self.stream_client.start()
+
+    def update_symbols(self, symbols):
+        """运行中更换监控品种
+
+        仍在监控的品种保留缓冲区和调度时间，新品种下一轮立即拉取（推送模式重新订阅），
+        移除的品种不再产生状态，也不再计入数据时效。
+        """
+        removed = set(self.config.symbols) - set(symbols)
+        self.config.symbols = list(symbols)
+        for table in (self.calculators, self.indicator_states, self.last_update):
+            for key in [key for key in table if key[0] in removed]:
+                table.pop(key, None)
+        if self.rule_engine:
+            self.rule_engine.discard([key for key in self.rule_engine.keys() if key[0] in removed])
+            self.compound_engine.discard(removed)
+        if self.stop_monitoring:
+            return
+
+        if self.config.data_source == 'stream':
+            # 品种清空时推送已停止，之后再加入品种要重新订阅
+            if self.stream_client:
+                self.stream_client.stop()
+                self.stream_client = None
+            if self.config.symbols:
+                self._start_stream()
+        elif self.scheduler:
+            # 品种为空时调度器等待 set_series 唤醒，之后加入的品种立即到期
+            self.sources = self.buffer_store.plan(self.pairs())
+            self.scheduler.set_series(list(self.sources))
+
+    def setup(self):
+        """创建API客户端、K线缓冲区和并发抓取引擎（start 会调用；回测时直接调用后逐轮 run_cycle）"""
+        config = self.config
+        self.stop_monitoring = False
+        self.api_client = self.data_source or BinanceAPIClient(config, metrics=self.metrics)
+        self.candle_cache = self._open_cache()
+        self.buffer_store = CandleBufferStore(self.api_client, config, cache=self.candle_cache,
+                                              on_log=self.on_log)
+        self.calculators = {}
+        self.indicator_states = {}
+        self.rule_engine = AlertRuleEngine(compile_rules(config))
+        self.compound_engine = CompoundRuleEngine(compile_compound_rules(config))
+        self.fetch_engine = KlineFetchEngine(self.api_client, config.max_workers)
+        self.breaker = CircuitBreaker(config.breaker_failure_threshold, config.breaker_cooldown,
+                                      config.breaker_max_cooldown)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """停止监控，正在进行的等待立即返回
+
+        先通知所有后台线程停止、取消排队中的请求，再最多等 timeout 秒让监控线程、
+        推送线程和进行中的请求结束，最后保存K线缓冲区并关闭磁盘缓存。
+        超时仍未结束的线程之后的保存会被忽略（CandleBufferStore.close）。
+        """
+        if self.stop_monitoring:
+            return
+        self.stop_monitoring = True
+        self.on_log("监控已停止")
+
+        if self.scheduler:
+            self.scheduler.stop()
+            self.scheduler = None
+        self.screen_wakeup.set()
+
+        stream_client = self.stream_client
+        if stream_client:
+            stream_client.stop()
+            self.stream_client = None
+
+        if self.fetch_engine:
+            self.fetch_engine.shutdown()
+
+        deadline = Deadline(timeout)
+        if self.monitor_thread and self.monitor_thread is not threading.current_thread():
+            self.monitor_thread.join(deadline.remaining())
+        if stream_client:
+            stream_client.join(deadline.remaining())
+        if self.fetch_engine:
+            self.fetch_engine.wait_idle(deadline.remaining())
+
+        if self.api_client:
+            self.api_client.close()
+
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+        if self.candle_cache:
+            self.buffer_store.close()
+            self.candle_cache = None
+
+    def _start_metrics_server(self):
+        """在本地端口提供 Prometheus 格式的 /metrics，端口被占用时只记录日志"""
+        port = self.config.metrics_port
+        if port is None or not self.metrics.enabled:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.metrics, port).start()
+            self.on_log(f"运行指标: http://127.0.0.1:{self.metrics_server.server_address[1]}/metrics")
+        except OSError as e:
+            self.on_log(f"运行指标端口不可用: {e}", color='yellow')
+
+    def _open_cache(self):
+        """打开K线磁盘缓存，失败时不使用缓存继续运行"""
+        if not self.config.cache_path or not SQLITE_AVAILABLE:
+            return None
+        try:
+            return CandleCache(self.config.cache_path, self.config.cache_max_rows)
+        except Exception as e:
+            self.on_log(f"K线缓存不可用: {e}", color='yellow')
+            return None
+
+    def show_cached(self, sources):
+        """用磁盘缓存里的K线先算一遍指标，只更新状态不告警（数据可能已过时）"""
+        if self.candle_cache is None:
+            return
+        rows = []
+        for symbol, source_timeframe in sources:
+            for timeframe in sources[(symbol, source_timeframe)]:
+                calc = self.get_calculator(symbol, timeframe)
+                try:
+                    success, _ = calc.load_from_buffer(self.buffer_store.get_series(symbol, timeframe))
+                    if success:
+                        row = self.evaluate_pair(symbol, timeframe, calc)
+                        if row:
+                            rows.append(row)
+                except Exception as e:
+                    self.on_log(f"[{symbol}/{timeframe}] 异常: {str(e)}", color='yellow')
+        self.check_alerts(rows, notify=False)
+
+    def join(self, timeout=None):
+        """等待监控线程退出"""
+        if self.monitor_thread:
+            self.monitor_thread.join(timeout)
+
+    def monitor_loop(self):
+        """监控循环（在后台线程运行）"""
+        # 能由1m聚合的周期共用一次请求，其余周期单独请求
+        self.sources = self.buffer_store.plan(self.pairs())
+        self.show_cached(self.sources)
+        scheduler = self.scheduler
+        scheduler.set_series(list(self.sources))
+
+        while scheduler.wait() and not self.stop_monitoring:
+            # 被限速期间不发请求，等封禁结束
+            banned_for = self.api_client.rate_limit_status()['banned_for']
+            if banned_for > 0:
+                scheduler.defer(banned_for)
+                continue
+
+            # update_symbols 可能在另一个线程替换了数据源
+            sources = self.sources
+            self.run_cycle(sources, [key for key in scheduler.pop_due() if key in sources])
+
+    def run_cycle(self, sources, due):
+        """拉取一批数据源并计算它们对应的所有周期
+
+        Args:
+            sources: buffer_store.plan 的返回 {(symbol, source_timeframe): [timeframe, ...]}
+            due: 本次要拉取的 [(symbol, source_timeframe), ...]
+        """
+        # 熔断中的数据源跳过，冷却结束后放行一个探测请求
+        breaker = self.breaker
+        due = [key for key in due if breaker.allow(key)]
+
+        # 并发增量拉取，按完成顺序逐个计算指标，全部完成后一次检查告警规则；
+        # 超出本轮预算的数据源推迟到下一轮
+        cycle_started = time.perf_counter()
+        rows = []
+        results = self.fetch_engine.fetch_all(due, should_stop=lambda: self.stop_monitoring,
+                                              fetch_func=self.timed_refresh,
+                                              deadline=Deadline(self.config.cycle_deadline))
+
+        for symbol, source_timeframe, success, _, error in results:
+            self.record_result((symbol, source_timeframe), success, error)
+            for timeframe in sources[(symbol, source_timeframe)]:
+                if self.stop_monitoring:
+                    break
+
+                try:
+                    if not success:
+                        self.on_log(f"[{symbol}/{timeframe}] 错误: {error}", color='yellow')
+                        continue
+
+                    calc = self.get_calculator(symbol, timeframe)
+                    success_load, error = calc.load_from_buffer(
+                        self.buffer_store.get_series(symbol, timeframe))
+                    if not success_load:
+                        self.on_log(f"[{symbol}/{timeframe}] 错误: {error}", color='yellow')
+                        continue
+
+                    row = self.evaluate_pair(symbol, timeframe, calc)
+                    if row:
+                        rows.append(row)
+
+                except Exception as e:
+                    self.on_log(f"[{symbol}/{timeframe}] 异常: {str(e)}", color='yellow')
+
+            if self.stop_monitoring:
+                break
+        if not self.stop_monitoring:
+            self.check_alerts(rows)
+        self.cycle_seconds.observe(time.perf_counter() - cycle_started)
+
+    def timed_refresh(self, symbol, timeframe, deadline=None):
+        """buffer_store.refresh，并记录拉取耗时"""
+        with self.fetch_seconds.time():
+            return self.buffer_store.refresh(symbol, timeframe, deadline=deadline)
+
+    def record_result(self, key, success, error):
+        """更新熔断状态和数据时效，状态变化时记录日志"""
+        symbol, timeframe = key
+        if success:
+            self.last_update[key] = time.time()
+            if self.breaker.record_success(key):
+                self.on_log(f"[{symbol}/{timeframe}] 已恢复，重新开始拉取", color='green')
+            return
+
+        self.pair_errors.labels(symbol, timeframe).inc()
+        # 推迟和全局限速与这个品种本身无关，不计入熔断
+        if error in (DEFERRED_ERROR, BUSY_ERROR) or is_rate_limited(error):
+            return
+        if self.breaker.record_failure(key):
+            self.on_log(f"[{symbol}/{timeframe}] 连续失败，暂停拉取"
+                        f"{self.breaker.cooldown_for(key):.0f}秒", color='yellow')
+
+    def screen_loop(self):
+        """全市场筛选循环（在后台线程运行），每 check_interval 秒一轮"""
+        while not self.stop_monitoring:
+            started = time.monotonic()
+            banned_for = self.api_client.rate_limit_status()['banned_for']
+            if banned_for > 0:
+                self.screen_wakeup.wait(banned_for)
+                continue
+            self.run_screen()
+            self.screen_wakeup.wait(max(0.0, self.config.check_interval - (time.monotonic() - started)))
+
+    def run_screen(self):
+        """执行一轮全市场筛选，对排名中的品种检查告警"""
+        started = time.perf_counter()
+        report = self.screener.sweep(Deadline(self.config.cycle_deadline),
+                                     should_stop=lambda: self.stop_monitoring)
+        self.cycle_seconds.observe(time.perf_counter() - started)
+        if self.stop_monitoring:
+            return report
+
+        for symbol, timeframe, error in report.errors:
+            if symbol is None:
+                self.on_log(f"[筛选] 错误: {error}", color='yellow')
+            else:
+                self.on_log(f"[{symbol}/{timeframe}] 错误: {error}", color='yellow')
+
+        # 退出排名的序列不再计算，解除它们的告警状态，下次进入排名时才能重新通知
+        top = {(row.symbol, row.timeframe) for row in report.top}
+        self.rule_engine.deactivate([key for key in self.rule_engine.keys() if key not in top])
+        self.compound_engine.deactivate([key for key in self.compound_engine.keys() if key not in top])
+        self.check_alerts([(row.symbol, row.timeframe, row.price, row.price_line, row.rsi)
+                           for row in report.top])
+        if self.on_screen:
+            self.on_screen(report)
+        return report
+
+    def get_calculator(self, symbol, timeframe):
+        """获取某个品种/周期复用的计算器"""
+        key = (symbol, timeframe)
+        calc = self.calculators.get(key)
+        if calc is None:
+            calc = PriceLineCalculator(self.api_client, self.config)
+            self.calculators[key] = calc
+        return calc
+
+    def on_stream_update(self, symbol, timeframe, buffer, is_closed, candle=None):
+        """推送模式下K线缓冲区更新的回调（在推送线程运行）
+
+        Args:
+            candle: 推送的K线 (open_time, high, low, close)；为None表示REST回补，需要重建状态
+        """
+        if self.stop_monitoring:
+            return
+
+        try:
+            key = (symbol, timeframe)
+            state = self.indicator_states.get(key)
+            if state is None:
+                calc = self.get_calculator(symbol, timeframe)
+                state = PairIndicatorState(calc.hhv_period, calc.sma_period, calc.hhv_a_period,
+                                           indicators.RSI_PERIOD)
+                self.indicator_states[key] = state
+
+            with self.indicator_seconds.time():
+                if candle is None:
+                    columns = buffer.columns()
+                    state.seed(columns.open_times, columns.highs, columns.lows, columns.closes)
+                else:
+                    # 每次推送只做O(1)的增量更新
+                    state.update(*candle, closed=is_closed)
+            self.last_update[key] = time.time()
+
+            if state.price_line is None or state.rsi is None:
+                return
+
+            if is_closed and candle is not None:
+                # 每根K线收盘时写一次磁盘缓存
+                self.buffer_store.save(symbol, timeframe)
+
+            self.check_alerts([(symbol, timeframe, state.close, state.price_line, state.rsi)])
+        except Exception as e:
+            self.on_log(f"[{symbol}/{timeframe}] 异常: {str(e)}", color='yellow')
+
+    def evaluate_pair(self, symbol, timeframe, calc):
+        """计算单个品种/周期的指标
+
+        Returns:
+            (symbol, timeframe, price, price_line, rsi)，计算失败时为None
+        """
+        with self.indicator_seconds.time():
+            # 计算价格线
+            price_line = calc.calculate_price_line()
+            # 计算RSI
+            current_rsi = RSICalculator.calculate_rsi(calc.closes)
+
+        if price_line is None:
+            self.on_log(f"[{symbol}/{timeframe}] 警告: 计算价格线失败", color='yellow')
+            return None
+        if current_rsi is None:
+            self.on_log(f"[{symbol}/{timeframe}] 警告: 计算RSI失败", color='yellow')
+            return None
+
+        return symbol, timeframe, float(calc.closes[-1]), price_line, current_rsi
+
+    def check_alerts(self, rows, notify=True):
+        """按告警规则检查一批最新指标并输出
+
+        规则状态（滞回、冷却、只在进入时通知）见 alert_rules，一批里的所有序列一次计算；
+        组合规则用每个序列缓存的最新指标，只重新计算输入有变化的。
+        状态总是通过 on_status 交出（由使用方决定如何显示），alert 为处于告警状态的规则，
+        日志和通知只在规则触发时输出。
+
+        Args:
+            rows: [(symbol, timeframe, price, price_line, rsi), ...]
+            notify: False时只更新状态，不输出告警，也不改变规则状态
+        """
+        if not rows:
+            return
+        started = time.perf_counter()
+        rules = self.rule_engine.rules
+        keys = [(row[0], row[1]) for row in rows]
+        values = np.array([(row[3], row[4]) for row in rows], dtype=np.float64)
+        active, fired = self.rule_engine.evaluate(keys, values, self.clock(), commit=notify)
+        compound_fired = []
+        if notify:
+            self.alerts_suppressed.inc(int(np.count_nonzero(active & ~fired)))
+            evaluations = self.compound_engine.evaluations
+            compound_fired = self.compound_engine.update(rows, self.clock())
+            self.compound_evaluations.inc(self.compound_engine.evaluations - evaluations)
+        self.alert_seconds.observe(time.perf_counter() - started)
+
+        # 交给使用方（界面/终端）的耗时单独统计
+        with self.dispatch_seconds.time():
+            for index, (symbol, timeframe, current_price, price_line, current_rsi) in enumerate(rows):
+                if self.on_status:
+                    flags = [rules[rule].flag for rule in np.flatnonzero(active[index])]
+                    self.on_status(symbol, timeframe, current_price, price_line, current_rsi, "、".join(flags))
+                if not fired[index].any():
+                    continue
+
+                alerts = []
+                speech_parts = []  # 用于语音播报的部分
+                for rule in np.flatnonzero(fired[index]):
+                    rule = rules[rule]
+                    value = price_line if rule.indicator == 'price_line' else current_rsi
+                    alert_msg, speech = rule.describe(value)
+                    alerts.append(alert_msg)
+                    speech_parts.append(speech)
+                    self.alerts_fired.labels(rule.name).inc()
+                self._dispatch_alert(symbol, timeframe, alerts, speech_parts, current_price)
+
+            for symbol, rule, inputs, current_price in compound_fired:
+                alerts, speech = rule.describe(inputs)
+                self.alerts_fired.labels(rule.name).inc()
+                self._dispatch_alert(symbol, "+".join(rule.timeframes()), alerts, [speech], current_price)
+
+    def _dispatch_alert(self, symbol, timeframe, alerts, speech_parts, current_price):
+        """输出告警日志、通知和语音播报"""
+        self.on_log("=" * 50, color='red')
+        self.on_log(f"!!! [{symbol}/{timeframe}] 预警触发 !!!", color='red')
+        for alert in alerts:
+            self.on_log(f">> {alert}", color='red')
+        self.on_log(f">> 当前价格: {current_price:.2f}", color='red')
+        self.on_log("=" * 50, color='red')
+
+        # 发送通知和语音播报
+        if self.on_alert:
+            speech_msg = f"{symbol} {timeframe}周期，" + "、".join(speech_parts)
+            self.on_alert(symbol, timeframe, alerts, current_price, speech_msg)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+阈值参数扫描
+
+在本地历史K线上扫描 价格线/RSI 的指标参数（hhv_period、sma_period、hhv_a_period、RSI周期）
+和阈值（price_line_low/high、rsi_low/high）的网格，统计每组配置会触发多少次告警，
+以及告警之后 horizon 根K线的收益：低位告警按做多计，高位告警按做空计。
+
+告警与实盘（alert_rules 的默认四条规则）一致：每条规则有滞回，默认只在进入告警状态时通知，
+同一规则两次通知至少间隔冷却时间（按K线开盘时间计）；同一根K线上任一规则通知算一次告警。
+
+  - 同一组指标参数（一个“参数族”）的价格线和RSI序列只算一次，所有阈值组合共用
+  - 阈值组合按块分给进程池，每个进程缓存自己算过的参数族；
+    同一块内的阈值组合一次性向量化比较
+  - 指标在整段历史上计算；实盘只用最近 limit 根，
+    但SMA/RSI的平滑记忆在100根之后已小于1e-6，两者的结果可以视为一致
+
+用法:
+    python optimizer.py --data klines/ --symbols ETHUSDT BTCUSDT --timeframes 3m 15m \\
+        --price-line-low 10 15 20 23 --rsi-low 15 20 23 --objective mean_return
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import indicators
+from replay import add_resampled, load_directory
+
+# 可用的排序目标
+OBJECTIVES = ('mean_return', 'win_rate', 't_stat', 'alerts')
+
+RESULT_FIELDS = ('hhv_period', 'sma_period', 'hhv_a_period', 'rsi_period',
+                 'price_line_low', 'price_line_high', 'rsi_low', 'rsi_high',
+                 'alerts', 'alert_rate', 'mean_return', 'win_rate', 't_stat')
+
+# 进程内的数据、告警规则参数和参数族缓存（由进程池的 initializer 设置）
+_worker_series = None
+_worker_horizon = None
+_worker_alerts = {}
+_family_cache = {}
+
+
+def family_series(series, family, horizon):
+    """计算一个参数族在所有序列上的对齐指标
+
+    Returns:
+        [(price_line, rsi, forward_return, times), ...]，四者等长；
+        forward_return 为 horizon 根K线后的收益，最后 horizon 根为nan，times 为开盘时间（秒）
+    """
+    hhv_period, sma_period, hhv_a_period, rsi_period = family
+    start = max(hhv_period - 1, rsi_period)
+    result = []
+    for columns in series:
+        closes = columns.closes
+        if len(closes) <= start + horizon:
+            continue
+        price_line = indicators.price_line(columns.highs, columns.lows, closes,
+                                           hhv_period, sma_period, hhv_a_period)
+        rsi = indicators.wilder_rsi(closes, rsi_period)
+        # price_line[i] 对应 closes[i + hhv_period - 1]，rsi[i] 对应 closes[i + rsi_period]
+        price_line = price_line[start - (hhv_period - 1):]
+        rsi = rsi[start - rsi_period:]
+        forward = np.full(len(closes) - start, np.nan)
+        forward[:-horizon] = closes[start + horizon:] / closes[start:-horizon] - 1
+        times = columns.open_times[start:] / 1000.0
+        result.append((price_line, rsi, forward, times))
+    return result
+
+
+def rule_fired(values, threshold, below, hysteresis, cooldown, times, edge_only=True):
+    """一条阈值规则在每根K线上是否通知（与 alert_rules.AlertRuleEngine 逐根计算的结果相同）
+
+    Args:
+        values: (T,) 指标序列
+        threshold: (K, 1) 各阈值组合的触发阈值
+        below: True 为 '<=' 规则，退出阈值为 threshold + hysteresis；False 为 '>=' 规则
+        cooldown: 两次通知的最短间隔（秒）
+        times: (T,) 开盘时间（秒）
+
+    Returns:
+        (K, T) 布尔数组
+    """
+    exit = threshold + hysteresis if below else threshold - hysteresis
+    with np.errstate(invalid='ignore'):
+        entered = values <= threshold if below else values >= threshold
+        released = values > exit if below else values < exit
+    # 滞回：处于告警状态 <=> 最近一次越过触发阈值晚于最近一次越过退出阈值（nan两者都不算，保持状态）
+    index = np.arange(values.shape[-1], dtype=np.int32)
+    last_entered = np.maximum.accumulate(np.where(entered, index, -1), axis=-1)
+    last_released = np.maximum.accumulate(np.where(released, index, -1), axis=-1)
+    active = last_entered > last_released
+    if edge_only:
+        triggered = active.copy()
+        triggered[:, 1:] &= ~active[:, :-1]
+    else:
+        triggered = active
+    if cooldown <= 0:
+        return triggered
+
+    # 冷却：每次通知后跳到冷却结束后的第一个候选，循环次数等于通知次数
+    fired = np.zeros_like(triggered)
+    for row, candidates in enumerate(triggered):
+        candidates = np.flatnonzero(candidates)
+        candidate_times = times[candidates]
+        position = 0
+        while position < len(candidates):
+            fired[row, candidates[position]] = True
+            position = int(np.searchsorted(candidate_times, candidate_times[position] + cooldown))
+    return fired
+
+
+def evaluate_thresholds(aligned, thresholds, hysteresis=0.0, cooldown=0.0, edge_only=True):
+    """对一个参数族的一批阈值组合统计告警和前瞻收益
+
+    Args:
+        aligned: family_series 的返回
+        thresholds: (K, 4) 数组，每行 (price_line_low, price_line_high, rsi_low, rsi_high)
+        hysteresis, cooldown, edge_only: 同 MonitorConfig 的 alert_hysteresis / alert_cooldown / alert_edge_only
+
+    Returns:
+        (K, 6) 数组：告警数、K线数、计入收益的告警数、收益和、收益平方和、盈利次数
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    pl_low, pl_high, rsi_low, rsi_high = (thresholds[:, i:i + 1] for i in range(4))
+    totals = np.zeros((len(thresholds), 6))
+    for price_line, rsi, forward, times in aligned:
+        def fired(values, threshold, below):
+            return rule_fired(values, threshold, below, hysteresis, cooldown, times, edge_only)
+
+        low = fired(price_line, pl_low, True) | fired(rsi, rsi_low, True)
+        high = fired(price_line, pl_high, False) | fired(rsi, rsi_high, False)
+        # 低位按做多、高位按做空计算收益；两边同时通知时方向不明，不计收益
+        direction = low.astype(np.int8) - high.astype(np.int8)
+        has_return = ~np.isnan(forward)
+        counted = (direction != 0) & has_return
+        signed = np.where(counted, np.where(has_return, forward, 0.0) * direction, 0.0)
+        totals[:, 0] += (low | high).sum(axis=1)
+        totals[:, 1] += len(forward)
+        totals[:, 2] += counted.sum(axis=1)
+        totals[:, 3] += signed.sum(axis=1)
+        totals[:, 4] += (signed ** 2).sum(axis=1)
+        totals[:, 5] += (signed > 0).sum(axis=1)
+    return totals
+
+
+def summarize(totals):
+    """把累计量换算为 告警数、告警率、平均收益、胜率、t值"""
+    alerts, candles, counted, total, square, wins = totals.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counted > 0, total / counted, np.nan)
+        variance = np.where(counted > 1, (square - counted * mean ** 2) / (counted - 1), np.nan)
+        t_stat = mean / np.sqrt(variance / counted)
+        return np.column_stack((
+            alerts,
+            np.where(candles > 0, alerts / candles, np.nan),
+            mean,
+            np.where(counted > 0, wins / counted, np.nan),
+            t_stat,
+        ))
+
+
+def _init_worker(series, horizon, alerts=None):
+    global _worker_series, _worker_horizon, _worker_alerts
+    _worker_series = series
+    _worker_horizon = horizon
+    _worker_alerts = alerts or {}
+    _family_cache.clear()
+
+
+def _run_task(family, thresholds):
+    """进程池任务：一个参数族的一块阈值组合"""
+    aligned = _family_cache.get(family)
+    if aligned is None:
+        # 每个进程只保留最近一个参数族，任务按参数族顺序提交，命中率很高
+        _family_cache.clear()
+        aligned = _family_cache[family] = family_series(_worker_series, family, _worker_horizon)
+    return family, thresholds, evaluate_thresholds(aligned, thresholds, **_worker_alerts)
+
+
+def threshold_grid(price_line_lows, price_line_highs, rsi_lows, rsi_highs):
+    """阈值组合网格（只保留 low < high 的组合）"""
+    return [combo for combo in itertools.product(price_line_lows, price_line_highs, rsi_lows, rsi_highs)
+            if combo[0] < combo[1] and combo[2] < combo[3]]
+
+
+def optimize(series, families, thresholds, horizon=10, workers=None, chunk_size=256, alerts=None):
+    """扫描所有参数族 × 阈值组合
+
+    Args:
+        series: [KlineColumns, ...]
+        families: [(hhv_period, sma_period, hhv_a_period, rsi_period), ...]
+        thresholds: [(price_line_low, price_line_high, rsi_low, rsi_high), ...]
+        workers: 进程数，默认CPU核数；为1时在当前进程计算
+        alerts: 可选 {'hysteresis', 'cooldown', 'edge_only'}，传给 evaluate_thresholds
+
+    Returns:
+        (N, len(RESULT_FIELDS)) 结果数组
+    """
+    chunks = [thresholds[i:i + chunk_size] for i in range(0, len(thresholds), chunk_size)]
+    tasks = [(family, chunk) for family in families for chunk in chunks]
+    rows = []
+
+    def collect(family, chunk, totals):
+        rows.append(np.column_stack((np.tile(family, (len(chunk), 1)), chunk, summarize(totals))))
+
+    if workers == 1:
+        _init_worker(series, horizon, alerts)
+        for family, chunk in tasks:
+            collect(*_run_task(family, chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(series, horizon, alerts)) as executor:
+            for result in executor.map(_run_task, *zip(*tasks)):
+                collect(*result)
+
+    if not rows:
+        return np.empty((0, len(RESULT_FIELDS)))
+    return np.vstack(rows)
+
+
+def sort_results(results, objective, ascending=False):
+    """按目标排序，nan排在最后"""
+    values = results[:, RESULT_FIELDS.index(objective)]
+    keys = np.where(np.isnan(values), np.inf, values if ascending else -values)
+    return results[np.argsort(keys, kind='stable')]
+
+
+def format_table(results, top):
+    """紧凑的结果表"""
+    lines = ["  HHV SMA  HA RSI |  线低  线高 RSI低 RSI高 |   告警  告警率  平均收益   胜率    t值"]
+    for row in results[:top]:
+        (hhv, sma, hha, rsi_p, pl_low, pl_high, rsi_low, rsi_high,
+         alerts, rate, mean, win, t_stat) = row
+        lines.append(f"  {hhv:3.0f} {sma:3.0f} {hha:3.0f} {rsi_p:3.0f} | "
+                     f"{pl_low:5.1f} {pl_high:5.1f} {rsi_low:5.1f} {rsi_high:5.1f} | "
+                     f"{alerts:6.0f} {rate * 100:6.2f}% {mean * 100:+8.3f}% {win * 100:5.1f}% {t_stat:6.2f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='价格线/RSI阈值参数扫描')
+    parser.add_argument('--data', required=True, help='K线文件目录')
+    parser.add_argument('--symbols', nargs='+', required=True)
+    parser.add_argument('--timeframes', nargs='+', required=True)
+    parser.add_argument('--hhv-period', type=int, nargs='+', default=[33])
+    parser.add_argument('--sma-period', type=int, nargs='+', default=[8])
+    parser.add_argument('--hhv-a-period', type=int, nargs='+', default=[3])
+    parser.add_argument('--rsi-period', type=int, nargs='+', default=[6])
+    parser.add_argument('--price-line-low', type=float, nargs='+', default=[23.0])
+    parser.add_argument('--price-line-high', type=float, nargs='+', default=[75.0])
+    parser.add_argument('--rsi-low', type=float, nargs='+', default=[23.0])
+    parser.add_argument('--rsi-high', type=float, nargs='+', default=[75.0])
+    parser.add_argument('--horizon', type=int, default=10, help='前瞻收益的K线数')
+    parser.add_argument('--hysteresis', type=float, help='告警解除前需要回到阈值之外的宽度（默认同实盘）')
+    parser.add_argument('--cooldown', type=float, help='同一规则两次告警的最短间隔（秒，默认同实盘）')
+    parser.add_argument('--level', action='store_true', help='告警状态期间按冷却时间重复告警（默认只在进入时告警）')
+    parser.add_argument('--objective', choices=OBJECTIVES, default='mean_return')
+    parser.add_argument('--ascending', action='store_true', help='按目标升序排列')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--csv', help='把全部结果写入CSV文件')
+    args = parser.parse_args(argv)
+
+    symbols = [symbol.upper() for symbol in args.symbols]
+    keys = [(symbol, timeframe) for symbol in symbols for timeframe in args.timeframes]
+    data = load_directory(args.data, set(symbols), set(args.timeframes) | {'1m'})
+    missing = add_resampled(data, keys)
+    if missing:
+        print("缺少数据: " + ", ".join(f"{s}/{tf}" for s, tf in missing), file=sys.stderr)
+        return 2
+    series = [data[key] for key in keys]
+
+    families = list(itertools.product(args.hhv_period, args.sma_period, args.hhv_a_period, args.rsi_period))
+    thresholds = threshold_grid(args.price_line_low, args.price_line_high, args.rsi_low, args.rsi_high)
+    print(f"{len(series)} 个序列，{sum(len(c) for c in series)} 根K线；"
+          f"{len(families)} 个参数族 × {len(thresholds)} 组阈值 = {len(families) * len(thresholds)} 组配置")
+
+    started = time.perf_counter()
+    # 告警规则参数默认与实盘配置相同（监控引擎只在这里用到，进程池的子进程不需要导入）
+    from monitor_engine import MonitorConfig
+    defaults = MonitorConfig()
+    alerts = {
+        'hysteresis': defaults.alert_hysteresis if args.hysteresis is None else args.hysteresis,
+        'cooldown': defaults.alert_cooldown if args.cooldown is None else args.cooldown,
+        'edge_only': defaults.alert_edge_only and not args.level,
+    }
+    results = optimize(series, families, thresholds, args.horizon, args.workers, alerts=alerts)
+    elapsed = time.perf_counter() - started
+    results = sort_results(results, args.objective, args.ascending)
+
+    print(format_table(results, args.top))
+    print(f"耗时 {elapsed:.2f}s（{args.workers} 个进程）")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_FIELDS)
+            writer.writerows(results.tolist())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
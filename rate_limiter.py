@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+请求权重限速器
+
+币安按IP统计每分钟请求权重，各接口权重不同，超限返回429，屡次超限返回418封禁。
+这里用令牌桶在本地估算剩余权重（允许一次性用完整个预算的突发），
+并用响应头 X-MBX-USED-WEIGHT-* 校准为交易所统计的真实值。
+收到429/418时记录封禁截止时间，之后的请求立即返回失败让调用方推迟，而不是阻塞整个循环。
+多个抓取线程共享同一个实例。
+"""
+
+import threading
+import time
+
+# 各接口的请求权重（币安 REST，全市场行情为不带 symbol 参数时的权重）
+ENDPOINT_WEIGHTS = {
+    '/api/v3/klines': 2,
+    '/api/v3/exchangeInfo': 20,
+    '/api/v3/ticker/24hr': 80,
+    '/api/v3/ticker/bookTicker': 4,
+    # U本位合约（klines 按 limit<100 计为1、<500 计为2，这里取常用的2）
+    '/fapi/v1/klines': 2,
+    '/fapi/v1/exchangeInfo': 1,
+    '/fapi/v1/ticker/24hr': 40,
+    '/fapi/v1/ticker/bookTicker': 5,
+}
+
+# 响应头中的窗口单位
+_INTERVAL_SECONDS = {'S': 1, 'M': 60, 'H': 3600, 'D': 86400}
+
+# 被限速(429)、封禁(418)或处于封禁期而推迟时错误信息的开头；
+# 限速按IP统计，与具体品种无关，不应计入单个品种/周期的熔断
+RATE_LIMITED_ERROR = "请求被限速"
+
+
+def endpoint_weight(path, default=1):
+    """查询接口权重"""
+    return ENDPOINT_WEIGHTS.get(path, default)
+
+
+def is_rate_limited(error):
+    """错误是否由全局限速/封禁引起"""
+    return bool(error) and error.startswith(RATE_LIMITED_ERROR)
+
+
+class WeightRateLimiter:
+    """共享的请求权重令牌桶"""
+
+    def __init__(self, weight_limit=1200, window=60, clock=time.monotonic):
+        """
+        Args:
+            weight_limit: 窗口内可用的权重
+            window: 窗口长度（秒），令牌以 weight_limit / window 的速度回补
+            clock: 时间函数，便于测试
+        """
+        self.weight_limit = weight_limit
+        self.window = window
+        self.clock = clock
+        self.refill_rate = weight_limit / float(window)
+
+        self.condition = threading.Condition()
+        self.tokens = float(weight_limit)
+        self.last_refill = clock()
+        self.banned_until = 0.0
+        self.server_used_weight = None  # 最近一次响应头报告的已用权重
+        self.rate_limited_count = 0
+
+    def acquire(self, weight=1, timeout=None):
+        """申请权重
+
+        令牌不足时在 timeout 内等待回补；处于封禁期或等待会超过 timeout 时立即返回False，
+        由调用方推迟这项请求。
+
+        Returns:
+            True表示可以发出请求
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self.condition:
+            while True:
+                now = self.clock()
+                if now < self.banned_until:
+                    return False
+
+                self._refill(now)
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return True
+
+                wait_time = (weight - self.tokens) / self.refill_rate
+                if deadline is not None and now + wait_time > deadline:
+                    return False
+                self.condition.wait(wait_time)
+
+    def update_from_headers(self, headers):
+        """用响应头中的已用权重校准本地估算"""
+        used = None
+        for name, value in headers.items():
+            name = name.lower()
+            if not name.startswith('x-mbx-used-weight-'):
+                continue
+            seconds = self._header_window_seconds(name[len('x-mbx-used-weight-'):])
+            if seconds != self.window:
+                continue
+            try:
+                used = int(value)
+            except ValueError:
+                continue
+
+        if used is None:
+            return
+
+        with self.condition:
+            self.server_used_weight = used
+            self._refill(self.clock())
+            # 交易所的统计更准确：本地令牌不能多于交易所认为剩余的权重
+            self.tokens = min(self.tokens, max(0.0, self.weight_limit - used))
+
+    def record_rate_limited(self, retry_after):
+        """收到429/418后进入封禁期，封禁期内不再发出请求"""
+        with self.condition:
+            now = self.clock()
+            self._refill(now)
+            self.rate_limited_count += 1
+            self.banned_until = max(self.banned_until, now + retry_after)
+            self.tokens = 0.0
+            self.condition.notify_all()
+
+    def remaining(self):
+        """当前可用权重（封禁期内为0）"""
+        with self.condition:
+            now = self.clock()
+            if now < self.banned_until:
+                return 0
+            self._refill(now)
+            return int(self.tokens)
+
+    def status(self):
+        """限速状态，供调度器和界面参考"""
+        with self.condition:
+            now = self.clock()
+            self._refill(now)
+            return {
+                'weight_limit': self.weight_limit,
+                'remaining': 0 if now < self.banned_until else int(self.tokens),
+                'server_used_weight': self.server_used_weight,
+                'banned_for': max(0.0, self.banned_until - now),
+                'rate_limited_count': self.rate_limited_count,
+            }
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(float(self.weight_limit), self.tokens + elapsed * self.refill_rate)
+            self.last_refill = now
+
+    @staticmethod
+    def _header_window_seconds(suffix):
+        # 例如 '1m' -> 60，'1s' -> 1
+        suffix = suffix.upper()
+        try:
+            return int(suffix[:-1]) * _INTERVAL_SECONDS[suffix[-1]]
+        except (ValueError, KeyError, IndexError):
+            return None
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+离线回放数据源
+
+从本地文件读取录制的K线，按模拟时间逐步“放出”，
+接口与 BinanceAPIClient 一致（fetch_klines / rate_limit_status / close），
+可以直接交给 MonitorEngine、CandleBufferStore 等任何使用API客户端的地方。
+
+支持的文件（文件名以 品种-周期 或 品种_周期 开头，例如 ETHUSDT-1m-2024-01.csv、ETHUSDT_3m.json）:
+  .json  /api/v3/klines 的原始响应
+  .csv   币安公开历史数据（data.binance.vision）的K线CSV，可带表头
+同一序列的多个文件会合并并按开盘时间去重。
+"""
+
+import glob
+import os
+import re
+
+import numpy as np
+
+from kline_parser import EMPTY_KLINES_ERROR, KlineColumns, columns_from_matrix, parse_klines_json
+from resample import BASE_TIMEFRAME, TIMEFRAME_MS, resample_columns
+
+FILE_NAME_PATTERN = re.compile(r'^([A-Za-z0-9]+)[-_](\d+[mhd])(?:[-_.]|$)')
+
+
+def load_kline_file(path):
+    """读取一个K线文件为 KlineColumns"""
+    if path.endswith('.json'):
+        with open(path, 'rb') as f:
+            return parse_klines_json(f.read())
+
+    with open(path, 'r', encoding='utf-8') as f:
+        first_line = f.readline()
+    skip = 0 if first_line[:1].isdigit() else 1  # 新版数据带表头
+    matrix = np.loadtxt(path, delimiter=',', usecols=range(6), skiprows=skip, ndmin=2)
+    open_times = matrix[:, 0].astype(np.int64)
+    if len(open_times) and open_times[0] > 10 ** 14:
+        # 2025年起的现货数据时间戳为微秒
+        open_times //= 1000
+    return columns_from_matrix(open_times, np.ascontiguousarray(matrix[:, 1:6]))
+
+
+def merge_columns(parts):
+    """合并同一序列的多段K线，按开盘时间排序并去重（后读入的覆盖先读入的）"""
+    open_times = np.concatenate([part.open_times for part in parts])
+    values = np.concatenate([part.values() for part in parts])
+    # 倒序后取第一次出现，即保留最后读入的那一根
+    reversed_times = open_times[::-1]
+    _, index = np.unique(reversed_times, return_index=True)
+    index = len(open_times) - 1 - index
+    return columns_from_matrix(open_times[index], values[index])
+
+
+def load_directory(path, symbols=None, timeframes=None):
+    """读取目录下所有K线文件
+
+    Returns:
+        {(symbol, timeframe): KlineColumns}
+    """
+    parts = {}
+    for file_path in sorted(glob.glob(os.path.join(path, '*'))):
+        match = FILE_NAME_PATTERN.match(os.path.basename(file_path))
+        if not match or not file_path.endswith(('.json', '.csv')):
+            continue
+        symbol, timeframe = match.group(1).upper(), match.group(2)
+        if symbols and symbol not in symbols:
+            continue
+        if timeframes and timeframe not in timeframes:
+            continue
+        parts.setdefault((symbol, timeframe), []).append(load_kline_file(file_path))
+    return {key: merge_columns(columns) for key, columns in parts.items()}
+
+
+def add_resampled(series, keys):
+    """为没有录制数据的 (品种, 周期) 从该品种的1m数据离线聚合（原地修改 series）
+
+    Returns:
+        仍然缺少数据的 [(symbol, timeframe), ...]
+    """
+    missing = []
+    for symbol, timeframe in keys:
+        if (symbol, timeframe) in series:
+            continue
+        base = series.get((symbol, BASE_TIMEFRAME))
+        if base is None or timeframe not in TIMEFRAME_MS:
+            missing.append((symbol, timeframe))
+            continue
+        series[(symbol, timeframe)] = KlineColumns(*resample_columns(
+            base.open_times, base.opens, base.highs, base.lows, base.closes, base.volumes,
+            TIMEFRAME_MS[timeframe]))
+    return missing
+
+
+class ReplayAPIClient:
+    """回放K线的API客户端
+
+    模拟时间 now（毫秒）之前已经收盘的K线才可见，
+    因为录制数据里只有每根K线的最终值，放出未收盘的K线会泄露未来价格。
+    now 为 None 时全部可见。
+    """
+
+    def __init__(self, series, now=None):
+        for symbol, timeframe in series:
+            if timeframe not in TIMEFRAME_MS:
+                raise ValueError(f"不支持回放的周期: {timeframe}")
+        self.series = series
+        self.now = now
+        self.request_count = 0
+        self.failed_count = 0
+
+    def close_times(self, symbol, timeframe):
+        """某个序列每根K线的收盘时刻（毫秒）"""
+        return self.series[(symbol, timeframe)].open_times + TIMEFRAME_MS[timeframe]
+
+    def _visible(self, columns, timeframe):
+        if self.now is None:
+            return len(columns)
+        return int(np.searchsorted(columns.open_times, self.now - TIMEFRAME_MS[timeframe], side='right'))
+
+    def fetch_klines(self, symbol, timeframe, start_time=None, limit=None, end_time=None,
+                     as_columns=False, deadline=None):
+        """与 BinanceAPIClient.fetch_klines 的参数和返回格式一致（回放没有网络延迟，忽略 deadline）"""
+        self.request_count += 1
+        columns = self.series.get((symbol, timeframe))
+        if columns is None:
+            self.failed_count += 1
+            return False, None, f"没有 {symbol}/{timeframe} 的回放数据"
+
+        limit = limit or 500
+        open_times = columns.open_times
+        end = self._visible(columns, timeframe)
+        if end_time is not None:
+            end = min(end, int(np.searchsorted(open_times, end_time, side='right')))
+        if start_time is not None:
+            begin = int(np.searchsorted(open_times, start_time, side='left'))
+            end = min(end, begin + limit)
+        else:
+            begin = max(0, end - limit)
+        if end <= begin:
+            return False, None, EMPTY_KLINES_ERROR
+
+        data = columns.slice(begin, end)
+        if as_columns:
+            return True, data, None
+        rows = [[int(t), str(o), str(h), str(l), str(c), str(v)]
+                for t, (o, h, l, c, v) in zip(data.open_times.tolist(), data.values().tolist())]
+        return True, rows, None
+
+    def rate_limit_status(self):
+        """回放没有限速"""
+        return {
+            'weight_limit': 0,
+            'remaining': 0,
+            'server_used_weight': None,
+            'banned_for': 0.0,
+            'rate_limited_count': 0,
+        }
+
+    def close(self):
+        pass
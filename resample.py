@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地K线周期聚合
+
+用每个品种一份1m基础缓冲区聚合出3m/5m/15m等更高周期的K线，
+分桶按币安K线边界对齐（开盘时间为周期毫秒数的整数倍，UTC），
+这样同一品种勾选多个周期时每轮只需要一次请求。
+基础缓冲区不够长的周期（例如1d）仍然单独请求原生K线。
+"""
+
+import numpy as np
+
+BASE_TIMEFRAME = '1m'
+
+# 按固定毫秒数对齐的周期（周线、月线的边界不是固定倍数，不参与聚合）
+TIMEFRAME_MS = {
+    '1m': 60 * 1000,
+    '3m': 3 * 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '2h': 2 * 60 * 60 * 1000,
+    '4h': 4 * 60 * 60 * 1000,
+    '6h': 6 * 60 * 60 * 1000,
+    '8h': 8 * 60 * 60 * 1000,
+    '12h': 12 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+
+
+def resample_factor(timeframe):
+    """目标周期包含多少根1m K线，无法聚合时返回None"""
+    interval_ms = TIMEFRAME_MS.get(timeframe)
+    if interval_ms is None:
+        return None
+    return interval_ms // TIMEFRAME_MS[BASE_TIMEFRAME]
+
+
+def can_resample(timeframe, limit, base_size):
+    """基础缓冲区是否足够聚合出 limit 根目标周期K线
+
+    第一个分桶可能不完整会被丢弃，所以要多留 factor - 1 根。
+    """
+    factor = resample_factor(timeframe)
+    if factor is None:
+        return False
+    return factor * limit + factor - 1 <= base_size
+
+
+def resample_columns(open_times, opens, highs, lows, closes, volumes, interval_ms):
+    """把1m K线列数据按 interval_ms 聚合
+
+    开头不完整的分桶会被丢弃（原生K线包含缓冲区之前的数据，无法还原）；
+    最后一个分桶即正在形成的K线，与交易所返回的未收盘K线一致。
+
+    Returns:
+        (open_times, opens, highs, lows, closes, volumes) 六个numpy数组
+    """
+    open_times = np.asarray(open_times, dtype=np.int64)
+    if len(open_times) == 0:
+        empty = np.empty(0)
+        return open_times, empty, empty, empty, empty, empty
+
+    buckets = open_times - open_times % interval_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    if open_times[0] != buckets[0]:
+        starts = starts[1:]
+        if len(starts) == 0:
+            empty = np.empty(0)
+            return np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty
+
+    first = starts[0]
+    offsets = starts - first
+    ends = np.r_[starts[1:], len(open_times)] - 1
+
+    opens = np.asarray(opens, dtype=np.float64)
+    highs = np.asarray(highs, dtype=np.float64)[first:]
+    lows = np.asarray(lows, dtype=np.float64)[first:]
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)[first:]
+
+    return (
+        buckets[starts],
+        opens[starts],
+        np.maximum.reduceat(highs, offsets),
+        np.minimum.reduceat(lows, offsets),
+        closes[ends],
+        np.add.reduceat(volumes, offsets),
+    )
+
+
+class ResampledSeries:
+    """由1m基础缓冲区聚合出的周期序列
+
+    对外提供与 CandleBuffer 相同的只读接口（snapshot/last_open_time/version/len），
+    只在基础缓冲区变化后才重新聚合。周期为1m时即基础缓冲区最近 limit 根。
+    """
+
+    def __init__(self, base_buffer, timeframe, limit):
+        self.base_buffer = base_buffer
+        self.symbol = base_buffer.symbol
+        self.timeframe = timeframe
+        self.limit = limit
+        self.interval_ms = TIMEFRAME_MS[timeframe]
+        self.version = -1
+        self.columns = None
+
+    def __len__(self):
+        self._rebuild_if_stale()
+        return len(self.columns[0])
+
+    @property
+    def last_open_time(self):
+        self._rebuild_if_stale()
+        open_times = self.columns[0]
+        return int(open_times[-1]) if len(open_times) else None
+
+    def snapshot(self):
+        """返回 (highs, lows, closes) 数组副本，供指标计算使用"""
+        self._rebuild_if_stale()
+        _, _, highs, lows, closes, _ = self.columns
+        return highs.copy(), lows.copy(), closes.copy()
+
+    def _rebuild_if_stale(self):
+        base = self.base_buffer
+        version = base.version
+        if self.version == version:
+            return
+        raw = base.columns()
+
+        columns = resample_columns(raw.open_times, raw.opens, raw.highs,
+                                   raw.lows, raw.closes, raw.volumes, self.interval_ms)
+        self.columns = tuple(column[-self.limit:] for column in columns)
+        self.version = version
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+时间预算、重试策略和熔断
+
+一个品种或接口出问题时不能拖慢整轮检查：
+  - Deadline: 每轮拉取的时间预算，请求超时和重试等待都不能超过剩余预算
+  - RetryPolicy: 唯一的重试策略（指数退避 + 抖动），只重试5xx和网络错误，
+    剩余预算不够再发一次请求时直接放弃
+  - CircuitBreaker: 按 (品种, 周期) 熔断，连续失败 N 次后暂停请求一段时间，
+    冷却结束后放一个探测请求（半开），成功则恢复，失败则冷却时间翻倍
+时钟可替换，便于测试。
+"""
+
+import random
+import threading
+import time
+
+
+class Deadline:
+    """时间预算（seconds 为None表示不限）"""
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = None if seconds is None else clock() + seconds
+
+    def remaining(self):
+        """剩余秒数，不限时为 float('inf')"""
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, limit):
+        """不超过剩余预算的超时时间"""
+        return min(limit, self.remaining())
+
+
+class RetryPolicy:
+    """重试策略
+
+    Args:
+        max_retries: 首次请求之外最多重试几次
+        base_delay: 第一次重试前的等待（秒），之后每次翻倍
+        max_delay: 单次等待上限（秒）
+        min_attempt_time: 剩余预算少于“等待 + 这个时间”时不再重试
+    """
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=8.0, min_attempt_time=1.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_attempt_time = min_attempt_time
+
+    @staticmethod
+    def retryable_status(status_code):
+        """5xx可以重试；4xx是请求本身的问题（429/418由限速器处理），重试也没用"""
+        return status_code >= 500
+
+    def delay(self, attempt):
+        """第 attempt 次重试前的等待（带抖动，避免多个线程同时重试）"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def next_delay(self, attempt, deadline=None):
+        """第 attempt 次重试前应等待的秒数，不应再重试时返回None"""
+        if attempt > self.max_retries:
+            return None
+        delay = self.delay(attempt)
+        if deadline is not None and deadline.remaining() < delay + self.min_attempt_time:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """按键（例如 (品种, 周期)）熔断
+
+    状态: closed 正常；open 暂停请求；half_open 冷却结束，放行一个探测请求
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, cooldown=30, max_cooldown=600, clock=time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.states = {}  # key -> [状态, 连续失败次数, 冷却/探测截止时间, 当前冷却时长]
+
+    def _entry(self, key):
+        entry = self.states.get(key)
+        if entry is None:
+            entry = self.states[key] = [self.CLOSED, 0, 0.0, self.cooldown]
+        return entry
+
+    def allow(self, key):
+        """是否可以发出请求；冷却结束时转为半开并放行这一个探测请求"""
+        with self.lock:
+            entry = self.states.get(key)
+            if entry is None or entry[0] == self.CLOSED:
+                return True
+            now = self.clock()
+            if now < entry[2]:
+                return False
+            # 冷却结束，或上一个探测请求没有结果（例如被推迟）：放行一个探测请求
+            entry[0] = self.HALF_OPEN
+            entry[2] = now + entry[3]
+            return True
+
+    def record_success(self, key):
+        """记录成功，返回True表示从熔断中恢复"""
+        with self.lock:
+            entry = self.states.get(key)
+            if entry is None:
+                return False
+            recovered = entry[0] != self.CLOSED
+            entry[0], entry[1], entry[3] = self.CLOSED, 0, self.cooldown
+            return recovered
+
+    def record_failure(self, key):
+        """记录失败，返回True表示这次失败触发了熔断"""
+        with self.lock:
+            entry = self._entry(key)
+            entry[1] += 1
+            if entry[0] == self.HALF_OPEN:
+                # 探测失败：重新熔断，冷却时间翻倍
+                entry[3] = min(self.max_cooldown, entry[3] * 2)
+            elif entry[0] == self.OPEN or entry[1] < self.failure_threshold:
+                return False
+            entry[0] = self.OPEN
+            entry[2] = self.clock() + entry[3]
+            return True
+
+    def state(self, key):
+        with self.lock:
+            entry = self.states.get(key)
+            return entry[0] if entry else self.CLOSED
+
+    def cooldown_for(self, key):
+        """当前冷却时长（秒）"""
+        with self.lock:
+            entry = self.states.get(key)
+            return entry[3] if entry else self.cooldown
+
+    def open_keys(self):
+        """处于熔断（含半开）状态的键"""
+        with self.lock:
+            return [key for key, entry in self.states.items() if entry[0] != self.CLOSED]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按K线收盘时间调度的轮询计划
+
+固定每 check_interval 秒拉一遍所有品种时，1d K线一天要请求几千次，几乎都没有新信息。
+这里为每个 (品种, 周期) 单独计算下一次拉取时间：
+  - 收盘后 close_delay 秒拉一次，拿到刚收盘的完整K线
+  - 收盘前 close_window 秒内（不超过周期的 1/4）密集拉取（每 dense_interval 秒）
+  - K线中段稀疏拉取，间隔为周期的 1/4，限制在 [check_interval, max_sparse_interval] 之间
+
+拉取时间都落在以K线开盘时间为原点的固定网格上，由当前时间直接算出，
+不会因为每轮耗时不同而累积漂移。等待使用 threading.Event，停止或重新配置立即生效。
+时钟可替换，FakeClock 用于确定性地测试调度时间。
+"""
+
+import math
+import threading
+import time
+
+from resample import TIMEFRAME_MS
+
+
+class SystemClock:
+    """系统时钟（UTC时间戳，与币安K线开盘时间对齐）"""
+
+    def time(self):
+        return time.time()
+
+    def wait(self, event, timeout):
+        """等待事件或超时，返回事件是否已触发"""
+        return event.wait(timeout)
+
+
+class FakeClock:
+    """测试用时钟：wait 不真正睡眠，而是直接把时间拨到超时时刻"""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def wait(self, event, timeout):
+        if event.is_set():
+            return True
+        if timeout is not None and timeout > 0:
+            self.now += timeout
+        return event.is_set()
+
+
+def _next_on_grid(origin, step, now):
+    """origin + k*step 中严格晚于 now 的第一个时刻"""
+    if now < origin:
+        return origin
+    return origin + (math.floor((now - origin) / step) + 1) * step
+
+
+def next_poll_time(now, interval, sparse_interval, dense_interval, close_window, close_delay):
+    """计算一个周期为 interval 秒的序列在 now 之后的下一次拉取时间"""
+    candle_start = now - now % interval
+    close_time = candle_start + interval
+    close_window = min(close_window, interval)
+    dense_start = close_time - close_window
+
+    if now < dense_start:
+        next_time = min(_next_on_grid(candle_start + close_delay, sparse_interval, now), dense_start)
+    else:
+        next_time = _next_on_grid(dense_start, dense_interval, now)
+    # 无论处在哪个阶段，都要在收盘后立即拉一次
+    return min(next_time, close_time + close_delay)
+
+
+class PollScheduler:
+    """(品种, 周期) 的轮询调度器"""
+
+    def __init__(self, config, clock=None):
+        self.config = config
+        self.clock = clock or SystemClock()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.next_due = {}  # (symbol, timeframe) -> 下一次拉取时间
+
+    def set_series(self, keys):
+        """设置需要调度的序列，新序列立即到期；正在等待时立即唤醒"""
+        now = self.clock.time()
+        with self.lock:
+            self.next_due = {key: self.next_due.get(key, now) for key in keys}
+        self.wakeup.set()
+
+    def stop(self):
+        """停止调度，正在进行的等待立即返回"""
+        self.stopped = True
+        self.wakeup.set()
+
+    def defer(self, seconds):
+        """把所有序列推迟到 seconds 秒之后（例如被限速期间）"""
+        until = self.clock.time() + seconds
+        with self.lock:
+            for key, due in self.next_due.items():
+                self.next_due[key] = max(due, until)
+
+    def poll_interval(self, timeframe):
+        """返回 (稀疏间隔, 密集间隔, 收盘窗口, 周期秒数)"""
+        config = self.config
+        interval_ms = TIMEFRAME_MS.get(timeframe)
+        if interval_ms is None:
+            # 周线/月线的边界不是固定倍数，退回固定间隔
+            return config.check_interval, config.check_interval, 0, None
+        interval = interval_ms / 1000.0
+        sparse = min(max(interval / 4, config.check_interval), config.max_sparse_interval)
+        dense = min(config.dense_interval, sparse)
+        # 短周期的收盘窗口不超过周期的 1/4，避免1m整根K线都在密集拉取
+        close_window = min(config.close_window, interval / 4)
+        return sparse, dense, close_window, interval
+
+    def next_time(self, key, now):
+        """计算某个序列在 now 之后的下一次拉取时间"""
+        sparse, dense, close_window, interval = self.poll_interval(key[1])
+        if interval is None:
+            return now + sparse
+        return next_poll_time(now, interval, sparse, dense, close_window, self.config.close_delay)
+
+    def pop_due(self):
+        """取出已到期的序列，并为它们安排下一次拉取"""
+        now = self.clock.time()
+        due = []
+        with self.lock:
+            for key, due_time in self.next_due.items():
+                if due_time <= now:
+                    due.append(key)
+                    self.next_due[key] = self.next_time(key, now)
+        return due
+
+    def seconds_until_due(self):
+        """距离最早一个到期序列的秒数，没有序列时为None"""
+        with self.lock:
+            if not self.next_due:
+                return None
+            earliest = min(self.next_due.values())
+        return max(0.0, earliest - self.clock.time())
+
+    def wait(self):
+        """等待到最早的序列到期
+
+        Returns:
+            False 表示调度器已停止
+        """
+        while not self.stopped:
+            timeout = self.seconds_until_due()
+            if timeout == 0:
+                return True
+            self.clock.wait(self.wakeup, timeout)
+            self.wakeup.clear()
+        return False
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+全市场筛选
+
+几百个交易对不能每轮逐个请求K线，筛选分四步：
+  1. 交易所信息给出品种全集：计价资产为 USDT、状态为 TRADING，合约市场只取永续；
+     每 universe_refresh 秒才重新获取一次
+  2. 全市场24h行情（一次请求）预筛：成交额达到下限，且现价处于24h高低区间的低位或高位
+     （价格线本身也是高低区间内的相对位置，两者高度相关），最多取 screen_max_candidates 个；
+     上一轮排名中的品种总是保留（占用候选名额），排名才能及时更新或退出，其余名额按极端程度分配
+  3. 只对候选拉取K线（CandleBufferStore 增量拉取，候选大多不变时每个只需一次小请求），
+     右对齐后批量计算价格线和RSI
+  4. 按超出告警阈值的程度打分，用 np.partition 选出前K个，只对这K个排序
+"""
+
+import time
+
+import numpy as np
+
+import indicators
+
+UNIVERSE_EMPTY_ERROR = "交易所信息中没有符合条件的品种"
+
+
+class ScreenRow:
+    """排名中的一行"""
+
+    __slots__ = ('symbol', 'timeframe', 'price', 'price_line', 'rsi', 'score')
+
+    def __init__(self, symbol, timeframe, price, price_line, rsi, score):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.price = price
+        self.price_line = price_line
+        self.rsi = rsi
+        self.score = score
+
+
+class ScreenReport:
+    """一轮筛选的结果
+
+    Attributes:
+        universe: 品种全集的数量
+        candidates: 通过预筛的品种数
+        evaluated: 计算了指标的 (品种, 周期) 数
+        top: [ScreenRow, ...]，按 score 从高到低
+        errors: [(symbol, timeframe, error), ...]，品种全集或行情获取失败时 symbol 为None
+        elapsed: 耗时（秒）
+    """
+
+    def __init__(self):
+        self.universe = 0
+        self.candidates = 0
+        self.evaluated = 0
+        self.top = []
+        self.errors = []
+        self.elapsed = 0.0
+
+
+def parse_universe(exchange_info, quote_asset='USDT', perpetual_only=False):
+    """从 exchangeInfo 取出可交易的品种（按名称排序）"""
+    symbols = []
+    for item in exchange_info.get('symbols', []):
+        if item.get('status') != 'TRADING' or item.get('quoteAsset') != quote_asset:
+            continue
+        if perpetual_only and item.get('contractType') != 'PERPETUAL':
+            continue
+        symbols.append(item['symbol'])
+    return sorted(symbols)
+
+
+def top_k_indices(scores, k):
+    """分数最高的 k 个下标（从高到低），nan视为最低
+
+    先用 np.partition 做 O(n) 的部分选择，只对选出的 k 个排序。
+    分数相同时下标小的在前（与对全部分数稳定排序后取前 k 个相同）。
+    """
+    scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=-np.inf)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        # 第k大的分数：比它高的全部入选，与它相等的按下标补足
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        selected = np.sort(np.concatenate((above, ties)))
+    else:
+        selected = np.arange(len(scores))
+    return selected[np.argsort(-scores[selected], kind='stable')]
+
+
+def prefilter(tickers, universe, min_quote_volume=0.0, range_low=30.0, range_high=70.0,
+              max_candidates=60, keep=()):
+    """用全市场24h行情挑出候选品种
+
+    Args:
+        tickers: /ticker/24hr 的返回（字典列表）
+        universe: 品种全集
+        max_candidates: 候选总数上限；keep 先占用名额（keep 本身超出上限时全部保留）
+        keep: 无论行情如何都保留的品种（上一轮的排名）
+
+    Returns:
+        候选品种列表（通过预筛的按极端程度从高到低，keep 中未通过的排在最后）
+    """
+    allowed = set(universe)
+    kept = [symbol for symbol in dict.fromkeys(keep) if symbol in allowed]
+    rows = [ticker for ticker in tickers if ticker.get('symbol') in allowed]
+    if not rows:
+        return kept
+
+    symbols = [ticker['symbol'] for ticker in rows]
+    values = np.array([[float(ticker.get('lastPrice', 0)), float(ticker.get('highPrice', 0)),
+                        float(ticker.get('lowPrice', 0)), float(ticker.get('quoteVolume', 0))]
+                       for ticker in rows])
+    last, high, low, quote_volume = values.T
+    span = high - low
+    with np.errstate(invalid='ignore', divide='ignore'):
+        position = np.where(span > 0, (last - low) / span * 100, 50.0)
+
+    passed = (quote_volume >= min_quote_volume) & ((position <= range_low) | (position >= range_high))
+    extremity = np.where(passed, np.abs(position - 50), np.nan)
+
+    # keep 之外的名额按极端程度分配
+    kept_set = set(kept)
+    is_kept = np.array([symbol in kept_set for symbol in symbols])
+    fresh = passed & ~is_kept
+    chosen = passed & is_kept
+    slots = min(max(max_candidates - len(kept), 0), int(fresh.sum()))
+    chosen[top_k_indices(np.where(fresh, extremity, np.nan), slots)] = True
+
+    selected = top_k_indices(np.where(chosen, extremity, np.nan), int(chosen.sum()))
+    candidates = [symbols[index] for index in selected]
+    listed = set(candidates)
+    candidates.extend(symbol for symbol in kept if symbol not in listed)
+    return candidates
+
+
+def alert_scores(price_line, rsi, price_line_low, price_line_high, rsi_low, rsi_high):
+    """超出告警阈值的程度：四个条件中超出最多的一个，正数表示已触发告警，nan表示数据不足"""
+    price_line = np.asarray(price_line, dtype=np.float64)
+    rsi = np.asarray(rsi, dtype=np.float64)
+    return np.max(np.stack((price_line_low - price_line, price_line - price_line_high,
+                            rsi_low - rsi, rsi - rsi_high)), axis=0)
+
+
+class Screener:
+    """全市场筛选
+
+    Args:
+        api_client: 需要提供 fetch_exchange_info / fetch_tickers
+        buffer_store: CandleBufferStore
+        fetch_engine: KlineFetchEngine
+        config: MonitorConfig
+        fetch_func: 可选，替代 buffer_store.refresh 的拉取函数（例如带计时的版本）
+        allow: 可选 allow(key) -> bool，返回False的 (品种, 周期) 本轮跳过（例如熔断中）
+        on_result: 可选 on_result(key, success, error)，每个数据源拉取完成后调用
+    """
+
+    def __init__(self, api_client, buffer_store, fetch_engine, config, fetch_func=None, allow=None,
+                 on_result=None, clock=time.monotonic):
+        self.api_client = api_client
+        self.buffer_store = buffer_store
+        self.fetch_engine = fetch_engine
+        self.config = config
+        self.fetch_func = fetch_func or buffer_store.refresh
+        self.allow = allow
+        self.on_result = on_result
+        self.clock = clock
+        self.universe = []
+        self.universe_time = None
+        self.top = []
+
+    def refresh_universe(self, deadline=None):
+        """需要时重新获取品种全集；获取失败但已有旧的全集时继续使用旧的
+
+        Returns:
+            (success, error)
+        """
+        now = self.clock()
+        if self.universe and now - self.universe_time < self.config.universe_refresh:
+            return True, None
+        success, info, error = self.api_client.fetch_exchange_info(deadline)
+        if not success:
+            return bool(self.universe), f"获取交易所信息失败: {error}"
+        universe = parse_universe(info, self.config.screen_quote_asset,
+                                  perpetual_only=self.config.market != 'spot')
+        if not universe:
+            return bool(self.universe), UNIVERSE_EMPTY_ERROR
+        self.universe = universe
+        self.universe_time = now
+        return True, None
+
+    def sweep(self, deadline=None, should_stop=None):
+        """执行一轮筛选，返回 ScreenReport"""
+        started = time.perf_counter()
+        config = self.config
+        report = ScreenReport()
+
+        success, error = self.refresh_universe(deadline)
+        if error:
+            report.errors.append((None, None, error))
+        if not success:
+            report.elapsed = time.perf_counter() - started
+            return report
+        report.universe = len(self.universe)
+
+        success, tickers, error = self.api_client.fetch_tickers(deadline)
+        if not success:
+            report.errors.append((None, None, f"获取24h行情失败: {error}"))
+            report.elapsed = time.perf_counter() - started
+            return report
+
+        keep = list(dict.fromkeys(row.symbol for row in self.top))
+        candidates = prefilter(tickers, self.universe, config.screen_min_quote_volume,
+                               config.screen_range_low, config.screen_range_high,
+                               config.screen_max_candidates, keep)
+        report.candidates = len(candidates)
+
+        sources = self.buffer_store.plan([(symbol, timeframe)
+                                          for symbol in candidates for timeframe in config.timeframes])
+        due = [key for key in sources if self.allow is None or self.allow(key)]
+        keys = []
+        for symbol, source_timeframe, success, _, error in self.fetch_engine.fetch_all(
+                due, should_stop=should_stop, fetch_func=self.fetch_func, deadline=deadline):
+            if self.on_result:
+                self.on_result((symbol, source_timeframe), success, error)
+            if not success:
+                report.errors.append((symbol, source_timeframe, error))
+                continue
+            keys.extend((symbol, timeframe) for timeframe in sources[(symbol, source_timeframe)])
+
+        report.evaluated, report.top = self.rank(keys)
+        self.top = report.top
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def rank(self, keys):
+        """批量计算指标并取前K个
+
+        Returns:
+            (计算了指标的数量, [ScreenRow, ...])
+        """
+        config = self.config
+        # 与 PriceLineCalculator/RSICalculator 相同的参数和最少K线数
+        hhv_period, sma_period, hhv_a_period, rsi_period = (indicators.HHV_PERIOD, indicators.SMA_PERIOD,
+                                                            indicators.HHV_A_PERIOD, indicators.RSI_PERIOD)
+        min_length = hhv_period + sma_period + hhv_a_period
+
+        groups = {}  # 长度 -> [(key, highs, lows, closes), ...]；同长度的序列一起计算
+        for key in keys:
+            highs, lows, closes = self.buffer_store.get_series(*key).snapshot()
+            if len(closes) >= min_length:
+                groups.setdefault(len(closes), []).append((key, highs, lows, closes))
+
+        ranked_keys, price_lines, rsis, prices = [], [], [], []
+        for rows in groups.values():
+            result = indicators.evaluate_batch(np.array([row[1] for row in rows]),
+                                               np.array([row[2] for row in rows]),
+                                               np.array([row[3] for row in rows]),
+                                               hhv_period, sma_period, hhv_a_period, rsi_period)
+            ranked_keys.extend(row[0] for row in rows)
+            price_lines.append(result.latest_price_line)
+            rsis.append(result.latest_rsi)
+            prices.append(result.latest_close)
+        if not ranked_keys:
+            return 0, []
+
+        price_line = np.concatenate(price_lines)
+        rsi = np.concatenate(rsis)
+        price = np.concatenate(prices)
+        scores = alert_scores(price_line, rsi, config.price_line_low, config.price_line_high,
+                              config.rsi_low, config.rsi_high)
+        top = [ScreenRow(ranked_keys[index][0], ranked_keys[index][1], float(price[index]),
+                         float(price_line[index]), float(rsi[index]), float(scores[index]))
+               for index in top_k_indices(scores, config.screen_top_k) if not np.isnan(scores[index])]
+        return len(ranked_keys), top
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多进程分片监控
+
+品种多时，指标计算和响应解析都受GIL限制只能用一个核。分片模式把品种分给多个工作进程：
+  - 每个工作进程运行一个完整的 MonitorEngine，自己持有K线缓冲区、增量指标状态和调度
+  - 同一品种的所有周期在同一个进程（1m聚合共用一个基础缓冲区）
+  - 工作进程只通过管道回传紧凑的记录：状态 (品种, 周期, 价格, 价格线, RSI, 告警)、告警事件和日志，
+    每隔 flush_interval 秒打包发送一次
+  - 协调器（ShardedMonitor）合并所有分片的记录，交给和 MonitorEngine 相同的回调，
+    界面和命令行不需要区分
+  - 增减品种时重新分配：保留现有分配，新品种放到负载最小的分片，之后把最多的分片的品种
+    逐个移到最少的分片直到相差不超过1；只有分配变化的分片会收到新的品种列表，
+    其余品种的缓冲区不受影响
+  - 请求权重按IP计算，每个分片只分到 request_weight_limit 的 1/N
+  - 工作进程意外退出时按原来的品种列表重启
+
+工作进程用 spawn 方式启动（协调器所在进程已经有其它线程，fork 不安全）。
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing.connection import wait
+
+# 工作进程 -> 协调器的记录（每条都是元组，第一个元素为类型）
+RECORD_STATUS = 'status'  # (类型, symbol, timeframe, price, price_line, rsi, alert)
+RECORD_ALERT = 'alert'    # (类型, symbol, timeframe, alerts, price, speech_msg)
+RECORD_LOG = 'log'        # (类型, text, color)
+
+# 协调器 -> 工作进程的命令
+COMMAND_SYMBOLS = 'symbols'
+COMMAND_STOP = 'stop'
+
+
+def rebalance(assignment, symbols, shards):
+    """把品种分配到 shards 个分片，尽量少移动
+
+    Args:
+        assignment: 现有分配 [[symbol, ...], ...]，首次分配时为None
+        symbols: 新的品种全集
+
+    Returns:
+        新的分配 [[symbol, ...], ...]，每个分片的品种数相差不超过1
+    """
+    wanted = list(dict.fromkeys(symbols))
+    keep = set(wanted)
+    result = [[] for _ in range(shards)]
+    placed = set()
+    for index, current in enumerate((assignment or [])[:shards]):
+        result[index] = [symbol for symbol in current if symbol in keep and symbol not in placed]
+        placed.update(result[index])
+
+    for symbol in wanted:
+        if symbol not in placed:
+            min(result, key=len).append(symbol)
+            placed.add(symbol)
+
+    while True:
+        largest = max(result, key=len)
+        smallest = min(result, key=len)
+        if len(largest) - len(smallest) <= 1:
+            return result
+        smallest.append(largest.pop())
+
+
+def shard_config(config, index, shards):
+    """工作进程的配置：请求权重按分片数平分，磁盘缓存每个分片一个文件，不开指标端口"""
+    values = dict(vars(config))
+    values['request_weight_limit'] = max(1, config.request_weight_limit // shards)
+    values['max_workers'] = max(1, config.max_workers // shards)
+    values['metrics_port'] = None
+    if config.cache_path:
+        root, ext = os.path.splitext(config.cache_path)
+        values['cache_path'] = f"{root}.shard{index}{ext}"
+    return values
+
+
+class _RecordSender:
+    """在工作进程里缓存记录，每隔 interval 秒打包发送一次（告警立即发送）"""
+
+    def __init__(self, conn, interval):
+        self.conn = conn
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.records = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, record, flush=False):
+        with self.lock:
+            self.records.append(record)
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            records, self.records = self.records, []
+            if records:
+                try:
+                    self.conn.send(records)
+                except (OSError, ValueError):
+                    pass  # 协调器已经关闭管道
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.flush()
+
+
+def _worker_main(index, config_values, symbols, conn, flush_interval):
+    """工作进程入口：运行一个 MonitorEngine，执行协调器的命令"""
+    from monitor_engine import MonitorConfig, MonitorEngine
+
+    # Ctrl+C 由协调器处理，工作进程等待 stop 命令
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    config = MonitorConfig().update(config_values)
+    config.symbols = list(symbols)
+    sender = _RecordSender(conn, flush_interval)
+    engine = MonitorEngine(
+        config,
+        on_log=lambda text, color=None: sender.add((RECORD_LOG, f"[分片{index}] {text}", color)),
+        on_status=lambda *values: sender.add((RECORD_STATUS,) + values),
+        on_alert=lambda *values: sender.add((RECORD_ALERT,) + values, flush=True),
+    )
+    if config.symbols:
+        engine.start()
+
+    try:
+        while True:
+            try:
+                command = conn.recv()
+            except (EOFError, OSError):
+                break
+            if command[0] == COMMAND_STOP:
+                break
+            if command[0] == COMMAND_SYMBOLS:
+                if engine.is_running:
+                    engine.update_symbols(command[1])
+                elif command[1]:
+                    config.symbols = list(command[1])
+                    engine.start()
+    finally:
+        engine.stop()
+        engine.join(timeout=5)
+        sender.close()
+        conn.close()
+
+
+class ShardedMonitor:
+    """多进程分片监控的协调器
+
+    回调和 MonitorEngine 相同（在协调器的接收线程里调用）。
+
+    Args:
+        config: MonitorConfig，symbols 为全部品种
+        shards: 工作进程数，默认CPU核数（不超过品种数）
+        flush_interval: 工作进程打包发送记录的间隔（秒）
+    """
+
+    def __init__(self, config, shards=None, on_log=None, on_status=None, on_alert=None,
+                 flush_interval=0.05):
+        self.config = config
+        self.shards = max(1, min(shards or os.cpu_count() or 1, len(config.symbols) or 1))
+        self.on_log = on_log or (lambda text, color=None: None)
+        self.on_status = on_status
+        self.on_alert = on_alert
+        self.flush_interval = flush_interval
+        self.context = multiprocessing.get_context('spawn')
+        self.lock = threading.Lock()
+        self.assignment = None
+        self.workers = [None] * self.shards  # [(process, conn), ...]
+        self.receiver = None
+        self.stop_monitoring = True
+
+    @property
+    def is_running(self):
+        return not self.stop_monitoring
+
+    def start(self):
+        """启动所有工作进程和接收线程（立即返回）"""
+        config = self.config
+        config.validate()
+        if config.screen_enabled:
+            raise ValueError("全市场筛选不支持分片模式")
+        self.stop_monitoring = False
+        self.assignment = rebalance(None, config.symbols, self.shards)
+        self.on_log(f"分片监控: {len(config.symbols)} 个品种，{self.shards} 个工作进程")
+        for index in range(self.shards):
+            self._spawn(index)
+        self.receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        self.receiver.start()
+
+    def _spawn(self, index):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(index, shard_config(self.config, index, self.shards), self.assignment[index],
+                  child_conn, self.flush_interval),
+            daemon=True, name=f"monitor-shard-{index}")
+        process.start()
+        child_conn.close()
+        self.workers[index] = (process, parent_conn)
+
+    def update_symbols(self, symbols):
+        """增减品种并重新分配，只通知分配有变化的分片"""
+        with self.lock:
+            symbols = [symbol.upper() for symbol in symbols]
+            old = self.assignment
+            self.config.symbols = symbols
+            self.assignment = rebalance(old, symbols, self.shards)
+            if self.stop_monitoring:
+                return
+            moved = 0
+            for index, (current, previous) in enumerate(zip(self.assignment, old)):
+                if current != previous:
+                    moved += len(set(current) - set(previous))
+                    self._send(index, (COMMAND_SYMBOLS, current))
+        self.on_log(f"重新分配: {len(symbols)} 个品种，{moved} 个移到新的分片")
+
+    def _send(self, index, command):
+        worker = self.workers[index]
+        if worker is None:
+            return
+        try:
+            worker[1].send(command)
+        except (OSError, ValueError):
+            pass
+
+    def _receive_loop(self):
+        """合并所有分片的记录，交给回调；工作进程意外退出时重启"""
+        while not self.stop_monitoring:
+            conns = {worker[1]: index for index, worker in enumerate(self.workers) if worker is not None}
+            for conn in wait(list(conns), timeout=0.5):
+                index = conns[conn]
+                try:
+                    records = conn.recv()
+                except (EOFError, OSError):
+                    self._restart(index)
+                    continue
+                for record in records:
+                    self._dispatch(record)
+
+    def _dispatch(self, record):
+        kind = record[0]
+        try:
+            if kind == RECORD_STATUS:
+                if self.on_status:
+                    self.on_status(*record[1:])
+            elif kind == RECORD_ALERT:
+                if self.on_alert:
+                    self.on_alert(*record[1:])
+            elif kind == RECORD_LOG:
+                self.on_log(record[1], record[2])
+        except Exception as e:
+            self.on_log(f"处理分片记录异常: {e}", color='yellow')
+
+    def _restart(self, index):
+        with self.lock:
+            if self.stop_monitoring:
+                return
+            process, conn = self.workers[index]
+            conn.close()
+            process.join(timeout=1)
+            self.on_log(f"分片{index} 已退出（退出码 {process.exitcode}），正在重启", color='yellow')
+            time.sleep(1)  # 避免反复崩溃时空转
+            self._spawn(index)
+
+    def stop(self):
+        """停止所有工作进程"""
+        if self.stop_monitoring:
+            return
+        with self.lock:
+            self.stop_monitoring = True
+            for index in range(self.shards):
+                self._send(index, (COMMAND_STOP,))
+        if self.receiver:
+            self.receiver.join()
+        for process, conn in filter(None, self.workers):
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+            # 停止前发出的最后一批记录
+            try:
+                while conn.poll():
+                    for record in conn.recv():
+                        self._dispatch(record)
+            except (EOFError, OSError):
+                pass
+            conn.close()
+        self.on_log("监控已停止")
+
+    def join(self, timeout=None):
+        """等待接收线程退出"""
+        if self.receiver:
+            self.receiver.join(timeout)
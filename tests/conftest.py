@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""测试直接导入仓库根目录的模块（与 benchmarks 相同），以及 devtools 中的本地替身服务器"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'devtools'))
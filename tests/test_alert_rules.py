@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""告警规则的状态机：滞回、冷却、只在进入时通知；跨周期的组合规则"""
+
+import numpy as np
+import pytest
+
+from alert_rules import (AlertRule, AlertRuleEngine, CompoundRule, CompoundRuleEngine, Condition,
+                         compile_compound_rules, compile_rules)
+from monitor_engine import MonitorConfig
+
+NAN = float('nan')
+KEY = ('ETHUSDT', '1m')
+
+
+def rsi_rule(cooldown=0.0, edge_only=True):
+    """RSI <= 20 进入，> 25 解除"""
+    return AlertRule('rsi_low', 'rsi', '<=', 20, 25, cooldown=cooldown, edge_only=edge_only)
+
+
+def step(engine, rsi, now, key=KEY, commit=True):
+    """喂入一个RSI值，返回 (是否处于告警状态, 是否通知)"""
+    active, fired = engine.evaluate([key], [[50.0, rsi]], now, commit=commit)
+    return bool(active[0, 0]), bool(fired[0, 0])
+
+
+def test_hysteresis_enter_hold_and_exit():
+    engine = AlertRuleEngine([rsi_rule()])
+    assert step(engine, 30, 0) == (False, False)
+    assert step(engine, 20, 1) == (True, True)     # 越过触发阈值：进入并通知
+    assert step(engine, 18, 2) == (True, False)    # 保持状态只通知一次
+    assert step(engine, 24, 3) == (True, False)    # 回到阈值之上但未越过退出阈值
+    assert step(engine, 25, 4) == (True, False)    # 退出阈值本身仍保持
+    assert step(engine, 25.1, 5) == (False, False)  # 越过退出阈值才解除
+    assert step(engine, 22, 6) == (False, False)   # 滞回区间内不会重新进入
+    assert step(engine, 19, 7) == (True, True)
+
+
+def test_high_side_rule_mirrors_low_side():
+    engine = AlertRuleEngine([AlertRule('rsi_high', 'rsi', '>=', 80, 75)])
+    assert step(engine, 80, 0) == (True, True)
+    assert step(engine, 76, 1) == (True, False)
+    assert step(engine, 74, 2) == (False, False)
+
+
+def test_cooldown_blocks_quick_reentry():
+    engine = AlertRuleEngine([rsi_rule(cooldown=900)])
+    assert step(engine, 10, 0) == (True, True)
+    assert step(engine, 30, 100) == (False, False)
+    # 解除后很快再次进入：处于告警状态但不通知
+    assert step(engine, 10, 200) == (True, False)
+    assert step(engine, 30, 300) == (False, False)
+    assert step(engine, 10, 900) == (True, True)
+
+
+def test_level_mode_repeats_after_cooldown():
+    engine = AlertRuleEngine([rsi_rule(cooldown=300, edge_only=False)])
+    fired = [step(engine, 10, now)[1] for now in range(0, 1000, 100)]
+    assert fired == [True, False, False, True, False, False, True, False, False, True]
+
+
+def test_nan_keeps_state():
+    engine = AlertRuleEngine([rsi_rule()])
+    assert step(engine, 10, 0) == (True, True)
+    assert step(engine, NAN, 1) == (True, False)
+    assert step(engine, 30, 2) == (False, False)
+    assert step(engine, NAN, 3) == (False, False)
+    assert step(engine, 10, 4) == (True, True)
+
+
+def test_uncommitted_evaluation_leaves_state_unchanged():
+    engine = AlertRuleEngine([rsi_rule(cooldown=900)])
+    # 只显示状态：算出处于告警区间，但不通知也不保存
+    assert step(engine, 10, 0, commit=False) == (True, False)
+    assert step(engine, 10, 1) == (True, True)
+    assert step(engine, 30, 2, commit=False) == (False, False)
+    assert step(engine, 22, 3) == (True, False)  # 仍在告警状态（上一次未提交）
+
+
+def test_batch_rows_are_independent():
+    engine = AlertRuleEngine([rsi_rule(), AlertRule('pl_low', 'price_line', '<=', 10, 15)])
+    keys = [('ETHUSDT', '1m'), ('BTCUSDT', '1m'), ('SOLUSDT', '1m')]
+    active, fired = engine.evaluate(keys, [[5, 50], [50, 10], [50, 50]], 0)
+    assert active.tolist() == [[False, True], [True, False], [False, False]]
+    assert fired.tolist() == active.tolist()
+
+
+def test_discard_frees_and_reuses_rows():
+    engine = AlertRuleEngine([rsi_rule(cooldown=900)])
+    keys = [(f"S{index}USDT", '1m') for index in range(20)]
+    engine.evaluate(keys, np.tile([50.0, 10.0], (20, 1)), 0)
+    assert len(engine.active) == 32  # 容量翻倍
+    row = engine.rows[('S3USDT', '1m')]
+
+    engine.discard([('S3USDT', '1m'), ('UNKNOWN', '1m')])
+    assert ('S3USDT', '1m') not in engine.keys()
+    assert engine.free == [row]
+
+    # 空出来的行给新序列复用，状态是全新的（不继承告警状态和冷却）
+    assert step(engine, 10, 1, key=('NEWUSDT', '1m')) == (True, True)
+    assert engine.rows[('NEWUSDT', '1m')] == row
+    assert engine.free == []
+    # 被删除的序列重新加入也从头开始
+    assert step(engine, 10, 2, key=('S3USDT', '1m')) == (True, True)
+    assert len(engine.rows) == 21
+
+
+def test_deactivate_keeps_cooldown():
+    engine = AlertRuleEngine([rsi_rule(cooldown=900)])
+    assert step(engine, 10, 0) == (True, True)
+    engine.deactivate([KEY])
+    assert step(engine, 10, 100) == (True, False)
+    engine.deactivate([KEY])
+    assert step(engine, 10, 1000) == (True, True)
+
+
+def make_config(rules):
+    config = MonitorConfig()
+    config.alert_rules = rules
+    return config
+
+
+def test_compile_rules_fills_defaults():
+    config = make_config([{'name': 'deep', 'indicator': 'rsi', 'op': '<=', 'threshold': 15},
+                          {'name': 'top', 'indicator': 'price_line', 'op': '>=', 'threshold': 90,
+                           'cooldown': 60, 'edge_only': False}])
+    deep, top = compile_rules(config)
+    assert (deep.exit, deep.cooldown, deep.edge_only) == (15 + config.alert_hysteresis, config.alert_cooldown,
+                                                          config.alert_edge_only)
+    assert (top.exit, top.cooldown, top.edge_only) == (90 - config.alert_hysteresis, 60, False)
+    assert [rule.name for rule in compile_rules(make_config(None))] == [
+        'price_line_low', 'price_line_high', 'rsi_low', 'rsi_high']
+
+
+@pytest.mark.parametrize('rules', [
+    [{'name': 'a', 'indicator': 'macd', 'op': '<=', 'threshold': 10}],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '<', 'threshold': 10}],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '<=', 'threshold': 10, 'exit': 5}],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '>=', 'threshold': 80, 'exit': 85}],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '<=', 'threshold': 10, 'cooldown': -1}],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '<=', 'threshold': 10, 'colour': 'red'}],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '<='}],
+    ['rsi <= 10'],
+    [{'name': 'a', 'indicator': 'rsi', 'op': '<=', 'threshold': 10},
+     {'name': 'a', 'indicator': 'price_line', 'op': '<=', 'threshold': 10}],
+])
+def test_compile_rules_rejects_bad_rules(rules):
+    with pytest.raises(ValueError):
+        compile_rules(make_config(rules))
+
+
+def compound_engine(cooldown=0.0):
+    """两条组合规则：3m RSI 低且 15m 价格线低；1h RSI 高（只依赖1h）"""
+    both_low = CompoundRule('both_low', [
+        Condition('both_low', '3m', 'rsi', '<=', 20, 25),
+        Condition('both_low', '15m', 'price_line', '<=', 20, 25)], cooldown=cooldown)
+    hour_high = CompoundRule('hour_high', [Condition('hour_high', '1h', 'rsi', '>=', 80, 75)])
+    return CompoundRuleEngine([both_low, hour_high])
+
+
+def fired_names(fired):
+    return [(symbol, rule.name) for symbol, rule, _, _ in fired]
+
+
+def test_compound_and_across_timeframes_fires_once():
+    engine = compound_engine()
+    # 只有3m满足：不通知
+    assert engine.update([('ETHUSDT', '3m', 100.0, 50.0, 10.0)], 0) == []
+    fired = engine.update([('ETHUSDT', '15m', 101.0, 15.0, 50.0)], 1)
+    assert fired_names(fired) == [('ETHUSDT', 'both_low')]
+    # 通知值按条件顺序，价格取第一个条件的周期
+    assert fired[0][2] == [10.0, 15.0]
+    assert fired[0][3] == 100.0
+    # 保持满足（含滞回区间内）不再通知
+    assert engine.update([('ETHUSDT', '3m', 100.0, 50.0, 12.0), ('ETHUSDT', '15m', 101.0, 24.0, 50.0)], 2) == []
+    # 一个条件越过退出阈值后解除，再次全部满足时重新通知
+    assert engine.update([('ETHUSDT', '3m', 100.0, 50.0, 26.0)], 3) == []
+    assert engine.update([('ETHUSDT', '3m', 100.0, 50.0, 22.0)], 4) == []  # 回到滞回区间内不算进入
+    assert fired_names(engine.update([('ETHUSDT', '3m', 100.0, 50.0, 19.0)], 5)) == [('ETHUSDT', 'both_low')]
+
+
+def test_compound_missing_timeframe_does_not_fire():
+    engine = compound_engine()
+    # 15m 还没有数据（nan）：即使3m满足也不通知
+    assert engine.update([('ETHUSDT', '3m', 100.0, 50.0, 10.0)], 0) == []
+    assert engine.update([('ETHUSDT', '15m', 100.0, float('nan'), 50.0)], 1) == []
+    row = engine.rows['ETHUSDT']
+    assert not engine.active[row].any()
+
+
+def test_compound_recomputes_only_dependent_rules():
+    engine = compound_engine()
+    engine.update([('ETHUSDT', '3m', 100.0, 50.0, 50.0), ('ETHUSDT', '1h', 100.0, 50.0, 50.0)], 0)
+    assert engine.evaluations == 2
+    # 1m 不被任何规则使用
+    assert engine.update([('ETHUSDT', '1m', 100.0, 5.0, 5.0)], 1) == []
+    assert engine.evaluations == 2
+    # 15m 只影响 both_low
+    engine.update([('ETHUSDT', '15m', 100.0, 50.0, 50.0)], 2)
+    assert engine.evaluations == 3
+    # 指标未变化（只有价格变化）时跳过
+    engine.update([('ETHUSDT', '15m', 101.0, 50.0, 50.0), ('ETHUSDT', '1h', 99.0, 50.0, 50.0)], 3)
+    assert engine.evaluations == 3
+    # 同一批里两个周期都影响 both_low：只算一次；另一个品种单独计算
+    engine.update([('ETHUSDT', '3m', 100.0, 50.0, 40.0), ('ETHUSDT', '15m', 100.0, 40.0, 50.0),
+                   ('BTCUSDT', '3m', 100.0, 50.0, 40.0)], 4)
+    assert engine.evaluations == 5
+
+
+def test_compound_rules_of_different_sizes_group_correctly():
+    # reduceat 按规则合并：一个条件和三个条件的规则交错出现在同一批里
+    single = CompoundRule('single', [Condition('single', '3m', 'rsi', '<=', 20, 25)])
+    triple = CompoundRule('triple', [Condition('triple', '3m', 'rsi', '<=', 30, 35),
+                                     Condition('triple', '15m', 'rsi', '<=', 30, 35),
+                                     Condition('triple', '1h', 'rsi', '<=', 30, 35)])
+    engine = CompoundRuleEngine([single, triple])
+    rows = [(symbol, timeframe, 100.0, 50.0, rsi)
+            for symbol, values in (('AUSDT', (10, 10, 10)), ('BUSDT', (25, 10, 10)), ('CUSDT', (10, 40, 10)))
+            for timeframe, rsi in zip(('3m', '15m', '1h'), values)]
+    assert sorted(fired_names(engine.update(rows, 0))) == [
+        ('AUSDT', 'single'), ('AUSDT', 'triple'), ('BUSDT', 'triple'), ('CUSDT', 'single')]
+
+
+def test_compound_cooldown():
+    engine = compound_engine(cooldown=900)
+    low = [('ETHUSDT', '3m', 100.0, 50.0, 10.0), ('ETHUSDT', '15m', 100.0, 10.0, 50.0)]
+    assert len(engine.update(low, 0)) == 1
+    engine.update([('ETHUSDT', '3m', 100.0, 50.0, 30.0)], 100)
+    assert engine.update([('ETHUSDT', '3m', 100.0, 50.0, 11.0)], 200) == []
+    engine.update([('ETHUSDT', '3m', 100.0, 50.0, 30.0)], 900)
+    assert len(engine.update([('ETHUSDT', '3m', 100.0, 50.0, 12.0)], 1000)) == 1
+
+
+def test_compound_discard_and_deactivate():
+    engine = compound_engine(cooldown=900)
+    low = [('ETHUSDT', '3m', 100.0, 50.0, 10.0), ('ETHUSDT', '15m', 100.0, 10.0, 50.0)]
+    other = [('BTCUSDT', '3m', 100.0, 50.0, 10.0), ('BTCUSDT', '15m', 100.0, 10.0, 50.0)]
+    assert len(engine.update(low + other, 0)) == 2
+    row = engine.rows['ETHUSDT']
+
+    engine.discard(['ETHUSDT'])
+    assert sorted(engine.keys()) == [('BTCUSDT', '15m'), ('BTCUSDT', '3m')]
+    assert engine.free == [row]
+    # 删除后状态和冷却都重新开始，空出来的行给新品种复用
+    assert fired_names(engine.update([('SOLUSDT', '3m', 1.0, 50.0, 10.0), ('SOLUSDT', '15m', 1.0, 10.0, 50.0)],
+                                     1)) == [('SOLUSDT', 'both_low')]
+    assert engine.rows['SOLUSDT'] == row
+    assert len(engine.update(low, 2)) == 1
+
+    # 解除只清掉缓存值和依赖它的条件，冷却保留
+    engine.deactivate([('BTCUSDT', '15m')])
+    assert ('BTCUSDT', '15m') not in engine.keys()
+    assert engine.update([('BTCUSDT', '3m', 100.0, 50.0, 9.0)], 3) == []  # 15m 没有值
+    assert engine.update(other[1:], 4) == []  # 重新进入，但仍在冷却中
+    engine.deactivate([('BTCUSDT', '15m')])
+    assert len(engine.update(other[1:], 900)) == 1
+
+
+def test_compile_compound_rules():
+    config = MonitorConfig()
+    config.timeframes = ['3m', '15m']
+    config.compound_rules = [{'name': 'x', 'conditions': [
+        {'timeframe': '3m', 'indicator': 'rsi', 'op': '<=', 'threshold': 20},
+        {'timeframe': '15m', 'indicator': 'price_line', 'op': '>=', 'threshold': 80}]}]
+    rule, = compile_compound_rules(config)
+    assert [condition.exit for condition in rule.conditions] == [20 + config.alert_hysteresis,
+                                                                 80 - config.alert_hysteresis]
+    assert rule.timeframes() == ['3m', '15m']
+
+    for bad in ([{'name': 'x', 'conditions': []}],
+                [{'name': 'x', 'conditions': [{'timeframe': '1h', 'indicator': 'rsi', 'op': '<=', 'threshold': 20}]}],
+                [{'name': 'x', 'conditions': [{'timeframe': '3m', 'indicator': 'rsi', 'op': '<='}]}],
+                config.compound_rules * 2):
+        config.compound_rules = bad
+        with pytest.raises(ValueError):
+            compile_compound_rules(config)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""K线磁盘缓存，以及 CandleBufferStore 的载入和写回"""
+
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from candle_buffer import CandleBufferStore
+from candle_cache import SCHEMA, CandleCache
+from kline_parser import parse_klines
+from monitor_engine import MonitorConfig
+
+START = 1_700_000_040_000
+MINUTE_MS = 60 * 1000
+
+
+def kline_rows(start, count):
+    """REST接口的K线数组"""
+    return [[start + index * MINUTE_MS, '1', str(2 + index), '0.5', str(1 + index), '10',
+             start + (index + 1) * MINUTE_MS - 1, '0', 0, '0', '0', '0'] for index in range(count)]
+
+
+class BrokenCache:
+    """读写都失败的缓存"""
+
+    max_rows = 100
+
+    def load(self, symbol, timeframe, limit=None):
+        raise OSError("disk I/O error")
+
+    def save(self, symbol, timeframe, columns, max_rows=None):
+        raise OSError("database or disk is full")
+
+
+def test_cache_errors_go_to_on_log():
+    logs = []
+    store = CandleBufferStore(None, MonitorConfig(), cache=BrokenCache(),
+                              on_log=lambda text, color=None: logs.append((text, color)))
+    buffer = store.get('ETHUSDT', '1m')
+    buffer.apply_rest_klines(kline_rows(START, 5))
+    store.save('ETHUSDT', '1m')
+    assert logs == [("[ETHUSDT/1m] 读取K线缓存失败: disk I/O error", 'yellow'),
+                    ("[ETHUSDT/1m] 写入K线缓存失败: database or disk is full", 'yellow')]
+    # 写入失败不记为已保存，下次继续尝试
+    assert ('ETHUSDT', '1m') not in store.saved
+
+
+def columns(start, count):
+    return parse_klines(kline_rows(start, count))
+
+
+def test_save_trims_to_max_rows_and_append_does_not(tmp_path):
+    cache = CandleCache(str(tmp_path / 'candles.db'), max_rows=100)
+    try:
+        cache.save('ETHUSDT', '1m', columns(START, 150))
+        loaded = cache.load('ETHUSDT', '1m', limit=1000)
+        assert len(loaded) == 100
+        assert loaded.open_times[0] == START + 50 * MINUTE_MS
+        assert loaded.open_times[-1] == START + 149 * MINUTE_MS
+
+        # 同一开盘时间覆盖写入（上次保存时最后一根还没收盘）
+        update = columns(START + 149 * MINUTE_MS, 3)
+        update.closes[:] = 99.0
+        cache.save('ETHUSDT', '1m', update, max_rows=50)
+        loaded = cache.load('ETHUSDT', '1m', limit=1000)
+        assert len(loaded) == 50
+        assert loaded.open_times[-1] == START + 151 * MINUTE_MS
+        assert loaded.closes[-3:].tolist() == [99.0] * 3
+
+        # 裁剪只作用于写入的序列
+        cache.save('BTCUSDT', '1m', columns(START, 10))
+        assert len(cache.load('ETHUSDT', '1m', limit=1000)) == 50
+
+        cache.append('SOLUSDT', '1m', columns(START, 300))
+        assert len(cache.load('SOLUSDT', '1m', limit=1000)) == 300
+    finally:
+        cache.close()
+
+
+def test_failed_write_rolls_back(tmp_path):
+    cache = CandleCache(str(tmp_path / 'candles.db'), max_rows=100)
+    try:
+        cache.save('ETHUSDT', '1m', columns(START, 100))
+        bad = columns(START + 100 * MINUTE_MS, 20)
+        bad.closes[-1] = np.nan  # 写成NULL，最后一行违反 NOT NULL
+        with pytest.raises(sqlite3.IntegrityError):
+            cache.save('ETHUSDT', '1m', bad)
+
+        # 前19行和裁剪都没有生效，连接仍然可用
+        loaded = cache.load('ETHUSDT', '1m', limit=1000)
+        assert loaded.open_times.tolist() == [START + index * MINUTE_MS for index in range(100)]
+        cache.save('ETHUSDT', '1m', columns(START + 100 * MINUTE_MS, 1))
+        assert cache.load('ETHUSDT', '1m', limit=1000).open_times[-1] == START + 100 * MINUTE_MS
+    finally:
+        cache.close()
+
+
+def test_garbage_file_is_moved_aside(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    with open(path, 'wb') as f:
+        f.write(b'not a database' * 500)
+    cache = CandleCache(path)
+    try:
+        assert cache.load('ETHUSDT', '1m') is None
+        cache.save('ETHUSDT', '1m', columns(START, 5))
+        assert len(cache.load('ETHUSDT', '1m')) == 5
+    finally:
+        cache.close()
+    with open(path + '.corrupt', 'rb') as f:
+        assert f.read(14) == b'not a database'
+
+
+def test_failed_quick_check_is_moved_aside(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    # 建一个没有 NOT NULL 约束的同名表写入空值，再把表定义改回正式的 SCHEMA：
+    # 文件结构完好、能正常打开，但快速完整性检查不通过
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA.replace('NOT NULL', ''))
+    conn.execute("INSERT INTO candles VALUES ('ETHUSDT', '1m', ?, 1, 2, 0.5, NULL, 10)", (START,))
+    conn.execute('PRAGMA writable_schema = ON')
+    conn.execute("UPDATE sqlite_master SET sql = ? WHERE name = 'candles'", (SCHEMA.strip(),))
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA quick_check').fetchone()[0] != 'ok'
+    conn.close()
+
+    cache = CandleCache(path)
+    try:
+        assert cache.load('ETHUSDT', '1m') is None
+        assert cache.conn.execute('PRAGMA quick_check').fetchone()[0] == 'ok'
+    finally:
+        cache.close()
+    assert os.path.exists(path + '.corrupt')
+
+
+class RecordingClient:
+    """按给定K线应答并记录每次请求参数的API客户端"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def fetch_klines(self, symbol, timeframe, start_time=None, limit=None, as_columns=True,
+                     deadline=None, end_time=None):
+        self.calls.append((start_time, end_time, limit))
+        if start_time is None:
+            rows = self.rows[-limit:]
+        else:
+            rows = [row for row in self.rows if row[0] >= start_time][:limit]
+        return True, parse_klines(rows), None
+
+
+def test_warm_start_loads_cache_and_fetches_only_the_tail(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    config = MonitorConfig()
+    config.limit = 100
+    history = kline_rows(START, 103)
+
+    # 上一次运行：整段回补后写入缓存
+    client = RecordingClient(history[:100])
+    store = CandleBufferStore(client, config, cache=CandleCache(path))
+    assert store.refresh('ETHUSDT', '1m')[0]
+    assert client.calls == [(None, None, 100)]
+    store.close()
+
+    # 重新启动：缓冲区直接从缓存载入，只从最后已知开盘时间增量拉取一次
+    cache = CandleCache(path)
+    try:
+        client = RecordingClient(history)
+        store = CandleBufferStore(client, config, cache=cache)
+        buffer = store.get('ETHUSDT', '1m')
+        assert len(buffer) == 100
+        assert buffer.last_open_time == history[99][0]
+        assert client.calls == []
+
+        assert store.refresh('ETHUSDT', '1m')[0]
+        assert client.calls == [(history[99][0], None, config.incremental_limit)]
+        assert buffer.columns().open_times.tolist() == [row[0] for row in history[3:]]
+        # 新增的尾部写回了缓存
+        assert cache.load('ETHUSDT', '1m').open_times[-1] == history[-1][0]
+    finally:
+        cache.close()
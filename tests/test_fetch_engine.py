@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""KlineFetchEngine 的时间预算和超时请求"""
+
+import threading
+
+from fetch_engine import BUSY_ERROR, CYCLE_TIMEOUT_ERROR, KlineFetchEngine
+from resilience import Deadline
+
+
+class BlockingFetch:
+    """blocked 中的品种一直卡住，直到 release 被设置；记录同一品种的最大并发数"""
+
+    def __init__(self, blocked):
+        self.blocked = set(blocked)
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+        self.calls = []
+
+    def __call__(self, symbol, timeframe, deadline=None):
+        key = (symbol, timeframe)
+        with self.lock:
+            self.calls.append(key)
+            self.active[key] = self.active.get(key, 0) + 1
+            self.max_active[key] = max(self.max_active.get(key, 0), self.active[key])
+        try:
+            if symbol in self.blocked:
+                self.release.wait(5)
+            return True, key, None
+        finally:
+            with self.lock:
+                self.active[key] -= 1
+
+
+def run(engine, fetch, pairs, seconds):
+    return {(symbol, timeframe): error
+            for symbol, timeframe, _, _, error in engine.fetch_all(pairs, fetch_func=fetch,
+                                                                   deadline=Deadline(seconds))}
+
+
+def wait_idle(engine, timeout=2.0):
+    """等后台请求的完成回调都执行完"""
+    deadline = Deadline(timeout)
+    while engine.running and not deadline.expired():
+        threading.Event().wait(0.01)
+    return engine.running == {}
+
+
+def test_timed_out_request_is_not_sent_again_until_it_finishes():
+    engine = KlineFetchEngine(None, max_workers=4)
+    fetch = BlockingFetch(['SLOWUSDT'])
+    pairs = [('SLOWUSDT', '1m'), ('ETHUSDT', '1m')]
+    try:
+        first = run(engine, fetch, pairs, 0.1)
+        assert first == {('SLOWUSDT', '1m'): CYCLE_TIMEOUT_ERROR, ('ETHUSDT', '1m'): None}
+
+        # 超时的请求还在后台运行：下一轮跳过它，其它品种照常拉取
+        second = run(engine, fetch, pairs, 0.1)
+        assert second == {('SLOWUSDT', '1m'): BUSY_ERROR, ('ETHUSDT', '1m'): None}
+        assert fetch.calls.count(('SLOWUSDT', '1m')) == 1
+
+        # 后台请求结束后恢复拉取
+        fetch.release.set()
+        assert wait_idle(engine)
+        third = run(engine, fetch, pairs, 1)
+        assert third == {('SLOWUSDT', '1m'): None, ('ETHUSDT', '1m'): None}
+        assert fetch.max_active[('SLOWUSDT', '1m')] == 1
+        assert wait_idle(engine)
+    finally:
+        fetch.release.set()
+        engine.shutdown()
+
+
+def test_fast_requests_release_immediately():
+    engine = KlineFetchEngine(None, max_workers=2)
+    fetch = BlockingFetch([])
+    pairs = [(f"S{index}USDT", '1m') for index in range(20)]
+    try:
+        for _ in range(3):
+            assert set(run(engine, fetch, pairs, 5).values()) == {None}
+            assert wait_idle(engine)
+    finally:
+        engine.shutdown()
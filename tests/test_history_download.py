@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""历史K线批量下载（在本机端口0上启动 devtools/mock_exchange.py）"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from candle_cache import CandleCache
+from history_download import HistoryDownloader
+from kline_parser import columns_from_matrix
+from mock_exchange import MockExchange, MockMarket
+from monitor_engine import BinanceAPIClient, MonitorConfig
+
+MINUTE_MS = 60 * 1000
+
+
+@pytest.fixture
+def exchange():
+    server = MockExchange(('127.0.0.1', 0), MockMarket(['ETHUSDT'], history=5000, seed=5))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(exchange):
+    config = MonitorConfig()
+    config.base_url = exchange.base_url
+    client = BinanceAPIClient(config)
+    yield client
+    client.close()
+
+
+def read_range(cache, start, end):
+    """缓存中 [start, end] 的全部K线（开盘时间, OHLCV矩阵）"""
+    chunks = list(cache.iter_range('ETHUSDT', '1m', start, end))
+    open_times = np.concatenate([columns.open_times for columns in chunks])
+    values = np.concatenate([columns.values() for columns in chunks])
+    return open_times, values
+
+
+def test_paginated_range_is_stored_without_gaps_or_duplicates(exchange, client, tmp_path):
+    market = exchange.market
+    listed = int(market.klines('ETHUSDT', '1m', start_time=0, limit=1)[0][0])
+    # 从上线之前开始，跨过4页以上；缓存里事先有中间的一段（上次中断留下的）
+    start = listed - 30 * MINUTE_MS
+    end = listed + 3500 * MINUTE_MS
+    cache = CandleCache(str(tmp_path / 'history.db'))
+    existing = market.klines('ETHUSDT', '1m', start_time=listed + 1200 * MINUTE_MS, limit=300)
+    cache.append('ETHUSDT', '1m', columns_from_matrix(
+        np.array([row[0] for row in existing], dtype=np.int64), np.array([row[1:6] for row in existing])))
+
+    pages = []
+    downloader = HistoryDownloader(client, cache, max_workers=3, page_size=1000,
+                                   on_progress=lambda done, total, rows: pages.append(total))
+    try:
+        report = downloader.download([('ETHUSDT', '1m')], start, end)
+        assert report.failed == []
+        assert report.gaps == {}
+        # 上线之前不请求；已有的300根两侧各自分页
+        assert report.rows == 3501 - 300
+        assert pages[-1] == report.pages == 5
+
+        open_times, values = read_range(cache, start, end)
+        assert open_times.tolist() == list(range(listed, end + 1, MINUTE_MS))
+        expected = market.klines('ETHUSDT', '1m', start_time=listed, end_time=end, limit=5000)
+        assert values[:, 3] == pytest.approx([row[4] for row in expected], rel=1e-7)
+        assert values[:, 4] == pytest.approx([row[5] for row in expected], rel=1e-7)
+
+        # 再次运行没有缺口，不再请求
+        assert downloader.download([('ETHUSDT', '1m')], start, end).pages == 0
+        assert len(read_range(cache, start, end)[0]) == len(open_times)
+    finally:
+        cache.close()
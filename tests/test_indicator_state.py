@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""增量指标状态与 indicators 的批量计算一致
+
+按推送的方式逐根喂入：每根K线先有若干次未收盘的修订，最后一次修订才是收盘值。
+任一时刻的增量结果都应等于“已确认K线 + 当前这次修订”整段批量计算的最后一个值。
+"""
+
+import numpy as np
+import pytest
+
+from indicator_state import MonotonicWindow, PairIndicatorState
+from indicators import price_line, rolling_max, rolling_min, wilder_rsi
+
+OPEN_TIME = 1_700_000_040_000
+MINUTE_MS = 60 * 1000
+
+
+def batch_last(highs, lows, closes):
+    """批量计算的最新价格线和RSI（数据不足时为None）"""
+    line = price_line(highs, lows, closes)
+    rsi = wilder_rsi(closes)
+    return (float(line[-1]) if len(line) else None,
+            float(rsi[-1]) if len(rsi) else None)
+
+
+def revisions(rng, close, count):
+    """一根K线的 count 次推送 (high, low, close)，最后一次为收盘值"""
+    closes = close + np.cumsum(rng.normal(0, 0.3, count))
+    highs = np.maximum.accumulate(closes + rng.uniform(0, 0.2, count))
+    lows = np.minimum.accumulate(closes - rng.uniform(0, 0.2, count))
+    return list(zip(highs.tolist(), lows.tolist(), closes.tolist()))
+
+
+@pytest.mark.parametrize('window', [1, 2, 3, 33])
+def test_monotonic_window_peek_matches_rolling_extremes(window):
+    rng = np.random.default_rng(window)
+    values = np.round(rng.normal(0, 3, 200)).tolist()  # 取整制造相等的值
+    highs, lows = MonotonicWindow(window, is_max=True), MonotonicWindow(window, is_max=False)
+    expected_max = rolling_max(values, window, partial=True)
+    expected_min = rolling_min(values, window, partial=True)
+    for index, value in enumerate(values):
+        # 试算任意值都不改变状态，确认的值与整段计算一致
+        for trial in (value - 5, value + 5):
+            peeked = highs.peek(index, trial)
+            assert peeked == max(values[max(index - window + 1, 0):index] + [trial])
+            assert lows.peek(index, trial) == min(values[max(index - window + 1, 0):index] + [trial])
+        assert highs.peek(index, value) == expected_max[index]
+        assert lows.peek(index, value) == expected_min[index]
+        highs.push(index, value)
+        lows.push(index, value)
+
+
+def test_streamed_revisions_match_batch():
+    rng = np.random.default_rng(8)
+    state = PairIndicatorState()
+    highs, lows, closes = [], [], []
+    close = 100.0
+    for bar in range(80):
+        open_time = OPEN_TIME + bar * MINUTE_MS
+        pushes = revisions(rng, close, int(rng.integers(1, 6)))
+        for high, low, close in pushes:
+            result = state.update(open_time, high, low, close, closed=False)
+            assert result == batch_last(highs + [high], lows + [low], closes + [close])
+        high, low, close = pushes[-1]
+        result = state.update(open_time, high, low, close, closed=True)
+        highs.append(high)
+        lows.append(low)
+        closes.append(close)
+        assert result == batch_last(highs, lows, closes)
+    assert state.price_line is not None and state.rsi is not None
+
+
+def test_missing_close_push_commits_the_last_revision():
+    rng = np.random.default_rng(9)
+    state = PairIndicatorState()
+    highs, lows, closes = [], [], []
+    close = 100.0
+    for bar in range(60):
+        open_time = OPEN_TIME + bar * MINUTE_MS
+        pushes = revisions(rng, close, 3)
+        for high, low, close in pushes:
+            result = state.update(open_time, high, low, close, closed=False)
+        # 从不发送收盘推送：下一根K线的第一次推送确认这根的最后一次修订
+        highs.append(high)
+        lows.append(low)
+        closes.append(close)
+        assert result == batch_last(highs, lows, closes)
+    assert state.committed_open_time == OPEN_TIME + 58 * MINUTE_MS
+
+    state.update(OPEN_TIME + 60 * MINUTE_MS, close, close, close, closed=True)
+    assert state.committed_open_time == OPEN_TIME + 60 * MINUTE_MS
+    assert (state.price_line, state.rsi) == batch_last(highs + [close], lows + [close], closes + [close])
+
+
+def test_late_revision_of_committed_bar_is_ignored():
+    rng = np.random.default_rng(10)
+    bars = [revisions(rng, 100.0 + bar, 1)[0] for bar in range(50)]
+    state = PairIndicatorState()
+    for bar, (high, low, close) in enumerate(bars[:40]):
+        state.update(OPEN_TIME + bar * MINUTE_MS, high, low, close, closed=True)
+    high, low, close = bars[40]
+    pending = state.update(OPEN_TIME + 40 * MINUTE_MS, high, low, close, closed=False)
+
+    # 已确认K线的迟到推送（无论是否收盘）不改变结果
+    for bar in (39, 20):
+        for closed in (False, True):
+            assert state.update(OPEN_TIME + bar * MINUTE_MS, 500.0, 1.0, 250.0, closed=closed) == pending
+    assert state.committed_open_time == OPEN_TIME + 39 * MINUTE_MS
+
+    for bar, (high, low, close) in enumerate(bars[40:], start=40):
+        result = state.update(OPEN_TIME + bar * MINUTE_MS, high, low, close, closed=True)
+    highs, lows, closes = (list(values) for values in zip(*bars))
+    assert result == batch_last(highs, lows, closes)
+
+
+def test_seed_matches_streaming():
+    rng = np.random.default_rng(11)
+    bars = [revisions(rng, 100.0 + bar * 0.1, 1)[0] for bar in range(70)]
+    highs, lows, closes = (np.array(values) for values in zip(*bars))
+    open_times = OPEN_TIME + np.arange(70, dtype=np.int64) * MINUTE_MS
+    state = PairIndicatorState()
+    assert state.seed(open_times, highs, lows, closes) == batch_last(highs, lows, closes)
+    # 最后一根视为正在形成，之后的修订仍可替换它
+    assert state.committed_open_time == int(open_times[-2])
+    revised = state.update(int(open_times[-1]), highs[-1] + 1, lows[-1], closes[-1] + 1)
+    assert revised == batch_last(np.r_[highs[:-1], highs[-1] + 1], lows, np.r_[closes[:-1], closes[-1] + 1])
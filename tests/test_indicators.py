@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""指标内核与原来逐位置切片的实现一致
+
+参照实现照搬向量化之前 PriceLineCalculator / RSICalculator 的写法：
+每个位置对窗口切片取 max/min，递推指标用Python循环。
+"""
+
+import numpy as np
+import pytest
+
+from indicators import price_line, rolling_max, rolling_min, wilder_rsi
+
+LENGTHS = [1, 2, 5, 32, 33, 34, 65, 100, 101, 257]
+WINDOWS = [1, 2, 3, 7, 33, 64, 300]
+
+
+def slice_extreme(values, window, extreme, partial):
+    """原实现：extreme(values[i-window+1:i+1])"""
+    result = []
+    for i in range(len(values)):
+        if i < window - 1:
+            if partial:
+                result.append(extreme(values[0:i + 1]))
+        else:
+            result.append(extreme(values[i - window + 1:i + 1]))
+    return result
+
+
+def slice_price_line(highs, lows, closes, hhv_period=33, sma_period=8, hhv_a_period=3):
+    """原 calculate_price_line 的完整序列"""
+    rsv_values = []
+    for i in range(hhv_period - 1, len(closes)):
+        var1 = max(highs[i - hhv_period + 1:i + 1])
+        var2 = min(lows[i - hhv_period + 1:i + 1])
+        rsv_values.append(0 if var1 - var2 == 0 else (closes[i] - var2) / (var1 - var2))
+
+    sma_values = []
+    if rsv_values:
+        sma = rsv_values[0]
+        for x in rsv_values:
+            sma = (1 * x + (sma_period - 1) * sma) / sma_period
+            sma_values.append(sma)
+    a_values = [x * 100 for x in sma_values]
+    return slice_extreme(a_values, hhv_a_period, max, partial=True)
+
+
+def slice_rsi(closes, period=6):
+    """原 calculate_rsi 的最后一个值"""
+    deltas = np.diff(closes)
+    gains = np.where(deltas > 0, deltas, 0)
+    losses = np.where(deltas < 0, -deltas, 0)
+    avg_gain = np.mean(gains[:period])
+    avg_loss = np.mean(losses[:period])
+    for i in range(period, len(gains)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+    if avg_loss == 0:
+        return 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def random_candles(rng, length, pairs=None):
+    """随机K线；价格取整到0.5，制造相等的极值和零区间"""
+    shape = (length,) if pairs is None else (pairs, length)
+    closes = np.round(100 + np.cumsum(rng.normal(0, 1, shape), axis=-1) * 2) / 2
+    highs = closes + np.round(rng.uniform(0, 2, shape) * 2) / 2
+    lows = closes - np.round(rng.uniform(0, 2, shape) * 2) / 2
+    if length > 40:
+        # 一段完全横盘：HHV == LLV，RSV取0
+        flat = (..., slice(length // 3, length // 3 + 35))
+        closes[flat] = highs[flat] = lows[flat] = 100.0
+    return highs, lows, closes
+
+
+@pytest.mark.parametrize('partial', [False, True])
+@pytest.mark.parametrize('window', WINDOWS)
+def test_rolling_extremes_match_slices(window, partial):
+    rng = np.random.default_rng(window)
+    for length in LENGTHS:
+        values = np.round(rng.normal(0, 3, (4, length)))
+        highs = rolling_max(values, window, partial=partial)
+        lows = rolling_min(values, window, partial=partial)
+        expected_width = length if partial else max(length - window + 1, 0)
+        assert highs.shape == lows.shape == (4, expected_width)
+        for row, high_row, low_row in zip(values.tolist(), highs, lows):
+            # 一维输入与二维的每一行一致
+            np.testing.assert_array_equal(rolling_max(row, window, partial=partial), high_row)
+            np.testing.assert_array_equal(rolling_min(row, window, partial=partial), low_row)
+            np.testing.assert_array_equal(high_row, slice_extreme(row, window, max, partial))
+            np.testing.assert_array_equal(low_row, slice_extreme(row, window, min, partial))
+
+
+def test_rolling_extremes_of_empty_input():
+    assert rolling_max([], 3).shape == (0,)
+    assert rolling_min(np.empty((2, 0)), 3, partial=True).shape == (2, 0)
+
+
+@pytest.mark.parametrize('length', [32, 33, 34, 40, 41, 99, 100, 250])
+def test_price_line_matches_slices(length):
+    rng = np.random.default_rng(length)
+    highs, lows, closes = random_candles(rng, length, pairs=3)
+    batch = price_line(highs, lows, closes)
+    assert batch.shape == (3, max(length - 32, 0))
+    for row in range(3):
+        args = highs[row].tolist(), lows[row].tolist(), closes[row].tolist()
+        expected = slice_price_line(*args)
+        np.testing.assert_array_equal(price_line(*args), expected)
+        np.testing.assert_array_equal(batch[row], expected)
+
+
+def test_price_line_with_short_windows():
+    rng = np.random.default_rng(5)
+    highs, lows, closes = random_candles(rng, 50)
+    args = highs.tolist(), lows.tolist(), closes.tolist()
+    for periods in [(1, 1, 1), (5, 3, 7), (50, 8, 3), (51, 8, 3)]:
+        np.testing.assert_array_equal(price_line(*args, *periods), slice_price_line(*args, *periods))
+
+
+@pytest.mark.parametrize('length', [7, 8, 20, 101])
+def test_wilder_rsi_last_value_matches(length):
+    rng = np.random.default_rng(length)
+    _, _, closes = random_candles(rng, length, pairs=3)
+    batch = wilder_rsi(closes)
+    for row in range(3):
+        assert batch[row, -1] == slice_rsi(closes[row].tolist())
+        assert wilder_rsi(closes[row])[-1] == slice_rsi(closes[row].tolist())
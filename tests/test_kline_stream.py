@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""K线推送客户端
+
+端到端用例在本机端口0上启动 devtools 的替身：ws_replay_server 回放推送，
+mock_exchange 提供REST回补和断线后的缺口修复。
+"""
+
+import json
+import threading
+
+import pytest
+
+from candle_buffer import CandleBufferStore
+from kline_stream import KlineStreamClient
+from mock_exchange import MockExchange, MockMarket
+from monitor_engine import BinanceAPIClient, MonitorConfig
+from resilience import Deadline
+from ws_replay_server import ReplayServer
+
+OPEN_TIME = 1_700_000_040_000
+MINUTE_MS = 60 * 1000
+
+
+def kline_message(open_time, close, closed, symbol='ETHUSDT', timeframe='1m'):
+    """组合流格式的一条K线推送"""
+    event = {'e': 'kline', 's': symbol, 'k': {
+        't': open_time, 'i': timeframe, 'o': '100.0', 'h': '101.0', 'l': '99.0',
+        'c': str(close), 'v': '12.5', 'x': closed}}
+    return json.dumps({'stream': f"{symbol.lower()}@kline_{timeframe}", 'data': event})
+
+
+def make_client(pairs=(('ETHUSDT', '1m'),), config=None):
+    config = config or MonitorConfig()
+    updates = []
+    store = CandleBufferStore(None, config)
+    client = KlineStreamClient(store, config, pairs,
+                               lambda symbol, timeframe, buffer, is_closed, candle:
+                               updates.append((symbol, timeframe, is_closed, candle)))
+    return client, updates
+
+
+def test_closing_push_is_reported_even_if_unchanged():
+    client, updates = make_client()
+    client._on_message(None, kline_message(OPEN_TIME, 100.5, False))
+    # 收盘推送与上一次未收盘推送的数值完全相同
+    client._on_message(None, kline_message(OPEN_TIME, 100.5, True))
+
+    candle = (OPEN_TIME, 101.0, 99.0, 100.5)
+    assert updates == [('ETHUSDT', '1m', False, candle), ('ETHUSDT', '1m', True, candle)]
+
+
+def test_unchanged_forming_push_is_skipped():
+    client, updates = make_client()
+    client._on_message(None, kline_message(OPEN_TIME, 100.5, False))
+    client._on_message(None, kline_message(OPEN_TIME, 100.5, False))
+    client._on_message(None, kline_message(OPEN_TIME, 100.5, False, symbol='BTCUSDT'))
+    assert len(updates) == 1
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def market_klines(market, count):
+    """模拟行情当前可见的最后 count 根1m K线，数值格式与REST接口相同"""
+    return [(open_time,) + tuple(float(f"{value:.8f}") for value in (o, h, l, c, v)) + (closed,)
+            for open_time, o, h, l, c, v, closed in market.klines('ETHUSDT', '1m', limit=count)]
+
+
+def stream_event(row):
+    open_time, o, h, l, c, v, closed = row
+    return {'e': 'kline', 's': 'ETHUSDT', 'k': {
+        't': open_time, 'i': '1m', 'o': f"{o:.8f}", 'h': f"{h:.8f}", 'l': f"{l:.8f}",
+        'c': f"{c:.8f}", 'v': f"{v:.8f}", 'x': closed}}
+
+
+def test_stream_updates_buffer_and_repairs_gap_after_disconnect():
+    start = OPEN_TIME + 30 * 1000  # 第一根K线开盘30秒后
+    end = start + 15 * MINUTE_MS
+    clock = [start / 1000]
+    market = MockMarket(['ETHUSDT'], history=200, seed=3, clock=lambda: clock[0])
+    config = MonitorConfig()
+    config.limit = 100
+    config.incremental_limit = 10
+    market.klines('ETHUSDT', '1m')
+    clock[0] = end / 1000
+    final = market_klines(market, config.limit)
+    clock[0] = start / 1000
+
+    # 推送前三根K线（第一根是回补时的未收盘K线）的收盘，发送5条后断开；
+    # 之后的13根只能靠重连后的REST缺口修复补上（超过一次增量拉取的条数，需要翻页）
+    streamed = [row for row in final if OPEN_TIME <= row[0] < OPEN_TIME + 3 * MINUTE_MS]
+    messages = [('ethusdt@kline_1m', stream_event(row[:6] + (False,))) for row in streamed[1:]]
+    messages += [('ethusdt@kline_1m', stream_event(row)) for row in streamed]
+    messages.sort(key=lambda item: (item[1]['k']['t'], item[1]['k']['x']))
+    exchange = serve(MockExchange(('127.0.0.1', 0), market))
+    replay = serve(ReplayServer(('127.0.0.1', 0), messages, interval=0.01, drop_after=5))
+    config.base_url = exchange.base_url
+    config.stream_url = replay.url
+
+    updates = []
+
+    def on_update(symbol, timeframe, buffer, is_closed, candle):
+        updates.append((is_closed, candle))
+        if candle is not None:
+            clock[0] = end / 1000  # 推送开始后行情继续走，断线期间的K线只在REST上
+
+    api_client = BinanceAPIClient(config)
+    store = CandleBufferStore(api_client, config)
+    client = KlineStreamClient(store, config, [('ETHUSDT', '1m')], on_update)
+    buffer = store.get('ETHUSDT', '1m')
+    try:
+        client.start()
+        deadline = Deadline(10)
+        while buffer.last_open_time != final[-1][0] and not deadline.expired():
+            threading.Event().wait(0.05)
+    finally:
+        client.stop()
+        exchange.shutdown()
+        replay.shutdown()
+        api_client.close()
+
+    # 推送的收盘K线逐根写入了缓冲区
+    pushed = [candle for is_closed, candle in updates if candle is not None]
+    assert [candle[0] for candle in pushed][:5] == [OPEN_TIME, OPEN_TIME + MINUTE_MS, OPEN_TIME + MINUTE_MS,
+                                                     OPEN_TIME + 2 * MINUTE_MS, OPEN_TIME + 2 * MINUTE_MS]
+    assert client.reconnect_count >= 1
+
+    # 重连后补齐缺口：连续、无重复，数值与交易所一致
+    columns = buffer.columns()
+    open_times = columns.open_times.tolist()
+    assert len(open_times) == config.limit
+    assert open_times == [row[0] for row in final]
+    assert columns.closes.tolist() == pytest.approx([row[4] for row in final], rel=1e-12)
+    assert columns.highs.tolist() == pytest.approx([row[2] for row in final], rel=1e-12)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""MonitorEngine 运行中更换品种"""
+
+import threading
+import time
+
+import monitor_engine
+from candle_cache import CandleCache
+from monitor_engine import MonitorConfig, MonitorEngine
+from scheduler import FakeClock, PollScheduler
+from screener import ScreenReport, ScreenRow
+
+
+class FakeStreamClient:
+    """记录订阅的推送客户端替身"""
+
+    instances = []
+
+    def __init__(self, buffer_store, config, pairs, on_update, on_log=None, fetch_engine=None):
+        self.pairs = list(pairs)
+        self.running = False
+        FakeStreamClient.instances.append(self)
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+def make_engine(data_source, symbols, compound_rules=None, cache_path=None, **kwargs):
+    config = MonitorConfig()
+    config.cache_path = cache_path
+    config.symbols = list(symbols)
+    config.timeframes = ['1m', '15m']
+    config.data_source = data_source
+    config.metrics_enabled = False
+    config.compound_rules = compound_rules
+    engine = MonitorEngine(config, **kwargs)
+    engine.setup()
+    return engine
+
+
+def test_stream_restarts_after_symbols_were_emptied(monkeypatch):
+    monkeypatch.setattr(monitor_engine, 'KlineStreamClient', FakeStreamClient)
+    FakeStreamClient.instances = []
+    engine = make_engine('stream', ['ETHUSDT'])
+    engine._start_stream()
+
+    engine.update_symbols([])
+    assert engine.stream_client is None
+    assert not FakeStreamClient.instances[0].running
+
+    engine.update_symbols(['BTCUSDT'])
+    assert engine.stream_client is FakeStreamClient.instances[-1]
+    assert engine.stream_client.running
+    assert engine.stream_client.pairs == [('BTCUSDT', '1m'), ('BTCUSDT', '15m')]
+
+    engine.update_symbols(['BTCUSDT', 'SOLUSDT'])
+    assert [client.running for client in FakeStreamClient.instances] == [False, False, True]
+    assert len(engine.stream_client.pairs) == 4
+
+
+def test_rest_reschedules_after_symbols_were_emptied():
+    engine = make_engine('rest', ['ETHUSDT'])
+    engine.scheduler = PollScheduler(engine.config, clock=FakeClock(1_700_000_000))
+    engine.sources = engine.buffer_store.plan(engine.pairs())
+    engine.scheduler.set_series(list(engine.sources))
+
+    engine.update_symbols([])
+    assert engine.sources == {}
+    assert engine.scheduler.seconds_until_due() is None
+
+    engine.update_symbols(['BTCUSDT'])
+    assert set(engine.sources) == {('BTCUSDT', '1m')}
+    assert engine.scheduler.pop_due() == [('BTCUSDT', '1m')]
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b'[]'
+
+
+class FakeSession:
+    """按顺序返回给定状态码的会话替身"""
+
+    def __init__(self, *status_codes):
+        self.status_codes = list(status_codes)
+
+    def get(self, url, params=None, timeout=None):
+        return FakeResponse(self.status_codes.pop(0), {'Retry-After': '30'})
+
+    def close(self):
+        pass
+
+
+def test_rate_limit_does_not_trip_breakers():
+    engine = make_engine('rest', ['ETHUSDT', 'BTCUSDT'])
+    engine.api_client.session = FakeSession(429)
+    success, _, error = engine.api_client.fetch_klines('ETHUSDT', '1m')
+    assert not success
+    # 封禁期内的其它请求直接推迟
+    deferred = engine.api_client.fetch_klines('BTCUSDT', '1m')[2]
+
+    threshold = engine.config.breaker_failure_threshold
+    for _ in range(threshold + 2):
+        engine.record_result(('ETHUSDT', '1m'), False, error)
+        engine.record_result(('BTCUSDT', '1m'), False, deferred)
+    assert engine.breaker.open_keys() == []
+
+
+def test_pair_failures_trip_breaker():
+    engine = make_engine('rest', ['ETHUSDT'])
+    engine.api_client.session = FakeSession(400)
+    error = engine.api_client.fetch_klines('ETHUSDT', '1m')[2]
+    for _ in range(engine.config.breaker_failure_threshold):
+        engine.record_result(('ETHUSDT', '1m'), False, error)
+    assert engine.breaker.open_keys() == [('ETHUSDT', '1m')]
+
+
+class FakeScreener:
+    """依次返回给定排名的筛选替身"""
+
+    def __init__(self, *tops):
+        self.tops = list(tops)
+
+    def sweep(self, deadline, should_stop=None):
+        report = ScreenReport()
+        report.top = self.tops.pop(0)
+        return report
+
+
+def test_pair_leaving_the_screen_alerts_again_when_it_returns():
+    clock = FakeClock(1_700_000_000)
+    alerts = []
+    compound = [{'name': 'both_low', 'conditions': [
+        {'timeframe': '1m', 'indicator': 'rsi', 'op': '<=', 'threshold': 20},
+        {'timeframe': '15m', 'indicator': 'rsi', 'op': '<=', 'threshold': 20}]}]
+    engine = make_engine('rest', ['ETHUSDT'], compound_rules=compound, clock=clock.time,
+                         on_alert=lambda symbol, timeframe, *args: alerts.append((symbol, timeframe)))
+    low_1m = ScreenRow('ETHUSDT', '1m', 100.0, 50.0, 10.0, 1.0)
+    low_15m = ScreenRow('ETHUSDT', '15m', 100.0, 50.0, 10.0, 1.0)
+    other = ScreenRow('BTCUSDT', '1m', 100.0, 50.0, 50.0, 0.0)
+    engine.screener = FakeScreener([low_1m, low_15m], [other], [low_1m, low_15m], [other], [low_1m, low_15m])
+
+    engine.run_screen()
+    assert alerts == [('ETHUSDT', '1m'), ('ETHUSDT', '15m'), ('ETHUSDT', '1m+15m')]
+
+    # 退出排名期间不再计算；冷却结束后再次进入排名并处于告警区间时重新通知
+    engine.run_screen()
+    clock.advance(engine.config.alert_cooldown)
+    alerts.clear()
+    engine.run_screen()
+    assert alerts == [('ETHUSDT', '1m'), ('ETHUSDT', '15m'), ('ETHUSDT', '1m+15m')]
+
+    # 冷却仍然限制很快的重新进入
+    engine.run_screen()
+    clock.advance(60)
+    alerts.clear()
+    engine.run_screen()
+    assert alerts == []
+
+
+def kline_rows(count, start=1_700_000_040_000):
+    return [[start + index * 60000, '1', '2', '0.5', str(1 + index), '10', 0, '0', 0, '0', '0', '0']
+            for index in range(count)]
+
+
+def test_stop_waits_for_running_work_before_closing_cache(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    engine = make_engine('rest', ['ETHUSDT'], cache_path=path)
+    store = engine.buffer_store
+    started = threading.Event()
+
+    def slow_refresh(symbol, timeframe):
+        # 与 CandleBufferStore.refresh 相同：写入缓冲区后保存
+        started.set()
+        time.sleep(0.3)
+        store.get(symbol, timeframe).apply_rest_klines(kline_rows(50))
+        store.save(symbol, timeframe)
+        return True, None, None
+
+    # 监控线程正在等一个进行中的请求
+    engine.monitor_thread = threading.Thread(
+        target=lambda: list(engine.fetch_engine.fetch_all([('ETHUSDT', '1m')], fetch_func=slow_refresh)))
+    engine.monitor_thread.start()
+    assert started.wait(2)
+    # 推送线程收盘时保存的缓冲区
+    store.get('ETHUSDT', '15m').apply_rest_klines(kline_rows(3))
+
+    engine.stop()
+    assert not engine.monitor_thread.is_alive()
+    assert engine.fetch_engine.running == {}
+    assert store.cache is None
+    # 停止后迟到的保存不会用到已关闭的连接
+    store.get('ETHUSDT', '15m').apply_kline(1_700_000_040_000 + 3 * 60000, 1, 2, 0.5, 1.5, 10)
+    store.save('ETHUSDT', '15m')
+
+    cache = CandleCache(path)
+    try:
+        assert len(cache.load('ETHUSDT', '1m')) == 50
+        assert len(cache.load('ETHUSDT', '15m')) == 3
+    finally:
+        cache.close()
+
+
+def test_stop_gives_up_on_stuck_work_after_timeout(tmp_path):
+    engine = make_engine('rest', ['ETHUSDT'], cache_path=str(tmp_path / 'candles.db'))
+    release = threading.Event()
+
+    def stuck(symbol, timeframe):
+        release.wait(5)
+        engine.buffer_store.save(symbol, timeframe)
+        return True, None, None
+
+    worker = threading.Thread(
+        target=lambda: list(engine.fetch_engine.fetch_all([('ETHUSDT', '1m')], fetch_func=stuck)))
+    worker.start()
+    engine.monitor_thread = worker
+    started = time.monotonic()
+    engine.stop(timeout=0.2)
+    assert time.monotonic() - started < 1
+    assert engine.buffer_store.cache is None
+    release.set()
+    worker.join(2)
+    assert not worker.is_alive()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""参数扫描的告警计数与实盘告警规则一致"""
+
+import numpy as np
+import pytest
+
+from alert_rules import AlertRuleEngine, default_rules
+from kline_parser import KlineColumns
+from monitor_engine import MonitorConfig
+from optimizer import evaluate_thresholds, family_series, optimize
+
+FAMILY = (33, 8, 3, 6)
+THRESHOLDS = [(23.0, 75.0, 23.0, 75.0), (15.0, 85.0, 20.0, 80.0), (30.0, 70.0, 30.0, 70.0)]
+
+
+def make_series(count, seed=11, interval_ms=3 * 60 * 1000):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, count)))
+    opens = np.r_[closes[0], closes[:-1]]
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0, 0.002, count))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0, 0.002, count))
+    open_times = 1_700_000_000_000 - 1_700_000_000_000 % interval_ms + np.arange(count, dtype=np.int64) * interval_ms
+    return KlineColumns(open_times, opens, highs, lows, closes, rng.uniform(1, 10, count))
+
+
+def engine_alerts(aligned, threshold, hysteresis, cooldown, edge_only):
+    """用实盘的规则引擎逐根计算，返回每根K线是否告警（任一规则通知）和方向"""
+    config = MonitorConfig()
+    config.price_line_low, config.price_line_high, config.rsi_low, config.rsi_high = threshold
+    config.alert_hysteresis = hysteresis
+    config.alert_cooldown = cooldown
+    config.alert_edge_only = edge_only
+    engine = AlertRuleEngine(default_rules(config))
+    low_rules = np.array([rule.op == '<=' for rule in engine.rules])
+    alerts, directions = [], []
+    for price_line, rsi, _, times in aligned:
+        for value_pl, value_rsi, now in zip(price_line, rsi, times):
+            _, fired = engine.evaluate([('ETHUSDT', '3m')], [[value_pl, value_rsi]], now)
+            low, high = fired[0][low_rules].any(), fired[0][~low_rules].any()
+            alerts.append(low or high)
+            directions.append(int(low) - int(high))
+    return np.array(alerts), np.array(directions)
+
+
+@pytest.mark.parametrize('hysteresis, cooldown, edge_only', [
+    (5.0, 900.0, True), (5.0, 0.0, True), (0.0, 0.0, True), (3.0, 1800.0, False), (2.0, 0.0, False)])
+def test_alert_counts_match_rule_engine(hysteresis, cooldown, edge_only):
+    aligned = family_series([make_series(3000)], FAMILY, horizon=10)
+    totals = evaluate_thresholds(aligned, THRESHOLDS, hysteresis, cooldown, edge_only)
+    forward = aligned[0][2]
+    for threshold, row in zip(THRESHOLDS, totals):
+        alerts, directions = engine_alerts(aligned, threshold, hysteresis, cooldown, edge_only)
+        counted = (directions != 0) & ~np.isnan(forward)
+        signed = np.where(counted, np.nan_to_num(forward) * directions, 0.0)
+        assert row[0] == alerts.sum()
+        assert row[1] == len(forward)
+        assert row[2] == counted.sum()
+        assert row[3] == pytest.approx(signed.sum(), rel=1e-12, abs=1e-15)
+
+
+def test_entry_edges_are_far_fewer_than_bars_in_alert():
+    aligned = family_series([make_series(3000)], FAMILY, horizon=10)
+    bars = evaluate_thresholds(aligned, THRESHOLDS, 0.0, 0.0, edge_only=False)[:, 0]
+    entries = evaluate_thresholds(aligned, THRESHOLDS, 5.0, 900.0)[:, 0]
+    assert (entries > 0).all()
+    assert (entries * 3 < bars).all()
+
+
+def test_optimize_passes_alert_settings_to_workers():
+    series = [make_series(1500, seed=seed) for seed in (1, 2)]
+    alerts = {'hysteresis': 5.0, 'cooldown': 900.0, 'edge_only': True}
+    single = optimize(series, [FAMILY], THRESHOLDS, workers=1, alerts=alerts)
+    pooled = optimize(series, [FAMILY], THRESHOLDS, workers=2, alerts=alerts)
+    np.testing.assert_array_equal(single, pooled)
+    aligned = family_series(series, FAMILY, 10)
+    assert single[:, 8].tolist() == evaluate_thresholds(aligned, THRESHOLDS, **alerts)[:, 0].tolist()
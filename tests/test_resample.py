@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""本地聚合的K线与原生K线一致
+
+原生K线按币安的规则由同一份1m数据逐根累加得到：开盘时间对齐到周期的整数倍，
+开盘价取第一根、收盘价取最后一根、最高/最低取极值、成交量求和；
+最后一个分桶只包含已经开盘的1m K线（即交易所返回的未收盘K线）。
+"""
+
+import numpy as np
+import pytest
+
+from candle_buffer import CandleBuffer
+from resample import TIMEFRAME_MS, ResampledSeries, resample_columns
+
+MINUTE_MS = 60 * 1000
+ALIGNED_START = 1_700_000_100_000 - 1_700_000_100_000 % (24 * 60 * MINUTE_MS)  # UTC 0点
+
+
+def make_minutes(start, count, seed=7):
+    """固定的1m K线 [(open_time, open, high, low, close, volume), ...]"""
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 0.5, count))
+    opens = np.r_[100.0, closes[:-1]]
+    spread = rng.uniform(0, 0.4, (count, 2))
+    highs = np.maximum(opens, closes) + spread[:, 0]
+    lows = np.minimum(opens, closes) - spread[:, 1]
+    volumes = rng.uniform(1, 10, count)
+    return [(start + index * MINUTE_MS, float(opens[index]), float(highs[index]), float(lows[index]),
+             float(closes[index]), float(volumes[index])) for index in range(count)]
+
+
+def native_klines(minutes, interval_ms):
+    """逐根累加出原生K线（包含开头不完整的分桶）"""
+    klines = []
+    for open_time, open_price, high, low, close, volume in minutes:
+        bucket = open_time - open_time % interval_ms
+        if klines and klines[-1][0] == bucket:
+            _, first_open, bucket_high, bucket_low, _, bucket_volume = klines[-1]
+            klines[-1] = (bucket, first_open, max(bucket_high, high), min(bucket_low, low), close,
+                          bucket_volume + volume)
+        else:
+            klines.append((bucket, open_price, high, low, close, volume))
+    return klines
+
+
+def as_columns(minutes):
+    return [np.array(column) for column in zip(*minutes)]
+
+
+def as_rows(columns):
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def assert_klines_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got[0] == want[0]
+        assert got[1:] == pytest.approx(want[1:], rel=1e-12)
+
+
+@pytest.mark.parametrize('timeframe', ['3m', '5m', '15m'])
+def test_aligned_columns_match_native(timeframe):
+    minutes = make_minutes(ALIGNED_START, 600)
+    result = resample_columns(*as_columns(minutes), TIMEFRAME_MS[timeframe])
+    assert_klines_equal(as_rows(result), native_klines(minutes, TIMEFRAME_MS[timeframe]))
+
+
+@pytest.mark.parametrize('timeframe', ['3m', '5m', '15m'])
+def test_unaligned_leading_bucket_is_dropped(timeframe):
+    interval_ms = TIMEFRAME_MS[timeframe]
+    history = make_minutes(ALIGNED_START, 600)
+    # 缓冲区从某个分桶中间开始：这个分桶的原生K线包含缓冲区之前的数据，必须丢弃
+    offset = interval_ms // MINUTE_MS - 1
+    window = history[60 + offset:]
+    native = [kline for kline in native_klines(history, interval_ms) if kline[0] >= window[0][0]]
+
+    result = as_rows(resample_columns(*as_columns(window), interval_ms))
+    assert result[0][0] % interval_ms == 0
+    assert result[0][0] > window[0][0]
+    assert_klines_equal(result, native)
+
+
+def test_window_shorter_than_one_bucket_is_empty():
+    window = make_minutes(ALIGNED_START + 3 * MINUTE_MS, 10)  # 15m 分桶中间的10根
+    columns = resample_columns(*as_columns(window), TIMEFRAME_MS['15m'])
+    assert [len(column) for column in columns] == [0] * 6
+
+
+@pytest.mark.parametrize('timeframe', ['3m', '5m', '15m'])
+def test_forming_last_bucket_matches_open_kline(timeframe):
+    interval_ms = TIMEFRAME_MS[timeframe]
+    factor = interval_ms // MINUTE_MS
+    # 最后一个分桶只开盘了一部分（对 3m/5m/15m 都不是整桶）
+    minutes = make_minutes(ALIGNED_START, 40 * factor + factor - 1)
+    result = as_rows(resample_columns(*as_columns(minutes), interval_ms))
+    native = native_klines(minutes, interval_ms)
+
+    assert_klines_equal(result, native)
+    last = result[-1]
+    assert last[0] == minutes[-1][0] - minutes[-1][0] % interval_ms
+    assert last[4] == minutes[-1][4]  # 收盘价即最新一根1m的收盘价
+
+
+@pytest.mark.parametrize('timeframe', ['3m', '5m', '15m'])
+def test_series_rebuilds_on_incremental_refresh(timeframe):
+    interval_ms = TIMEFRAME_MS[timeframe]
+    max_size = 300
+    limit = 30
+    minutes = make_minutes(ALIGNED_START, 900)
+    base = CandleBuffer('ETHUSDT', '1m', max_size=max_size)
+    series = ResampledSeries(base, timeframe, limit)
+
+    def expected(count, forming=None):
+        history = minutes[:count] if forming is None else minutes[:count - 1] + [forming]
+        window = history[-max_size:]
+        native = [kline for kline in native_klines(history, interval_ms)
+                  if kline[0] >= window[0][0] and kline[0] % interval_ms == 0
+                  and (window[0][0] % interval_ms == 0 or kline[0] > window[0][0])]
+        return native[-limit:]
+
+    def check(count, forming=None):
+        len(series)  # 触发重新聚合
+        assert series.version == base.version
+        assert_klines_equal(as_rows(series.columns), expected(count, forming))
+
+    # 首次整段回补
+    base.apply_rest_klines(_rest_rows(minutes[:max_size]))
+    check(max_size)
+
+    # 每次增量拉取：第一根是原地替换的未收盘K线，其后追加；缓冲区滑动后开头不再对齐
+    count = max_size
+    for step in (1, 2, 7, 1, 13, 4):
+        version = base.version
+        new = minutes[count - 1:count + step]
+        count += step
+        base.apply_rest_klines(_rest_rows(new))
+        assert base.version != version
+        assert series.last_open_time == expected(count)[-1][0]
+        highs, lows, closes = series.snapshot()
+        want = expected(count)
+        assert closes.tolist() == pytest.approx([kline[4] for kline in want], rel=1e-12)
+        assert highs.tolist() == pytest.approx([kline[2] for kline in want], rel=1e-12)
+        assert lows.tolist() == pytest.approx([kline[3] for kline in want], rel=1e-12)
+        check(count)
+
+    # 推送的未收盘1m更新只改变最后一个分桶
+    open_time, open_price, high, low, close, volume = minutes[count - 1]
+    forming = (open_time, open_price, high + 1.5, low, close + 1.0, volume + 3.0)
+    version = series.version
+    assert base.apply_kline(*forming)
+    assert len(series) == len(expected(count, forming))
+    assert series.version != version
+    check(count, forming)
+
+    # 缓冲区版本不变时不重新聚合
+    columns = series.columns
+    series.snapshot()
+    assert series.columns is columns
+
+
+def _rest_rows(minutes):
+    """REST接口的K线数组格式（字符串数值）"""
+    return [[open_time, str(open_price), str(high), str(low), str(close), str(volume),
+             open_time + MINUTE_MS - 1, '0', 0, '0', '0', '0']
+            for open_time, open_price, high, low, close, volume in minutes]
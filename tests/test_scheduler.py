@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""按K线收盘调度的轮询时间（FakeClock 驱动，不真正等待）"""
+
+from monitor_engine import MonitorConfig
+from scheduler import FakeClock, PollScheduler, next_poll_time
+
+DAY = 24 * 60 * 60
+START = 1_700_000_000 - 1_700_000_000 % DAY  # UTC 0点，所有周期的边界
+
+
+def make_config():
+    config = MonitorConfig()
+    config.check_interval = 15
+    config.close_window = 30
+    config.dense_interval = 5
+    config.close_delay = 1
+    config.max_sparse_interval = 300
+    return config
+
+
+def drive(scheduler, clock, until):
+    """反复 wait + pop_due，返回 [(相对START的秒数, [key, ...]), ...]"""
+    polls = []
+    while True:
+        assert scheduler.wait()
+        if clock.time() > until:
+            return polls
+        polls.append((clock.time() - START, sorted(scheduler.pop_due())))
+
+
+def test_polls_follow_candle_close_grid():
+    clock = FakeClock(START + 10)
+    scheduler = PollScheduler(make_config(), clock)
+    scheduler.set_series([('ETHUSDT', '3m')])
+    times = [offset for offset, _ in drive(scheduler, clock, START + 361)]
+
+    # 3m: 稀疏间隔45秒（以开盘+1秒为原点），收盘前30秒内每5秒，收盘后1秒拉取完整K线
+    candle = [46, 91, 136, 150, 155, 160, 165, 170, 175, 180, 181]
+    assert times == [10] + candle + [offset + 180 for offset in candle]
+
+
+def test_close_plus_delay_for_every_candle():
+    clock = FakeClock(START)
+    scheduler = PollScheduler(make_config(), clock)
+    scheduler.set_series([('ETHUSDT', '1m'), ('ETHUSDT', '5m')])
+    polls = drive(scheduler, clock, START + 3600)
+
+    for key, interval in ((('ETHUSDT', '1m'), 60), (('ETHUSDT', '5m'), 300)):
+        times = {offset for offset, keys in polls if key in keys}
+        for close in range(interval, 3600, interval):
+            assert close + 1 in times
+
+
+def test_timeframes_sharing_a_boundary_poll_together():
+    clock = FakeClock(START + 30)
+    scheduler = PollScheduler(make_config(), clock)
+    keys = [('ETHUSDT', '1m'), ('ETHUSDT', '3m'), ('ETHUSDT', '15m'), ('BTCUSDT', '15m')]
+    scheduler.set_series(keys)
+    polls = dict(drive(scheduler, clock, START + 1900))
+
+    # 15m 收盘也是 1m/3m 的收盘：同一次唤醒取出所有序列
+    assert polls[901] == sorted(keys)
+    assert polls[1801] == sorted(keys)
+    # 只有 1m/3m 收盘的时刻不会拉 15m
+    assert polls[181] == [('ETHUSDT', '1m'), ('ETHUSDT', '3m')]
+    # 同一周期的不同品种同时拉取
+    polled = [key for keys_at in polls.values() for key in keys_at]
+    assert polled.count(('ETHUSDT', '15m')) == polled.count(('BTCUSDT', '15m'))
+
+
+def test_catch_up_after_missed_boundaries_has_no_burst():
+    clock = FakeClock(START + 5)
+    scheduler = PollScheduler(make_config(), clock)
+    keys = [('ETHUSDT', '1m'), ('ETHUSDT', '3m'), ('ETHUSDT', '15m')]
+    scheduler.set_series(keys)
+    assert sorted(scheduler.pop_due()) == sorted(keys)
+
+    # 进程挂起了十几分钟，错过了多次收盘
+    clock.advance(1000)
+    assert scheduler.wait()
+    assert sorted(scheduler.pop_due()) == sorted(keys)  # 每个序列只补拉一次
+    assert scheduler.pop_due() == []
+    assert scheduler.seconds_until_due() > 0
+
+    # 之后回到由当前时间算出的网格上，而不是把错过的拉取逐个补上
+    now = clock.time()
+    polls = drive(scheduler, clock, now + 300)
+    config = make_config()
+    expected = {}
+    for key in keys:
+        sparse, dense, close_window, interval = scheduler.poll_interval(key[1])
+        expected[key] = next_poll_time(now, interval, sparse, dense, close_window, config.close_delay)
+    for key, due in expected.items():
+        first = min(offset for offset, polled in polls if key in polled)
+        assert first + START == due
+    assert all(offset + START > now for offset, _ in polls)
+
+
+def test_defer_pushes_every_series_back():
+    clock = FakeClock(START)
+    scheduler = PollScheduler(make_config(), clock)
+    scheduler.set_series([('ETHUSDT', '1m'), ('ETHUSDT', '15m')])
+    scheduler.pop_due()
+    scheduler.defer(120)
+    assert scheduler.seconds_until_due() == 120
+    polls = drive(scheduler, clock, START + 120)
+    assert polls == [(120, [('ETHUSDT', '15m'), ('ETHUSDT', '1m')])]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""全市场筛选：品种全集、24h行情预筛和前K个的选择"""
+
+import numpy as np
+import pytest
+
+from screener import parse_universe, prefilter, top_k_indices
+
+
+def full_sort(scores, k):
+    """对全部分数稳定排序后取前k个（nan最低）"""
+    scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=-np.inf)
+    return np.argsort(-scores, kind='stable')[:max(k, 0)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_top_k_matches_full_sort(seed):
+    rng = np.random.default_rng(seed)
+    length = int(rng.integers(1, 60))
+    # 取整制造大量相等的分数，并混入nan和±inf
+    scores = np.round(rng.normal(0, 2, length))
+    scores[rng.random(length) < 0.2] = np.nan
+    scores[rng.random(length) < 0.05] = -np.inf
+    scores[rng.random(length) < 0.05] = np.inf
+    for k in range(-1, length + 3):
+        np.testing.assert_array_equal(top_k_indices(scores, k), full_sort(scores, k))
+
+
+def test_top_k_with_all_equal_or_nan():
+    np.testing.assert_array_equal(top_k_indices([1.0] * 6, 3), [0, 1, 2])
+    np.testing.assert_array_equal(top_k_indices([np.nan] * 4, 2), [0, 1])
+    np.testing.assert_array_equal(top_k_indices([np.nan, 2.0, np.nan, 2.0, 3.0], 3), [4, 1, 3])
+    assert top_k_indices([], 3).tolist() == []
+
+
+def ticker(symbol, position, quote_volume=5e6):
+    """现价位于24h高低区间 position% 处的行情"""
+    return {'symbol': symbol, 'lastPrice': str(100 + position), 'highPrice': '200',
+            'lowPrice': '100', 'quoteVolume': str(quote_volume)}
+
+
+def test_prefilter_ranks_by_extremity():
+    tickers = [ticker('AUSDT', 50), ticker('BUSDT', 10), ticker('CUSDT', 95), ticker('DUSDT', 25),
+               ticker('EUSDT', 80, quote_volume=10), ticker('FUSDT', 70), ticker('GUSDT', 2)]
+    tickers.append({'symbol': 'HUSDT', 'lastPrice': '5', 'highPrice': '5', 'lowPrice': '5',
+                    'quoteVolume': '1e7'})  # 高低区间为0，视为居中
+    universe = [item['symbol'] for item in tickers] + ['ZUSDT']
+    candidates = prefilter(tickers, universe, min_quote_volume=1e6, max_candidates=10)
+    # 居中的、成交额不足的不入选
+    assert candidates == ['GUSDT', 'CUSDT', 'BUSDT', 'DUSDT', 'FUSDT']
+    assert prefilter(tickers, universe, min_quote_volume=1e6, max_candidates=2) == ['GUSDT', 'CUSDT']
+    assert prefilter(tickers, ['AUSDT', 'BUSDT'], min_quote_volume=1e6) == ['BUSDT']
+
+
+def test_prefilter_keeps_previous_top_within_max_candidates():
+    tickers = [ticker(f"S{index:02d}USDT", index % 30) for index in range(100)]
+    tickers.append(ticker('MIDUSDT', 50))
+    universe = [item['symbol'] for item in tickers]
+    keep = ['MIDUSDT', 'S29USDT', 'S00USDT', 'MIDUSDT', 'GONEUSDT']
+
+    candidates = prefilter(tickers, universe, max_candidates=10, keep=keep)
+    assert len(candidates) == 10
+    assert len(set(candidates)) == 10
+    # 上一轮的排名总是保留：通过预筛的按极端程度排序，没通过的排在最后；已下架的不保留
+    assert 'S29USDT' in candidates and 'S00USDT' in candidates
+    assert candidates[-1] == 'MIDUSDT'
+    assert 'GONEUSDT' not in candidates
+    # 其余7个名额给最极端的新品种：位置0的 S30/S60/S90，再到位置1的 S01/S31/S61/S91
+    assert candidates[:-1] == ['S00USDT', 'S30USDT', 'S60USDT', 'S90USDT', 'S01USDT', 'S31USDT', 'S61USDT',
+                               'S91USDT', 'S29USDT']
+
+    # keep 本身超出上限时全部保留，不再加入新品种
+    many = [f"S{index:02d}USDT" for index in range(5, 17)]
+    assert sorted(prefilter(tickers, universe, max_candidates=10, keep=many)) == many
+    assert prefilter([], universe, max_candidates=10, keep=keep) == ['MIDUSDT', 'S29USDT', 'S00USDT']
+
+
+FUTURES_INFO = {'symbols': [
+    {'symbol': 'BTCUSDT', 'status': 'TRADING', 'quoteAsset': 'USDT', 'contractType': 'PERPETUAL'},
+    {'symbol': 'BTCUSDT_261225', 'status': 'TRADING', 'quoteAsset': 'USDT', 'contractType': 'CURRENT_QUARTER'},
+    {'symbol': 'AAVEUSDT', 'status': 'TRADING', 'quoteAsset': 'USDT', 'contractType': 'PERPETUAL'},
+    {'symbol': 'LUNAUSDT', 'status': 'SETTLING', 'quoteAsset': 'USDT', 'contractType': 'PERPETUAL'},
+    {'symbol': 'OLDUSDT', 'status': 'BREAK', 'quoteAsset': 'USDT', 'contractType': 'PERPETUAL'},
+    {'symbol': 'ETHBUSD', 'status': 'TRADING', 'quoteAsset': 'BUSD', 'contractType': 'PERPETUAL'},
+    {'symbol': 'ETHUSDT', 'status': 'TRADING', 'quoteAsset': 'USDT', 'contractType': 'PERPETUAL'},
+]}
+
+
+def test_parse_universe_keeps_trading_perpetuals():
+    assert parse_universe(FUTURES_INFO, 'USDT', perpetual_only=True) == ['AAVEUSDT', 'BTCUSDT', 'ETHUSDT']
+    assert parse_universe(FUTURES_INFO, 'BUSD', perpetual_only=True) == ['ETHBUSD']
+    # 现货没有 contractType
+    spot = {'symbols': [{'symbol': 'SOLUSDT', 'status': 'TRADING', 'quoteAsset': 'USDT'},
+                        {'symbol': 'SOLBTC', 'status': 'TRADING', 'quoteAsset': 'BTC'},
+                        {'symbol': 'XUSDT', 'status': 'HALT', 'quoteAsset': 'USDT'}]}
+    assert parse_universe(spot, 'USDT') == ['SOLUSDT']
+    assert parse_universe(spot, 'USDT', perpetual_only=True) == []
+    assert parse_universe({}, 'USDT') == []
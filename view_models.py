@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+界面数据模型（不依赖Kivy）
+
+后台线程只往模型里写数据，不直接碰控件；
+界面每帧最多取一次变化，把结果交给 RecycleView 之类只渲染可见行的控件。
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# 日志颜色对应的markup色值
+LOG_COLORS = {
+    'red': 'ff0000',
+    'green': '00ff00',
+    'yellow': 'ffff00',
+}
+
+
+def format_log_line(text, color=None, timestamp=None):
+    """格式化一行日志：[时间] 文本，按颜色加markup标记"""
+    current_time = (timestamp or datetime.now()).strftime('%H:%M:%S')
+    color_code = LOG_COLORS.get(color)
+    if color_code:
+        text = f"[color={color_code}]{text}[/color]"
+    return f"[{current_time}] {text}"
+
+
+class LogStore:
+    """有界环形日志缓冲区
+
+    任何线程都可以 append，超过 max_lines 时丢弃最旧的行。
+    每行保存为 RecycleView 的数据项 {'text': ...}，界面取数据时无需再转换。
+    """
+
+    def __init__(self, max_lines=500):
+        self.lock = threading.Lock()
+        self.rows = deque(maxlen=max_lines)
+        self.version = 0  # 每追加一行加一，界面据此判断是否需要刷新
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, text, color=None, timestamp=None):
+        """追加一行日志（线程安全，O(1)）"""
+        row = {'text': format_log_line(text, color, timestamp)}
+        with self.lock:
+            self.rows.append(row)
+            self.version += 1
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+            self.version += 1
+
+    def snapshot(self, since_version=None):
+        """取当前所有行
+
+        Args:
+            since_version: 上次取数据时的版本号，没有变化时返回 (None, 版本号)
+
+        Returns:
+            (rows列表或None, 当前版本号)
+        """
+        with self.lock:
+            if since_version is not None and since_version == self.version:
+                return None, self.version
+            return list(self.rows), self.version
+
+    def lines(self):
+        """所有行的文本"""
+        with self.lock:
+            return [row['text'] for row in self.rows]
+
+
+class StatusBoard:
+    """每个 (品种, 周期) 一行的实时状态表
+
+    update 只在数值变化时把这一行标记为待刷新，界面每帧取一次变化的行原地更新。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = {}    # (symbol, timeframe) -> 行数据
+        self.order = []   # 行的显示顺序（首次出现的先后）
+        self.dirty = set()
+        self.removed = []  # 已删除、界面还没移除的行
+
+    def update(self, symbol, timeframe, price, price_line, rsi, alert='', timestamp=None):
+        """更新一行（线程安全）
+
+        Returns:
+            这一行的显示内容是否发生变化
+        """
+        key = (symbol, timeframe)
+        values = (round(price, 2), round(price_line, 1), round(rsi, 1), alert)
+        updated_at = timestamp if timestamp is not None else time.time()
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                row = {'symbol': symbol, 'timeframe': timeframe}
+                self.rows[key] = row
+                self.order.append(key)
+            row['updated_at'] = updated_at
+            if row.get('values') == values:
+                return False
+            row['values'] = values
+            self.dirty.add(key)
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+            self.order = []
+            self.dirty.clear()
+            self.removed = []
+
+    def retain(self, keys):
+        """只保留 keys 中的行（全市场筛选时排名之外的行要移除）"""
+        keys = set(keys)
+        with self.lock:
+            dropped = [key for key in self.order if key not in keys]
+            for key in dropped:
+                del self.rows[key]
+                self.dirty.discard(key)
+            self.order = [key for key in self.order if key in keys]
+            self.removed.extend(dropped)
+        return dropped
+
+    def take_removed(self):
+        """取出并清空已删除的行"""
+        with self.lock:
+            removed, self.removed = self.removed, []
+        return removed
+
+    def take_changes(self):
+        """取出并清空待刷新的行
+
+        Returns:
+            [(key, values), ...]，values 为 (价格, 价格线, RSI, 告警)
+        """
+        with self.lock:
+            changes = [(key, self.rows[key]['values']) for key in self.order if key in self.dirty]
+            self.dirty.clear()
+        return changes
+
+    def ages(self, now=None):
+        """每一行距上次更新的秒数 [(key, 秒数), ...]"""
+        now = now if now is not None else time.time()
+        with self.lock:
+            return [(key, now - self.rows[key]['updated_at']) for key in self.order]
+
+
+def format_age(seconds):
+    """把秒数格式化为简短的时长（5s / 3m / 2h）"""
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h"
+
+
+def format_seconds(value):
+    """把耗时格式化为 µs / ms / s"""
+    if value is None:
+        return '-'
+    if value < 0.001:
+        return f"{value * 1e6:.0f}µs"
+    if value < 1:
+        return f"{value * 1000:.1f}ms"
+    return f"{value:.2f}s"
+
+
+def format_screen_report(report):
+    """把一轮全市场筛选的结果整理成文本行（排名按超出告警阈值的程度）"""
+    lines = [f"筛选: {report.universe} 个品种，预筛 {report.candidates} 个，计算 {report.evaluated} 组，"
+             f"失败 {len(report.errors)}，耗时 {format_seconds(report.elapsed)}"]
+    for rank, row in enumerate(report.top, 1):
+        lines.append(f"  {rank:>2}. {row.symbol:<14} {row.timeframe:>4}  价格 {row.price:<12.6g} "
+                     f"价格线 {row.price_line:5.1f}  RSI {row.rsi:5.1f}  超出 {row.score:+6.1f}")
+    return lines
+
+
+def format_diagnostics(registry):
+    """把运行指标整理成诊断面板的文本行"""
+    if not registry.enabled:
+        return ["运行指标已关闭"]
+    families = {family.name[len(registry.prefix):]: family for family in registry.collect()}
+    lines = []
+
+    def histogram_rows(name, title):
+        family = families.get(name)
+        if family is None:
+            return
+        lines.append(f"{title}（p50 / p95 / 次数）")
+        for values, child in sorted(family.samples()):
+            label = '/'.join(values) or '总计'
+            lines.append(f"  {label:<12} {format_seconds(child.quantile(0.5)):>8} / "
+                         f"{format_seconds(child.quantile(0.95)):>8} / {child.count}")
+
+    histogram_rows('stage_seconds', '各阶段耗时')
+    histogram_rows('cycle_seconds', '每轮耗时')
+    histogram_rows('http_request_seconds', '请求耗时')
+
+    responses = families.get('http_responses_total')
+    if responses is not None:
+        counts = {}
+        for (endpoint, status), child in responses.samples():
+            counts[status] = counts.get(status, 0) + int(child.value)
+        summary = '，'.join(f"{status}×{count}" for status, count in sorted(counts.items()))
+        lines.append(f"响应: {summary or '-'}")
+
+    def total(name):
+        family = families.get(name)
+        return int(sum(child.value for _, child in family.samples())) if family else 0
+
+    if 'http_retries_total' in families or 'rate_limited_total' in families:
+        lines.append(f"重试 {total('http_retries_total')} 次，限速 {total('rate_limited_total')} 次")
+    if 'request_weight_used' in families:
+        lines.append(f"权重: 已用 {total('request_weight_used')}，剩余 {total('request_weight_remaining')}")
+    if 'breaker_open_pairs' in families:
+        lines.append(f"熔断中: {total('breaker_open_pairs')}，失败 {total('pair_errors_total')} 次")
+
+    staleness = families.get('pair_staleness_seconds')
+    if staleness is not None:
+        items = [f"{'/'.join(values)} {format_age(child.value)}"
+                 for values, child in sorted(staleness.samples())]
+        if items:
+            lines.append("数据时效: " + '，'.join(items))
+    return lines